@@ -18,6 +18,18 @@ SUPPORTED_IMAGE_FORMATS = {
     'TIFF',
 }
 
+# PIL image modes which decode directly to numpy without loss of bit depth
+# Other modes (colour, palette, bilevel) are converted to 8 bit greyscale
+NATIVE_IMAGE_MODES = {
+    'L',
+    'I;16',
+    'I;16L',
+    'I;16B',
+    'I;16N',
+    'I',
+    'F',
+}
+
 SUPPORTED_RAW_FORMATS = {
     'DAT',
 }
@@ -34,3 +46,30 @@ EXTERNAL_PARAMETERS = {
 }
 
 BITS_PER_BYTE = 8
+
+# TIFF and BigTIFF parameters used by the multi-page TIFF stack reader/writer
+TIFF_FILE_EXTENSIONS = {
+    'TIF',
+    'TIFF',
+}
+
+TIFF_CLASSIC_MAGIC = 42
+
+TIFF_BIG_MAGIC = 43
+
+# Largest file addressable with the 32 bit offsets of a classic TIFF
+TIFF_CLASSIC_MAX_BYTES = 2**32 - 1
+
+TIFF_TAGS = {
+    'ImageWidth': 256,
+    'ImageLength': 257,
+    'BitsPerSample': 258,
+    'Compression': 259,
+    'PhotometricInterpretation': 262,
+    'StripOffsets': 273,
+    'SamplesPerPixel': 277,
+    'RowsPerStrip': 278,
+    'StripByteCounts': 279,
+    'TileWidth': 322,
+    'SampleFormat': 339,
+}
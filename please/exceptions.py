@@ -0,0 +1,6 @@
+""" This module contains custom exceptions raised by PLEASE
+"""
+
+
+class UnsupportedDataType(Exception):
+    """ Raised when attempting to load data in an unsupported format. """
@@ -1,16 +1,21 @@
 """ This module contains I/O code for reading data from supported formats
 such as raw .dat files as well as common image types like TIFF and PNG.
 """
+import os
 import pathlib
+import struct
+from typing import Iterator, List, Optional, Sequence, Union
 
 import numpy as np
 from PIL import Image
 
 from please.constants import (
-    SUPPORTED_IMAGE_FORMATS, SUPPORTED_RAW_FORMATS,
+    NATIVE_IMAGE_MODES, SUPPORTED_IMAGE_FORMATS, SUPPORTED_RAW_FORMATS,
+    TIFF_BIG_MAGIC, TIFF_CLASSIC_MAGIC, TIFF_FILE_EXTENSIONS, TIFF_TAGS,
 )
 from please.constants import BITS_PER_BYTE
 from please.exceptions import UnsupportedDataType
+from please.io.stackfile import STACK_EXTENSION, StackFile
 
 
 def read_image_data(file_path: str) -> np.ndarray:
@@ -25,6 +30,13 @@ def read_image_data(file_path: str) -> np.ndarray:
     -------
     data : NDArray
         2D array of image data
+
+    Notes
+    -----
+    Greyscale images are decoded straight into a numpy buffer at their
+    native bit depth, e.g. 16 bit TIFF and PNG files give uint16 arrays.
+    Colour and palette images are converted to 8 bit greyscale using the
+    ITU-R 601-2 luma transform.
     """
     ext = pathlib.Path(file_path).suffix
     if ext:
@@ -38,7 +50,10 @@ def read_image_data(file_path: str) -> np.ndarray:
             ' format is not supported.'
         )
 
-    return np.array(Image.open(file_path).convert('L'))
+    with Image.open(file_path) as image:
+        if image.mode not in NATIVE_IMAGE_MODES:
+            image = image.convert('L')
+        return np.array(image)
 
 
 def read_raw_data(
@@ -58,7 +73,7 @@ def read_raw_data(
     Returns
     -------
     data : NDArray
-        2D array of image data
+        2D read-only memory map of the image data
 
     Notes
     -----
@@ -66,7 +81,9 @@ def read_raw_data(
     data. It requires knowledge of the expected image characteristics, namely
     height, width, bits per pixel, and byte ordering i.e. endianness. With this
     knowledge, the header can be safely discarded and only the image data
-    retained.
+    retained. The header length is taken from the file size reported by
+    the filesystem, and the image data is memory mapped rather than read, so
+    pixels are only paged in from disk when they are accessed.
     """
     if bits_per_pixel % BITS_PER_BYTE != 0:
         raise ValueError(
@@ -85,21 +102,43 @@ def read_raw_data(
             ' format is not supported.'
         )
 
-    # Extract the image data from the file contents
-    with open(file_path, 'rb') as f:
-        file_data = f.read()
-
-    file_length_in_bytes = len(file_data)
+    # Map the image data directly from disk; the header is skipped via the
+    # offset so the file contents are never copied into an intermediate buffer
     image_data_in_bytes = height * width * int(bits_per_pixel/BITS_PER_BYTE)
-    header_length_in_bytes = file_length_in_bytes - image_data_in_bytes
+    header_length_in_bytes = _get_header_length(file_path, image_data_in_bytes)
     if header_length_in_bytes < 0:
         raise ValueError(
             f"Can not read raw data file, {file_path}."
             " Image parameters do not match the data file."
         )
-    image_data = file_data[header_length_in_bytes:]
     format_string = _get_dtype_string(bits_per_pixel, byteorder)
-    return np.frombuffer(image_data, format_string).reshape((height, width))
+    return np.memmap(
+        file_path,
+        dtype=format_string,
+        mode='r',
+        offset=header_length_in_bytes,
+        shape=(height, width),
+    )
+
+
+def _get_header_length(file_path: str, image_data_in_bytes: int) -> int:
+    """ Calculate the length of a raw data file header without reading it
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the raw data file
+
+    image_data_in_bytes : int
+        Expected size of the image data stored at the end of the file
+
+    Returns
+    -------
+    header_length : int
+        Number of bytes preceding the image data. A negative value indicates
+        that the file is too small to contain the expected image data.
+    """
+    return os.stat(file_path).st_size - image_data_in_bytes
 
 
 def _get_dtype_string(bits: int, byteorder: str) -> str:
@@ -125,3 +164,276 @@ def _get_dtype_string(bits: int, byteorder: str) -> str:
     endian = '<' if byteorder == 'L' else '>'
     bitstring = 'u1' if bits == 8 else 'u2'
     return endian + bitstring
+
+
+# TIFF field type: (struct format, size in bytes)
+_TIFF_FIELD_TYPES = {
+    1: ('B', 1),  # BYTE
+    3: ('H', 2),  # SHORT
+    4: ('I', 4),  # LONG
+    16: ('Q', 8),  # LONG8 (BigTIFF)
+}
+
+# TIFF SampleFormat to numpy dtype kind
+_TIFF_SAMPLE_FORMATS = {1: 'u', 2: 'i', 3: 'f'}
+
+
+def _iter_tiff_pages(tiff_file) -> Iterator[dict]:
+    """ Walk the IFD chain of an open TIFF or BigTIFF file
+
+    Only the tags needed to locate greyscale image data are decoded. Each
+    page is yielded as a dict mapping tag name to a tuple of values, as soon
+    as its IFD has been read.
+    """
+    byteorder = tiff_file.read(2)
+    if byteorder not in (b'II', b'MM'):
+        raise UnsupportedDataType(
+            f'The file, {tiff_file.name}, is not a TIFF file.'
+        )
+    endian = '<' if byteorder == b'II' else '>'
+    magic, = struct.unpack(endian + 'H', tiff_file.read(2))
+    if magic == TIFF_CLASSIC_MAGIC:
+        offset_format, count_format, entry_size = 'I', 'H', 12
+    elif magic == TIFF_BIG_MAGIC:
+        tiff_file.read(4)  # offset byte size (always 8) and padding
+        offset_format, count_format, entry_size = 'Q', 'Q', 20
+    else:
+        raise UnsupportedDataType(
+            f'The file, {tiff_file.name}, is not a TIFF file.'
+        )
+    offset_size = struct.calcsize(offset_format)
+    count_size = struct.calcsize(count_format)
+    tag_names = {value: key for key, value in TIFF_TAGS.items()}
+
+    ifd_offset, = struct.unpack(
+        endian + offset_format, tiff_file.read(offset_size)
+    )
+    while ifd_offset:
+        tiff_file.seek(ifd_offset)
+        n_entries, = struct.unpack(
+            endian + count_format, tiff_file.read(count_size)
+        )
+        entries = tiff_file.read(n_entries * entry_size)
+        next_offset, = struct.unpack(
+            endian + offset_format, tiff_file.read(offset_size)
+        )
+        page = {'endian': endian}
+        for k in range(n_entries):
+            entry = entries[k*entry_size:(k+1)*entry_size]
+            tag, field_type = struct.unpack(endian + 'HH', entry[:4])
+            if tag not in tag_names or field_type not in _TIFF_FIELD_TYPES:
+                continue
+            # the value count has the same size as an offset
+            count, = struct.unpack(
+                endian + offset_format, entry[4:4 + offset_size]
+            )
+            value_format, value_size = _TIFF_FIELD_TYPES[field_type]
+            fmt = f'{endian}{count}{value_format}'
+            inline = entry[entry_size - offset_size:]
+            if count * value_size <= offset_size:
+                values = struct.unpack(fmt, inline[:count * value_size])
+            else:
+                position = tiff_file.tell()
+                value_offset, = struct.unpack(endian + offset_format, inline)
+                tiff_file.seek(value_offset)
+                values = struct.unpack(fmt, tiff_file.read(count * value_size))
+                tiff_file.seek(position)
+            page[tag_names[tag]] = values
+        yield page
+        ifd_offset = next_offset
+
+
+def _get_tiff_page_dtype(page: dict) -> Optional[np.dtype]:
+    """ Numpy dtype of an uncompressed single channel page, or None
+
+    None indicates the page must be decoded by PIL, e.g. compressed, tiled,
+    colour or sub-byte data.
+    """
+    bits = page.get('BitsPerSample', (1,))
+    if (page.get('Compression', (1,))[0] != 1
+            or 'TileWidth' in page
+            or page.get('SamplesPerPixel', (1,))[0] != 1
+            or bits[0] % BITS_PER_BYTE != 0
+            or 'StripOffsets' not in page):
+        return None
+    kind = _TIFF_SAMPLE_FORMATS.get(page.get('SampleFormat', (1,))[0])
+    if kind is None:
+        return None
+    return np.dtype(f"{page['endian']}{kind}{bits[0] // BITS_PER_BYTE}")
+
+
+def read_tiff_stack(
+        file_path: str,
+        pages: Optional[Union[slice, Sequence[int]]] = None
+) -> np.ndarray:
+    """ Read the pages of a multi-page TIFF or BigTIFF file into a 3D array
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the TIFF file
+
+    pages : slice or Sequence[int], optional
+        Pages to read, e.g. ``slice(10, 50)``. Defaults to every page.
+
+    Returns
+    -------
+    data : NDArray
+        3D array of image data with shape (height, width, n_pages)
+
+    Notes
+    -----
+    The file is opened once and the output array is allocated once. Pages
+    stored uncompressed as single channel strips, as written by most
+    detectors and by ``please.io.writers.write_tiff_stack``, are read with
+    ``readinto`` straight from disk; other pages are decoded by PIL at their
+    native bit depth, as in ``read_image_data``.
+    """
+    ext = pathlib.Path(file_path).suffix.strip('.').upper()
+    if ext not in TIFF_FILE_EXTENSIONS:
+        raise UnsupportedDataType(
+            f'The file, {file_path}, could not be loaded because the data'
+            ' format is not supported.'
+        )
+    with open(file_path, 'rb') as tiff_file:
+        walk = _iter_tiff_pages(tiff_file)
+        first = next(walk, None)
+        # the first page decides the path, so files which PIL must decode,
+        # e.g. compressed BigTIFF, are parsed by PIL alone
+        page_info = None
+        if first is not None and _get_tiff_page_dtype(first) is not None:
+            page_info = [first] + list(walk)
+            selected = _select_tiff_pages(pages, len(page_info), file_path)
+            dtypes = [
+                _get_tiff_page_dtype(page_info[page]) for page in selected
+            ]
+            shapes = {
+                (page_info[page]['ImageLength'][0],
+                 page_info[page]['ImageWidth'][0]) for page in selected
+            }
+            if len(shapes) != 1:
+                raise ValueError(
+                    f"The pages of {file_path} do not share the same image"
+                    " shape."
+                )
+            if all(dtype is not None for dtype in dtypes):
+                return _read_tiff_strips(
+                    tiff_file, page_info, selected, dtypes, shapes.pop()
+                )
+
+        # PIL decodes the pages from the same open file
+        tiff_file.seek(0)
+        with Image.open(tiff_file) as image:
+            n_pages = image.n_frames if page_info is None else len(page_info)
+            selected = _select_tiff_pages(pages, n_pages, file_path)
+            data = None
+            for k, page in enumerate(selected):
+                image.seek(page)
+                frame = image if image.mode in NATIVE_IMAGE_MODES \
+                    else image.convert('L')
+                frame = np.asarray(frame)
+                if data is None:
+                    data = np.empty(
+                        frame.shape + (len(selected),),
+                        dtype=frame.dtype.newbyteorder('='),
+                    )
+                elif frame.shape != data.shape[:2]:
+                    raise ValueError(
+                        f"The pages of {file_path} do not share the same"
+                        " image shape."
+                    )
+                elif frame.dtype.newbyteorder('=') != data.dtype:
+                    raise ValueError(
+                        f"The pages of {file_path} do not share the same"
+                        " data type."
+                    )
+                data[:, :, k] = frame
+    return data
+
+
+def _select_tiff_pages(
+        pages: Optional[Union[slice, Sequence[int]]],
+        n_pages: int,
+        file_path: str
+) -> List[int]:
+    """ Page numbers chosen by a slice or sequence; every page for None """
+    if pages is None:
+        pages = range(n_pages)
+    elif isinstance(pages, slice):
+        pages = range(*pages.indices(n_pages))
+    pages = list(pages)
+    if not pages:
+        raise ValueError(f"No pages selected from {file_path}.")
+    invalid = [page for page in pages if not 0 <= page < n_pages]
+    if invalid:
+        raise ValueError(
+            f"Pages {invalid} are out of range for the {n_pages} pages of"
+            f" {file_path}."
+        )
+    return pages
+
+
+def _read_tiff_strips(
+        tiff_file,
+        page_info: List[dict],
+        pages: List[int],
+        dtypes: List[np.dtype],
+        shape: tuple
+) -> np.ndarray:
+    """ Read uncompressed single channel strip pages straight into an array """
+    if len(set(dtypes)) != 1:
+        raise ValueError(
+            f"The pages of {tiff_file.name} do not share the same data type."
+        )
+    height, width = shape
+    data = np.empty(
+        (height, width, len(pages)), dtype=dtypes[0].newbyteorder('=')
+    )
+    for k, (page, dtype) in enumerate(zip(pages, dtypes)):
+        frame = np.empty((height, width), dtype=dtype)
+        buffer = memoryview(frame.reshape(-1).view(np.uint8))
+        position = 0
+        for offset, count in zip(page_info[page]['StripOffsets'],
+                                 page_info[page]['StripByteCounts']):
+            count = min(count, len(buffer) - position)
+            tiff_file.seek(offset)
+            if tiff_file.readinto(buffer[position:position + count]) != count:
+                raise ValueError(
+                    f"Page {page} of {tiff_file.name} is truncated."
+                )
+            position += count
+        if position != len(buffer):
+            raise ValueError(
+                f"The strips of page {page} of {tiff_file.name} hold"
+                f" {position} bytes; the image needs {len(buffer)}."
+            )
+        data[:, :, k] = frame
+    return data
+
+
+def open_stack_file(file_path: str) -> StackFile:
+    """ Open a PLEASE stack (.pstk) file for random access
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the stack file
+
+    Returns
+    -------
+    stack : StackFile
+        Reader exposing the stack shape, energies, metadata, and methods to
+        read individual images, pixel curves, or the whole stack
+    """
+    if pathlib.Path(file_path).suffix.lower() != STACK_EXTENSION:
+        raise UnsupportedDataType(
+            f'The file, {file_path}, could not be loaded because the data'
+            ' format is not supported.'
+        )
+    try:
+        return StackFile(file_path)
+    except ValueError as err:
+        raise UnsupportedDataType(
+            f'The file, {file_path}, could not be loaded because it is'
+            f' not a supported PLEASE stack file. {err}'
+        ) from err
@@ -0,0 +1,445 @@
+""" This module implements the PLEASE stack (.pstk) file format
+
+A stack file is a single file container for a full LEEM/LEED data set.
+Opening an experiment stored as hundreds of individual data files requires
+listing, sorting and opening every file. A stack file stores the same 3D
+array (height, width, n_images) in one file together with the energy list
+and the Experiment YAML settings.
+
+File layout:
+    preamble:  8 byte magic string, uint16 format version, uint32 header
+               length, uint64 offset of the chunk index (little-endian)
+    header:    YAML encoded dictionary of stack parameters and metadata
+    chunks:    the 3D array split into blocks of shape 'Chunk Shape', each
+               stored in C order and optionally compressed with zlib or lzma
+    index:     little-endian int64 array of (offset, length) pairs, one per
+               chunk, ordered by chunk grid position (row block, column
+               block, image block)
+
+Chunks keep all pixels of a block together, so any single image or single
+pixel curve can be read without decoding the whole file. Chunks spanning the
+full energy axis ('pixel' layout) keep each pixel's curve contiguous, which
+suits workloads that extract curves rather than browse images.
+
+This is the only implementation of the format: ``please.io.readers`` and
+``please.io.writers`` wrap it for the library API, and the legacy GUI in
+``source/`` loads this file through ``source/stackfile.py``. The module
+therefore depends only on numpy and PyYAML, not on the rest of the package.
+"""
+import contextlib
+import itertools
+import lzma
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+import yaml
+
+MAGIC = b'PLSSTACK'
+FORMAT_VERSION = 1
+# struct format: magic, version, header length, chunk index offset
+PREAMBLE = struct.Struct('<8sHIQ')
+STACK_EXTENSION = '.pstk'
+COMPRESSION_TYPES = ['none', 'zlib', 'lzma']
+FRAME_LAYOUT = 'frame'
+PIXEL_LAYOUT = 'pixel'
+LAYOUT_TYPES = [FRAME_LAYOUT, PIXEL_LAYOUT]
+DEFAULT_CHUNK_SHAPE = (128, 128, 16)
+DEFAULT_PIXEL_BAND = 16  # rows per chunk for the pixel layout
+
+
+def _compress(buf, compression: str) -> bytes:
+    """ Compress a bytes-like object with the named compression type """
+    if compression == 'zlib':
+        return zlib.compress(buf, 6)
+    elif compression == 'lzma':
+        return lzma.compress(buf)
+    return bytes(buf)
+
+
+def _decompress(buf: bytes, compression: str) -> bytes:
+    """ Invert _compress """
+    if compression == 'zlib':
+        return zlib.decompress(buf)
+    elif compression == 'lzma':
+        return lzma.decompress(buf)
+    return buf
+
+
+def chunk_grid(
+        shape: Tuple[int, int, int],
+        chunk_shape: Tuple[int, int, int]
+) -> Tuple[int, int, int]:
+    """ Number of chunks along each axis of a 3D array """
+    return tuple(-(-dim // cdim) for dim, cdim in zip(shape, chunk_shape))
+
+
+def pack_stack_file(
+        file_path: str,
+        paths: Sequence[Hashable],
+        read_frame: Callable[[Hashable], np.ndarray],
+        energies: Optional[Sequence[float]] = None,
+        metadata: Optional[dict] = None,
+        chunk_shape: Optional[Tuple[int, int, int]] = None,
+        compression: str = 'zlib',
+        layout: str = FRAME_LAYOUT
+) -> None:
+    """ Write a sequence of frames into a single chunked stack file
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the stack file to write
+
+    paths : Sequence
+        One item per image in stacking order, usually data file paths,
+        each passed to ``read_frame``
+
+    read_frame : Callable
+        Returns the 2D image for an item of ``paths``
+
+    energies : Sequence[float], optional
+        External parameter value for each image, e.g. the electron energy
+
+    metadata : dict, optional
+        Experiment YAML settings to store in the file header
+
+    chunk_shape : Tuple[int, int, int], optional
+        Shape of each independently stored (and compressed) block. Defaults
+        to (128, 128, 16) for the 'frame' layout and to bands of 16 full
+        width rows for the 'pixel' layout.
+
+    compression : str
+        One of 'none', 'zlib', or 'lzma'
+
+    layout : str
+        'frame' chunks span a few images and favor reading whole images;
+        frames are read one image block at a time, so memory use is bounded
+        by (height, width, chunk_shape[2]). 'pixel' chunks span every image
+        so each pixel's curve is contiguous on disk; the frames are spilled
+        once to a temporary file next to ``file_path`` and read back one
+        band of rows at a time, so memory use is bounded by
+        (chunk_shape[0], width, n_images). Every frame is read once with
+        either layout. Uncompressed 'pixel' files with
+        full width chunks can be memory mapped as a single array, see
+        ``StackFile.memory_map``.
+    """
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(
+            f"Unsupported compression: {compression}."
+            f" Valid types are {COMPRESSION_TYPES}."
+        )
+    if layout not in LAYOUT_TYPES:
+        raise ValueError(
+            f"Unsupported layout: {layout}. Valid layouts are {LAYOUT_TYPES}."
+        )
+    first = np.asarray(read_frame(paths[0]))
+    shape = first.shape + (len(paths),)
+    if chunk_shape is None:
+        chunk_shape = (
+            DEFAULT_CHUNK_SHAPE if layout == FRAME_LAYOUT
+            else (DEFAULT_PIXEL_BAND, shape[1], shape[2])
+        )
+    elif layout == PIXEL_LAYOUT:
+        chunk_shape = (chunk_shape[0], chunk_shape[1], shape[2])
+    chunk_shape = tuple(min(c, s) for c, s in zip(chunk_shape, shape))
+    grid = chunk_grid(shape, chunk_shape)
+    header = {
+        'Format Version': FORMAT_VERSION,
+        'Shape': list(shape),
+        'Dtype': first.dtype.str,
+        'Chunk Shape': list(chunk_shape),
+        'Compression': compression,
+        'Layout': layout,
+        'Energies': (
+            None if energies is None else [float(e) for e in energies]
+        ),
+        'Experiment': metadata,
+    }
+    header_bytes = yaml.safe_dump(header).encode('utf-8')
+    index = np.zeros(grid + (2,), dtype='<i8')
+    # rows of every frame gathered per pass over the images
+    band = shape[0] if layout == FRAME_LAYOUT else chunk_shape[0]
+    block = np.empty((band, shape[1], chunk_shape[2]), dtype=first.dtype)
+
+    def frames():
+        # every frame is read exactly once, in stacking order
+        yield first
+        for path in paths[1:]:
+            frame = np.asarray(read_frame(path))
+            if frame.shape != shape[:2]:
+                raise ValueError(
+                    f"Frame {path} has shape {frame.shape},"
+                    f" expected {shape[:2]}."
+                )
+            yield frame
+
+    with contextlib.ExitStack() as cleanup:
+        if band < shape[0]:
+            # one pass over the images per band of rows: spill the frames
+            # once to a frame-major temporary file and read each band back
+            # from it, rather than reading every input again for each band
+            spill = cleanup.enter_context(tempfile.TemporaryFile(
+                dir=os.path.dirname(os.path.abspath(file_path))
+            ))
+            for frame in frames():
+                frame = np.ascontiguousarray(frame, dtype=first.dtype)
+                spill.write(frame.data)
+            row_bytes = shape[1] * first.dtype.itemsize
+
+            def rows(k, b0, b1):
+                part = np.empty((b1 - b0, shape[1]), dtype=first.dtype)
+                spill.seek((k * shape[0] + b0) * row_bytes)
+                spill.readinto(part.view(np.uint8).data)
+                return part
+        else:
+            # a single pass requests the frames in stacking order
+            pending = frames()
+
+            def rows(k, b0, b1):
+                return next(pending)[b0:b1]
+
+        f = cleanup.enter_context(open(file_path, 'wb'))
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes), 0))
+        f.write(header_bytes)
+        for b0 in range(0, shape[0], band):
+            b1 = min(b0 + band, shape[0])
+            for gn in range(grid[2]):
+                n0 = gn * chunk_shape[2]
+                n1 = min(n0 + chunk_shape[2], shape[2])
+                for k in range(n0, n1):
+                    block[:b1 - b0, :, k - n0] = rows(k, b0, b1)
+                for gy, gx in itertools.product(
+                        range(b0 // chunk_shape[0], -(-b1 // chunk_shape[0])),
+                        range(grid[1])):
+                    y0 = gy * chunk_shape[0] - b0
+                    x0 = gx * chunk_shape[1]
+                    chunk = np.ascontiguousarray(
+                        block[y0:min(y0 + chunk_shape[0], b1 - b0),
+                              x0:x0 + chunk_shape[1],
+                              :n1 - n0]
+                    )
+                    data = _compress(chunk.data, compression)
+                    index[gy, gx, gn] = (f.tell(), len(data))
+                    f.write(data)
+        index_offset = f.tell()
+        f.write(index.tobytes())
+        f.seek(0)
+        f.write(PREAMBLE.pack(
+            MAGIC, FORMAT_VERSION, len(header_bytes), index_offset
+        ))
+
+
+class StackFile:
+    """ Random access reader for PLEASE stack (.pstk) files
+
+    Only the header and chunk index are read on open; image data is decoded
+    on demand one chunk at a time.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the stack file
+
+    Raises
+    ------
+    ValueError
+        If the file is not a stack file this module can read
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        # serialize seek + read when chunks are decoded from several threads
+        self._lock = threading.Lock()
+        preamble = self._file.read(PREAMBLE.size)
+        if len(preamble) < PREAMBLE.size:
+            self._file.close()
+            raise ValueError(f"{file_path} is not a PLEASE stack file.")
+        magic, version, header_length, index_offset = PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            self._file.close()
+            raise ValueError(f"{file_path} is not a PLEASE stack file.")
+        if version > FORMAT_VERSION:
+            self._file.close()
+            raise ValueError(
+                f"Stack file version {version} is newer than supported"
+                f" version {FORMAT_VERSION}."
+            )
+        self.header = yaml.safe_load(
+            self._file.read(header_length).decode('utf-8')
+        )
+        self.shape = tuple(self.header['Shape'])
+        self.dtype = np.dtype(self.header['Dtype'])
+        self.chunk_shape = tuple(self.header['Chunk Shape'])
+        self.compression = self.header['Compression']
+        if self.compression not in COMPRESSION_TYPES:
+            self._file.close()
+            raise ValueError(
+                f"{file_path} uses an unsupported compression type:"
+                f" {self.compression}."
+            )
+        self.layout = self.header.get('Layout', FRAME_LAYOUT)
+        self.energies = self.header['Energies']
+        self.metadata = self.header['Experiment']
+        self.grid = chunk_grid(self.shape, self.chunk_shape)
+        self._file.seek(index_offset)
+        self.index = np.fromfile(
+            self._file, dtype='<i8', count=2 * int(np.prod(self.grid))
+        ).reshape(self.grid + (2,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        """ Close the underlying file handle """
+        self._file.close()
+
+    def _chunk_bounds(self, position: Tuple[int, int, int]) -> list:
+        """ Array (start, stop) along each axis of the chunk at position """
+        return [
+            (g * c, min((g + 1) * c, s))
+            for g, c, s in zip(position, self.chunk_shape, self.shape)
+        ]
+
+    def read_chunk(self, position: Tuple[int, int, int]) -> np.ndarray:
+        """ Decode the chunk at (row block, column block, image block) """
+        offset, length = (int(v) for v in self.index[tuple(position)])
+        shape = tuple(
+            stop - start for start, stop in self._chunk_bounds(position)
+        )
+        if self.compression == 'none':
+            return np.memmap(
+                self.file_path, dtype=self.dtype, mode='r', offset=offset,
+                shape=shape,
+            )
+        with self._lock:
+            self._file.seek(offset)
+            buf = self._file.read(length)
+        return np.frombuffer(
+            _decompress(buf, self.compression), dtype=self.dtype
+        ).reshape(shape)
+
+    def read_frame(self, index: int) -> np.ndarray:
+        """ Read a single (height, width) image from the stack """
+        image_block, k = divmod(index, self.chunk_shape[2])
+        frame = np.empty(self.shape[:2], dtype=self.dtype)
+        for gy, gx in itertools.product(range(self.grid[0]),
+                                        range(self.grid[1])):
+            position = (gy, gx, image_block)
+            (y0, y1), (x0, x1), _ = self._chunk_bounds(position)
+            frame[y0:y1, x0:x1] = self.read_chunk(position)[:, :, k]
+        return frame
+
+    def read_pixel(self, row: int, col: int) -> np.ndarray:
+        """ Read the 1D curve for a single pixel across all images """
+        gy, y = divmod(row, self.chunk_shape[0])
+        gx, x = divmod(col, self.chunk_shape[1])
+        return np.concatenate([
+            self.read_chunk((gy, gx, gn))[y, x, :]
+            for gn in range(self.grid[2])
+        ])
+
+    def read_window(self, row_slice: slice, col_slice: slice) -> np.ndarray:
+        """ Read all images for a rectangular window of pixels
+
+        Only the chunks overlapping the window are decoded.
+        """
+        rows = range(*row_slice.indices(self.shape[0]))
+        cols = range(*col_slice.indices(self.shape[1]))
+        window = np.empty(
+            (len(rows), len(cols), self.shape[2]), dtype=self.dtype
+        )
+        ch, cw, _ = self.chunk_shape
+        for position in itertools.product(
+                range(rows.start // ch, -(-rows.stop // ch)),
+                range(cols.start // cw, -(-cols.stop // cw)),
+                range(self.grid[2])):
+            (cy0, cy1), (cx0, cx1), (n0, n1) = self._chunk_bounds(position)
+            y0, y1 = max(rows.start, cy0), min(rows.stop, cy1)
+            x0, x1 = max(cols.start, cx0), min(cols.stop, cx1)
+            window[y0 - rows.start:y1 - rows.start,
+                   x0 - cols.start:x1 - cols.start,
+                   n0:n1] = self.read_chunk(position)[y0 - cy0:y1 - cy0,
+                                                      x0 - cx0:x1 - cx0]
+        return window
+
+    def can_memory_map(self) -> bool:
+        """ Check if the image data is stored as one C ordered 3D array
+
+        This is true for uncompressed files written with the 'pixel' layout
+        and chunks spanning the full image width.
+        """
+        if (self.compression != 'none'
+                or self.chunk_shape[1:] != self.shape[1:]):
+            return False
+        band_bytes = int(np.prod(self.chunk_shape)) * self.dtype.itemsize
+        offsets = self.index[:, 0, 0, 0]
+        return bool(np.all(
+            offsets == offsets[0] + band_bytes * np.arange(self.grid[0])
+        ))
+
+    def memory_map(self) -> np.memmap:
+        """ Expose the full (height, width, n_images) array as a memory map
+
+        Each pixel's curve is contiguous on disk, so extracting curves only
+        pages in the bytes for the requested pixels.
+        """
+        if not self.can_memory_map():
+            raise ValueError(
+                f"The file, {self.file_path}, can not be memory mapped; it"
+                " must be uncompressed with full width 'pixel' layout chunks."
+            )
+        return np.memmap(
+            self.file_path, dtype=self.dtype, mode='r',
+            offset=int(self.index[0, 0, 0, 0]), shape=self.shape,
+        )
+
+    def read_stack(self, workers: Optional[int] = None) -> np.ndarray:
+        """ Decode the full (height, width, n_images) array
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of threads decoding chunks; defaults to the
+            ThreadPoolExecutor default
+        """
+        data = np.empty(self.shape, dtype=self.dtype)
+
+        def fill(position):
+            slices = tuple(
+                slice(start, stop)
+                for start, stop in self._chunk_bounds(position)
+            )
+            data[slices] = self.read_chunk(position)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(
+                fill, itertools.product(*(range(g) for g in self.grid))
+            ))
+        return data
+
+
+def find_stack_file(path: str) -> Optional[str]:
+    """ Path to a stack file given the file itself or a directory holding one
+
+    Returns None if no stack file was found.
+    """
+    if os.path.isfile(path) and path.endswith(STACK_EXTENSION):
+        return path
+    if os.path.isdir(path):
+        files = sorted(
+            name for name in os.listdir(path)
+            if name.endswith(STACK_EXTENSION) and not name.startswith('.')
+        )
+        if files:
+            return os.path.join(path, files[0])
+    return None
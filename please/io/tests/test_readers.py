@@ -2,11 +2,19 @@
 
 import os
 import pkg_resources
-from unittest import TestCase
+import shutil
+import tempfile
+from unittest import TestCase, mock
 
 import numpy as np
+from PIL import Image
 
-from please.io.readers import read_image_data, read_raw_data, _get_dtype_string
+from please.exceptions import UnsupportedDataType
+from please.io.readers import (
+    open_stack_file, read_image_data, read_raw_data, read_tiff_stack,
+    _get_dtype_string, _get_header_length, _iter_tiff_pages,
+)
+from please.io.writers import write_stack_file, write_tiff_stack
 
 
 class TestImageFileIO(TestCase):
@@ -95,6 +103,22 @@ class TestImageFileIO(TestCase):
         self.assertIsInstance(data, np.ndarray)
         self.assertEqual(data.shape, expected_shape)
 
+    def test_read_image_data_preserves_bit_depth(self):
+        # Given
+        expected = np.arange(0, 65535, 17, dtype=np.uint16)[:3840]
+        expected = expected.reshape((64, 60))
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_path = os.path.join(temp_dir, 'image16.png')
+        Image.fromarray(expected).save(file_path)
+
+        # When
+        data = read_image_data(file_path)
+
+        # Then
+        self.assertEqual(data.dtype, np.uint16)
+        np.testing.assert_array_equal(data, expected)
+
     def test_read_raw_data(self):
         # Given
         bits_per_pixel = 16
@@ -116,6 +140,40 @@ class TestImageFileIO(TestCase):
         self.assertIsInstance(data, np.ndarray)
         self.assertEqual(data.shape, expected_shape)
 
+    def test__get_header_length(self):
+        # Given
+        image_data_in_bytes = 600 * 592 * 2
+        expected = 520
+
+        # When
+        header_length = _get_header_length(
+            self.raw_data_file, image_data_in_bytes
+        )
+
+        # Then
+        self.assertEqual(header_length, expected)
+
+    def test_read_raw_data_is_memory_mapped(self):
+        # Given
+        height = 600
+        width = 592
+        with open(self.raw_data_file, 'rb') as f:
+            f.seek(520)
+            expected = np.frombuffer(f.read(), '<u2').reshape((height, width))
+
+        # When
+        data = read_raw_data(
+            self.raw_data_file,
+            height=height,
+            width=width,
+            bits_per_pixel=16,
+            byteorder='L'
+        )
+
+        # Then
+        self.assertIsInstance(data, np.memmap)
+        np.testing.assert_array_equal(data, expected)
+
     def test_read_raw_data_raises_for_bad_params(self):
         # Given
         bits_per_pixel = 16
@@ -135,3 +193,208 @@ class TestImageFileIO(TestCase):
 
         # Then
         self.assertIn(expected_error, str(ctx.exception))
+
+
+class TestStackFileIO(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmpdir, 'stack.pstk')
+        rng = np.random.default_rng(0)
+        self.data = rng.integers(0, 4096, size=(37, 29, 11), dtype='<u2')
+        self.energies = [0.5 * k for k in range(11)]
+        self.metadata = {'Type': 'LEEM', 'Name': 'test'}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        for compression in ['none', 'zlib', 'lzma']:
+            # Given
+            write_stack_file(
+                self.file_path,
+                self.data,
+                energies=self.energies,
+                metadata=self.metadata,
+                chunk_shape=(16, 8, 4),
+                compression=compression,
+            )
+
+            # When
+            with open_stack_file(self.file_path) as stack:
+                data = stack.read_stack()
+                frame = stack.read_frame(6)
+                pixel = stack.read_pixel(20, 17)
+                shape = stack.shape
+                energies = stack.energies
+                metadata = stack.metadata
+
+            # Then
+            self.assertEqual(shape, self.data.shape)
+            self.assertEqual(energies, self.energies)
+            self.assertEqual(metadata, self.metadata)
+            np.testing.assert_array_equal(data, self.data)
+            np.testing.assert_array_equal(frame, self.data[:, :, 6])
+            np.testing.assert_array_equal(pixel, self.data[20, 17, :])
+
+    def test_open_stack_file_raises_for_bad_file(self):
+        # Given
+        bad_file = os.path.join(self.tmpdir, 'bad.pstk')
+        with open(bad_file, 'wb') as f:
+            f.write(b'\x00' * 64)
+
+        # Then
+        with self.assertRaises(UnsupportedDataType):
+            open_stack_file(bad_file)
+        with self.assertRaises(UnsupportedDataType):
+            open_stack_file(os.path.join(self.tmpdir, 'stack.dat'))
+
+    def test_pixel_layout(self):
+        # Given
+        write_stack_file(
+            self.file_path,
+            self.data,
+            chunk_shape=(8, 29, 1),
+            compression='none',
+            layout='pixel',
+        )
+
+        # When
+        with open_stack_file(self.file_path) as stack:
+            chunk_shape = stack.chunk_shape
+            mapped = stack.memory_map()
+            window = stack.read_window(slice(3, 20), slice(5, 9))
+
+        # Then
+        self.assertEqual(chunk_shape, (8, 29, 11))
+        self.assertIsInstance(mapped, np.memmap)
+        np.testing.assert_array_equal(mapped, self.data)
+        np.testing.assert_array_equal(window, self.data[3:20, 5:9, :])
+
+    def test_memory_map_raises_for_compressed_file(self):
+        # Given
+        write_stack_file(self.file_path, self.data, layout='pixel')
+
+        # Then
+        with open_stack_file(self.file_path) as stack:
+            with self.assertRaisesRegex(ValueError, 'can not be memory mapped'):
+                stack.memory_map()
+
+
+class TestTiffStackIO(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmpdir, 'stack.tif')
+        rng = np.random.default_rng(0)
+        self.data = rng.integers(0, 65535, size=(37, 29, 11), dtype='<u2')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        for bigtiff in [False, True]:
+            # Given
+            write_tiff_stack(self.file_path, self.data, bigtiff=bigtiff)
+
+            # When
+            data = read_tiff_stack(self.file_path)
+
+            # Then
+            np.testing.assert_array_equal(data, self.data)
+
+    def test_read_page_range(self):
+        # Given
+        write_tiff_stack(self.file_path, self.data)
+
+        # When
+        data = read_tiff_stack(self.file_path, pages=slice(2, 8, 3))
+        selected = read_tiff_stack(self.file_path, pages=[10, 0])
+
+        # Then
+        np.testing.assert_array_equal(data, self.data[:, :, 2:8:3])
+        np.testing.assert_array_equal(selected, self.data[:, :, [10, 0]])
+
+    def test_read_compressed_pages(self):
+        # Given
+        frames = [Image.fromarray(self.data[:, :, k]) for k in range(4)]
+        frames[0].save(
+            self.file_path,
+            save_all=True,
+            append_images=frames[1:],
+            compression='tiff_lzw',
+        )
+
+        # When
+        data = read_tiff_stack(self.file_path, pages=slice(1, 3))
+
+        # Then
+        self.assertEqual(data.dtype, np.uint16)
+        np.testing.assert_array_equal(data, self.data[:, :, 1:3])
+
+    def test_compressed_pages_are_only_parsed_by_pil(self):
+        # Given
+        frames = [Image.fromarray(self.data[:, :, k]) for k in range(4)]
+        frames[0].save(
+            self.file_path,
+            save_all=True,
+            append_images=frames[1:],
+            compression='tiff_lzw',
+        )
+        walked = []
+
+        def walk(tiff_file):
+            for page in _iter_tiff_pages(tiff_file):
+                walked.append(page)
+                yield page
+
+        # When
+        with mock.patch('please.io.readers._iter_tiff_pages', walk):
+            data = read_tiff_stack(self.file_path)
+
+        # Then
+        self.assertEqual(len(walked), 1)
+        np.testing.assert_array_equal(data, self.data[:, :, :4])
+
+    def test_read_tiff_stack_raises_for_pages_out_of_range(self):
+        # Given
+        write_tiff_stack(self.file_path, self.data)
+
+        # Then
+        for pages in [[11], [0, -1]]:
+            with self.assertRaisesRegex(ValueError, 'out of range'):
+                read_tiff_stack(self.file_path, pages=pages)
+
+    def test_read_tiff_stack_raises_for_mixed_dtypes(self):
+        # Given
+        frames = [
+            Image.fromarray(self.data[:, :, 0]),
+            Image.fromarray(self.data[:, :, 1].astype(np.float32)),
+        ]
+        frames[0].save(self.file_path, save_all=True, append_images=frames[1:])
+
+        # Then
+        with self.assertRaisesRegex(ValueError, 'data type'):
+            read_tiff_stack(self.file_path)
+
+    def test_read_tiff_stack_raises_for_truncated_strips(self):
+        # Given
+        write_tiff_stack(self.file_path, self.data)
+        size = os.path.getsize(self.file_path)
+
+        def walk(tiff_file):
+            for page in _iter_tiff_pages(tiff_file):
+                # the last strip of each page runs past the end of the file
+                offsets = page['StripOffsets']
+                page['StripOffsets'] = offsets[:-1] + (size - 10,)
+                yield page
+
+        # Then
+        with mock.patch('please.io.readers._iter_tiff_pages', walk):
+            with self.assertRaisesRegex(ValueError, 'truncated'):
+                read_tiff_stack(self.file_path)
+
+    def test_read_tiff_stack_raises_for_unsupported_file(self):
+        # Then
+        with self.assertRaises(UnsupportedDataType):
+            read_tiff_stack(os.path.join(self.tmpdir, 'stack.png'))
@@ -0,0 +1,94 @@
+""" Unittests for data file writers """
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+from PIL import Image
+
+from please.io.writers import (
+    TiffStackWriter, write_stack_file, write_tiff_stack,
+)
+
+
+class TestStackFileWriter(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmpdir, 'stack.pstk')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_write_stack_file_raises_for_2d_data(self):
+        # Given
+        data = np.zeros((10, 10), dtype=np.uint16)
+
+        # Then
+        with self.assertRaisesRegex(ValueError, 'Expected 3D data'):
+            write_stack_file(self.file_path, data)
+
+    def test_write_stack_file_raises_for_bad_compression(self):
+        # Given
+        data = np.zeros((10, 10, 3), dtype=np.uint16)
+
+        # Then
+        with self.assertRaisesRegex(ValueError, 'Unsupported compression'):
+            write_stack_file(self.file_path, data, compression='gzip')
+
+    def test_write_stack_file_compresses(self):
+        # Given
+        data = np.zeros((64, 64, 8), dtype=np.uint16)
+
+        # When
+        write_stack_file(self.file_path, data, compression='zlib')
+
+        # Then
+        self.assertLess(os.path.getsize(self.file_path), data.nbytes)
+
+
+class TestTiffStackWriter(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmpdir, 'stack.tif')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_write_tiff_stack_is_readable_by_pil(self):
+        # Given
+        data = np.random.randint(0, 65535, size=(20, 30, 4)).astype(np.uint16)
+
+        # When
+        write_tiff_stack(self.file_path, data)
+
+        # Then
+        with Image.open(self.file_path) as image:
+            self.assertEqual(image.n_frames, 4)
+            image.seek(2)
+            np.testing.assert_array_equal(np.array(image), data[:, :, 2])
+
+    def test_tiff_stack_writer_streams_frames(self):
+        # Given
+        frames = [np.full((5, 6), k, dtype=np.float32) for k in range(3)]
+
+        # When
+        with TiffStackWriter(self.file_path, bigtiff=True) as writer:
+            for frame in frames:
+                writer.write_frame(frame)
+
+        # Then
+        with open(self.file_path, 'rb') as f:
+            self.assertEqual(f.read(4), b'II+\x00')
+        self.assertEqual(writer.n_frames, 3)
+
+    def test_write_tiff_stack_raises_for_2d_data(self):
+        # Given
+        data = np.zeros((10, 10), dtype=np.uint16)
+
+        # Then
+        with self.assertRaisesRegex(ValueError, 'Expected 3D data'):
+            write_tiff_stack(self.file_path, data)
@@ -0,0 +1,207 @@
+""" This module contains I/O code for writing data to formats supported by
+PLEASE, such as the chunked PLEASE stack (.pstk) file and multi-page TIFF.
+"""
+import os
+import struct
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from please.constants import (
+    TIFF_BIG_MAGIC, TIFF_CLASSIC_MAGIC, TIFF_CLASSIC_MAX_BYTES, TIFF_TAGS,
+)
+from please.io.stackfile import FRAME_LAYOUT, pack_stack_file
+
+
+def write_stack_file(
+        file_path: str,
+        data: np.ndarray,
+        energies: Optional[Sequence[float]] = None,
+        metadata: Optional[dict] = None,
+        chunk_shape: Optional[Tuple[int, int, int]] = None,
+        compression: str = 'zlib',
+        layout: str = FRAME_LAYOUT
+) -> None:
+    """ Write a 3D data set to a PLEASE stack (.pstk) file
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the stack file to write
+
+    data : NDArray
+        3D array of image data with shape (height, width, n_images)
+
+    energies : Sequence[float], optional
+        External parameter value for each image, e.g. the electron energy
+
+    metadata : dict, optional
+        Experiment YAML settings to store in the file header
+
+    chunk_shape : Tuple[int, int, int], optional
+        Shape of each independently stored (and compressed) block. Defaults
+        to (128, 128, 16) for the 'frame' layout and to bands of 16 full
+        width rows for the 'pixel' layout.
+
+    compression : str
+        One of 'none', 'zlib', or 'lzma'
+
+    layout : str
+        'frame' chunks span a few images and favor reading whole images.
+        'pixel' chunks span every image so each pixel's curve is contiguous
+        on disk. Uncompressed 'pixel' files with full width chunks can be
+        memory mapped as a single array, see ``StackFile.memory_map``.
+
+    Notes
+    -----
+    The file format is described and implemented in ``please.io.stackfile``.
+    """
+    if data.ndim != 3:
+        raise ValueError(f"Expected 3D data, got shape {data.shape}.")
+    pack_stack_file(
+        file_path,
+        range(data.shape[2]),
+        lambda k: data[:, :, k],
+        energies=energies,
+        metadata=metadata,
+        chunk_shape=chunk_shape,
+        compression=compression,
+        layout=layout,
+    )
+
+
+# TIFF field type codes by struct format
+_TIFF_FIELD_TYPES = {'H': 3, 'I': 4, 'Q': 16}
+
+# TIFF SampleFormat codes by numpy dtype kind
+_TIFF_SAMPLE_FORMATS = {'u': 1, 'i': 2, 'f': 3}
+
+
+class TiffStackWriter:
+    """ Streaming writer for multi-page TIFF and BigTIFF files
+
+    Frames are written one at a time, so a processed stack can be exported
+    without holding every frame in memory. Each frame is stored as a single
+    uncompressed strip followed by its IFD, and the previous IFD is patched to
+    point at the new one.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the TIFF file to write
+
+    bigtiff : bool
+        Write 64 bit offsets (BigTIFF). Required for files larger than 4 GB.
+    """
+
+    def __init__(self, file_path: str, bigtiff: bool = False):
+        self.file_path = file_path
+        self.bigtiff = bigtiff
+        self.n_frames = 0
+        if bigtiff:
+            self._offset_format, self._count_format = 'Q', 'Q'
+        else:
+            self._offset_format, self._count_format = 'I', 'H'
+        self._offset_size = struct.calcsize(self._offset_format)
+        self._file = open(file_path, 'wb')
+        if bigtiff:
+            header = struct.pack('<2sHHHQ', b'II', TIFF_BIG_MAGIC, 8, 0, 0)
+        else:
+            header = struct.pack('<2sHI', b'II', TIFF_CLASSIC_MAGIC, 0)
+        self._file.write(header)
+        # location of the pointer to the next IFD, patched for each frame
+        self._next_ifd_pointer = self._file.tell() - self._offset_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _entry(self, tag: str, field_format: str, value: int) -> bytes:
+        """ Pack a single valued IFD entry with its value stored inline """
+        value = struct.pack('<' + field_format, value)
+        value += b'\x00' * (self._offset_size - len(value))
+        return struct.pack(
+            f'<HH{self._offset_format}',
+            TIFF_TAGS[tag], _TIFF_FIELD_TYPES[field_format], 1,
+        ) + value
+
+    def write_frame(self, frame: np.ndarray) -> None:
+        """ Append a 2D image to the file as a new page """
+        if frame.ndim != 2:
+            raise ValueError(f"Expected 2D frame, got shape {frame.shape}.")
+        if frame.dtype.kind not in _TIFF_SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported dtype: {frame.dtype}.")
+        frame = np.ascontiguousarray(
+            frame, dtype=frame.dtype.newbyteorder('<')
+        )
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        data_offset = f.tell()
+        ifd_offset = data_offset + frame.nbytes
+        ifd_offset += ifd_offset % 2  # IFDs start on a word boundary
+        if not self.bigtiff and ifd_offset + 256 > TIFF_CLASSIC_MAX_BYTES:
+            raise ValueError(
+                "Classic TIFF files are limited to 4 GB; use bigtiff=True."
+            )
+        f.write(frame.data)
+        f.write(b'\x00' * (ifd_offset - data_offset - frame.nbytes))
+
+        offset_format = self._offset_format
+        height, width = frame.shape
+        entries = [
+            self._entry('ImageWidth', 'I', width),
+            self._entry('ImageLength', 'I', height),
+            self._entry('BitsPerSample', 'H', frame.dtype.itemsize * 8),
+            self._entry('Compression', 'H', 1),
+            self._entry('PhotometricInterpretation', 'H', 1),  # black is zero
+            self._entry('StripOffsets', offset_format, data_offset),
+            self._entry('SamplesPerPixel', 'H', 1),
+            self._entry('RowsPerStrip', 'I', height),
+            self._entry('StripByteCounts', offset_format, frame.nbytes),
+            self._entry(
+                'SampleFormat', 'H', _TIFF_SAMPLE_FORMATS[frame.dtype.kind]
+            ),
+        ]
+        f.write(struct.pack('<' + self._count_format, len(entries)))
+        f.write(b''.join(entries))
+        next_ifd_pointer = f.tell()
+        f.write(struct.pack('<' + self._offset_format, 0))
+
+        f.seek(self._next_ifd_pointer)
+        f.write(struct.pack('<' + self._offset_format, ifd_offset))
+        self._next_ifd_pointer = next_ifd_pointer
+        self.n_frames += 1
+
+
+def write_tiff_stack(
+        file_path: str,
+        data: np.ndarray,
+        bigtiff: Optional[bool] = None
+) -> None:
+    """ Write a 3D data set to a multi-page TIFF file, one page per image
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the TIFF file to write
+
+    data : NDArray
+        3D array of image data with shape (height, width, n_images)
+
+    bigtiff : bool, optional
+        Write a BigTIFF file. Defaults to BigTIFF only when the data would
+        exceed the 4 GB limit of a classic TIFF.
+    """
+    if data.ndim != 3:
+        raise ValueError(f"Expected 3D data, got shape {data.shape}.")
+    if bigtiff is None:
+        # leave room for the IFDs and word alignment padding
+        bigtiff = data.nbytes + 256 * data.shape[2] > TIFF_CLASSIC_MAX_BYTES
+    with TiffStackWriter(file_path, bigtiff=bigtiff) as writer:
+        for k in range(data.shape[2]):
+            writer.write_frame(data[:, :, k])
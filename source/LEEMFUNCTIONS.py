@@ -11,11 +11,24 @@ These methods are independent of the GUI and thus not contained in please.py
 
 """
 
+import functools
+import math
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from manifest import get_manifest
 from PIL import Image
 from PyQt5 import QtCore
 
+# PIL image modes which decode directly to numpy without loss of bit depth
+NATIVE_IMAGE_MODES = {'L', 'I;16', 'I;16L', 'I;16B', 'I;16N', 'I', 'F'}
+WINDOW_BLOCK_BYTES = 64 * 1024**2  # memory ceiling in bytes for blocks of images read by integrate_windows()
+GAUSSIAN_WINDOW_SIGMAS = 6  # a Gaussian smoothing window spans this many standard deviations
+FFT_SMOOTH_COST = 2.0  # relative cost of an FFT point to a direct convolution point when choosing how to smooth
+SAVGOL_TYPE = 'savitzky-golay'  # smoothing type selecting a Savitzky-Golay filter instead of a window
+SAVGOL_POLYORDER = 3  # order of the polynomial fitted by the Savitzky-Golay filter
+
 
 class InvalidParameterError(Exception):
     """Indicate that required parameters for parsing data files are not present."""
@@ -24,6 +37,7 @@ class InvalidParameterError(Exception):
         if message is None:
             message = "Error: Invalid or Insufficient Parameters required to process data files."
         super(InvalidParameterError, self).__init__(message)
+        self.message = message
 
 
 class ParseError(Exception):
@@ -67,6 +81,51 @@ def energy_to_filenumber(el, val):
         return None
 
 
+def energy_selection(start, step, emin=None, emax=None, stride=1):
+    """Map an energy (or time) window to a slice of data file indices.
+
+    File number k is taken to be at energy start + k * step, as in the energy list
+    generated from the experiment settings.
+
+    :argument start: float energy (or time) of the first data file
+    :argument step: float energy (or time) step between data files
+    :param emin: float lowest energy to load; None starts at the first file
+    :param emax: float highest energy to load; None continues to the last file
+    :param stride: integer step between loaded files, e.g. 2 loads every other file
+    :return: slice of file indices
+    :raises InvalidParameterError: if the step or stride are not positive
+    """
+    if step <= 0 or stride < 1:
+        raise InvalidParameterError("Error: energy step ({0}) and stride ({1}) must be positive.".format(step,
+                                                                                                     stride))
+    # small tolerance so that window edges given to two decimals select the file at that energy
+    first = 0 if emin is None else max(0, int(math.ceil((emin - start) / step - 1e-6)))
+    stop = None if emax is None else max(first, int(math.floor((emax - start) / step + 1e-6)) + 1)
+    return slice(first, stop, stride)
+
+
+def select_paths(paths, select=None):
+    """Select data files by file index.
+
+    :argument paths: list of string paths to data files in stacking order
+    :param select: slice (see energy_selection()) or list of integer file indices; None selects all files.
+                   Indices past the end of paths are ignored.
+    :return: list of string paths
+    :raises InvalidParameterError: if no files are selected
+    """
+    if select is None:
+        return list(paths)
+    if isinstance(select, slice):
+        chosen = list(paths)[select]
+    else:
+        chosen = [paths[idx] for idx in select if 0 <= idx < len(paths)]
+    if not chosen:
+        raise InvalidParameterError("Error: no data files found in the selected energy range.")
+    if len(chosen) < len(paths):
+        print("Loading {0} of {1} data files in the selected energy range.".format(len(chosen), len(paths)))
+    return chosen
+
+
 def getRectCorners(pt1, pt2):
     """Get coordinates of top left and bottom right corners given any two corners of a rectangle."""
     if not isinstance(pt1, (QtCore.QPointF, tuple)) or not isinstance(pt2, (QtCore.QPointF, tuple)):
@@ -101,115 +160,514 @@ def getRectCorners(pt1, pt2):
         return None
 
 
-def process_LEEM_Data(dirname, ht=None, wd=None, bits=None, byte=None):
+def get_raw_format_string(bits=None, byte=None):
+    """Generate a numpy dtype string for raw image data.
+
+    :param bits: integer bit depth of image, 8 or 16; default is 16 bit
+    :param byte: string representing byte order, 'L' for Little-Endian (Intel), 'B' for Big-Endian (Motorola)
+    :return formatstring: numpy compatible dtype string such as '<u2' or None if the settings are invalid
+    """
+    if bits is None:
+        return '<u2'  # default to 16 bit images
+    if byte is None:
+        byte = 'L'
+    formats = {(8, 'L'): '<u1',  # 1 byte (8 bits) per pixel
+               (8, 'B'): '>u1',
+               (16, 'L'): '<u2',  # 2 bytes (16 bits) per pixel
+               (16, 'B'): '>u2'}
+    return formats.get((bits, byte), None)
+
+
+def get_header_length(path, ht, wd, bits=None):
+    """Calculate raw file header length from the file size without reading the file.
+
+    :argument path: string path to raw data file
+    :param ht: integer pixel height of image
+    :param wd: integer pixel width of image
+    :param bits: integer representing bit depth of image, default is 16 bit
+    :return hdln: integer number of bytes preceding the image data
+    """
+    if bits is None:
+        bits = 16
+    return os.stat(path).st_size - (int(bits/8) * ht * wd)  # multiply by number of bytes per pixel
+
+
+def check_roi(indices, ht, wd):
+    """Check that a region of interest lies within an image.
+
+    :argument indices: list of two tuples in (r,c) format 1st = top left corner 2nd = bottom right, see crop_images()
+    :argument ht: integer pixel height of image
+    :argument wd: integer pixel width of image
+    :raises InvalidParameterError: if the region is empty or extends outside the image
+    """
+    (top, left), (bottom, right) = indices
+    if not (0 <= top <= bottom < ht and 0 <= left <= right < wd):
+        raise InvalidParameterError("Error: region of interest {0} does not lie within the image "
+                                    "height={1}, width={2}.".format(indices, ht, wd))
+
+
+def map_raw_frame(path, ht, wd, formatstring, hdln=None, roi=None):
+    """Expose the image data in a raw file as a read-only memory map.
+
+    No data is read from disk until the returned array is accessed. If a
+    region of interest is given only the rows it spans are mapped, so reading
+    the returned array touches just the byte range covering those rows.
+
+    :argument path: string path to raw data file
+    :param ht: integer pixel height of image
+    :param wd: integer pixel width of image
+    :param formatstring: numpy dtype string for the image data, see get_raw_format_string()
+    :param hdln: integer header length in bytes; calculated from the file size if None
+    :param roi: list of two tuples in (r,c) format 1st = top left corner 2nd = bottom right, see crop_images()
+    :return: 2d numpy.memmap of shape (ht, wd), or the shape of the region of interest
+    """
+    itemsize = np.dtype(formatstring).itemsize
+    if hdln is None:
+        hdln = os.stat(path).st_size - itemsize * ht * wd
+    if hdln < 0:
+        raise InvalidParameterError("Error: file {0} is too small for the image parameters "
+                                    "height={1}, width={2}.".format(path, ht, wd))
+    if roi is None:
+        return np.memmap(path, dtype=formatstring, mode='r', offset=hdln, shape=(ht, wd))
+    check_roi(roi, ht, wd)
+    (top, left), (bottom, right) = roi
+    rows = np.memmap(path, dtype=formatstring, mode='r', offset=hdln + top * wd * itemsize,
+                     shape=(bottom - top + 1, wd))
+    return rows[:, left:right + 1]
+
+
+def roi_reader(read_frame, indices):
+    """Wrap a frame reader so that each frame is cropped to a region of interest as it is read.
+
+    :argument read_frame: callable taking a string path and returning a 2d numpy array
+    :argument indices: list of two tuples in (r,c) format 1st = top left corner 2nd = bottom right, see crop_images()
+    :return: callable taking a string path and returning the cropped 2d numpy array
+    """
+    def read(path):
+        frame = read_frame(path)
+        check_roi(indices, frame.shape[0], frame.shape[1])
+        return crop_images(frame, indices)
+    return read
+
+
+def load_stack(paths, read_frame, workers=None):
+    """Read a list of data files into a single preallocated 3D numpy array.
+
+    The first file is read to determine the frame shape and dtype. The output
+    array is then allocated once and the remaining frames are decoded directly
+    into their slot by a pool of threads. The output is C ordered so the I(V)
+    curve of each pixel, dat_arr[y, x, :], is contiguous in memory.
+
+    :argument paths: list of string paths to data files in stacking order
+    :argument read_frame: callable taking a string path and returning a 2d numpy array
+    :param workers: integer number of threads used to read files; None uses the ThreadPoolExecutor default
+    :return dat_arr: 3d numpy array (height, width, image number)
+    :raises InvalidParameterError: if a frame's dtype does not fit the dtype of the first frame
+    """
+    first = np.asarray(read_frame(paths[0]))
+    dat_arr = np.empty(first.shape + (len(paths),), dtype=first.dtype)
+    dat_arr[:, :, 0] = first
+    del first
+
+    def fill(idx):
+        frame = read_frame(paths[idx])
+        if frame.shape != dat_arr.shape[:2]:
+            raise ValueError("Error: file {0} has shape {1}, expected {2}.".format(paths[idx],
+                                                                                 frame.shape,
+                                                                                 dat_arr.shape[:2]))
+        if not np.can_cast(frame.dtype, dat_arr.dtype, 'safe'):
+            # assigning the frame would silently wrap or truncate its values
+            raise InvalidParameterError("Error: file {0} has dtype {1}, which does not fit the dtype {2} of the "
+                                        "first file.".format(paths[idx], frame.dtype, dat_arr.dtype))
+        dat_arr[:, :, idx] = frame
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # consume the iterator so that exceptions raised in worker threads propagate
+        list(pool.map(fill, range(1, len(paths))))
+    return dat_arr
+
+
+def _cast_like(arr, dtype):
+    """Cast floating point data back to dtype, rounding to the nearest integer for integer types."""
+    if np.issubdtype(dtype, np.integer):
+        arr = np.rint(arr)
+    return arr.astype(dtype)
+
+
+def _block_sum(frame, factor):
+    """Sum non-overlapping factor x factor blocks of pixels as float64."""
+    ht, wd = frame.shape[0] // factor, frame.shape[1] // factor
+    if not ht or not wd:
+        raise InvalidParameterError("Error: binning factor {0} is larger than the image size {1}.".format(factor,
+                                                                                                      frame.shape))
+    # splitting each axis in two is a view, so only the summed output is allocated
+    blocks = frame[:ht * factor, :wd * factor].reshape(ht, factor, wd, factor)
+    return blocks.sum(axis=(1, 3), dtype=np.float64)
+
+
+def bin_image(frame, factor):
+    """Average non-overlapping factor x factor blocks of pixels in a 2D image.
+
+    Rows and columns which do not fill a complete block are discarded.
+
+    :argument frame: 2d numpy array (height, width)
+    :argument factor: integer side length of each block of pixels; 1 returns the frame unchanged
+    :return: 2d numpy array (height // factor, width // factor) with the dtype of frame
+    """
+    frame = np.asarray(frame)
+    if factor <= 1:
+        return frame
+    return _cast_like(_block_sum(frame, factor) / factor**2, frame.dtype)
+
+
+def group_paths(paths, ebin=1):
+    """Group consecutive data files for averaging along the energy (or time) axis.
+
+    Trailing files which do not fill a complete group are discarded.
+
+    :argument paths: list of string paths to data files in stacking order
+    :param ebin: integer number of consecutive files averaged into each image; 1 returns paths unchanged
+    :return: list of string paths or list of tuples of ebin string paths
+    """
+    if ebin <= 1:
+        return list(paths)
+    groups = [tuple(paths[k:k + ebin]) for k in range(0, len(paths) - ebin + 1, ebin)]
+    if not groups:
+        raise InvalidParameterError("Error: energy binning factor {0} is larger than the number of "
+                                    "data files, {1}.".format(ebin, len(paths)))
+    if len(paths) % ebin:
+        print("Energy binning by {0}: discarding the last {1} files.".format(ebin, len(paths) % ebin))
+    return groups
+
+
+def binned_reader(read_frame, binning=1):
+    """Wrap a frame reader so that each frame is binned as it is read.
+
+    The returned callable accepts either a single path, giving a spatially binned
+    frame, or a tuple of paths from group_paths(), giving the average of the
+    spatially binned frames. Only one binned frame is held per call, so the full
+    resolution stack is never assembled in memory.
+
+    :argument read_frame: callable taking a string path and returning a 2d numpy array
+    :param binning: integer spatial binning factor, see bin_image()
+    :return: callable taking a string path or tuple of string paths and returning a 2d numpy array
+    """
+    if binning < 1:
+        raise InvalidParameterError("Error: binning factor must be a positive integer, got {}.".format(binning))
+
+    def read(paths):
+        if isinstance(paths, str):
+            return bin_image(read_frame(paths), binning)
+        total = None
+        for path in paths:
+            frame = np.asarray(read_frame(path))
+            part = _block_sum(frame, binning) if binning > 1 else frame.astype(np.float64)
+            if total is None:
+                total, dtype = part, frame.dtype
+            elif part.shape != total.shape:
+                raise ValueError("Error: file {0} has shape {1}, expected {2}.".format(path, frame.shape,
+                                                                                     total.shape))
+            else:
+                total += part
+        return _cast_like(total / (len(paths) * binning**2), dtype)
+    return read
+
+
+def binned_axis(start, step, count, ebin=1, decimals=2):
+    """Generate the energy (or time) of each image after averaging groups of ebin files.
+
+    Each binned image is assigned the mean energy of the files averaged into it.
+
+    :argument start: float energy (or time) of the first data file
+    :argument step: float energy (or time) step between data files
+    :argument count: integer number of binned images
+    :param ebin: integer number of files averaged into each image
+    :param decimals: integer number of decimal places to round to, or None to skip rounding
+    :return: list of floats
+    """
+    axis = [start + step * (k * ebin + (ebin - 1) / 2.0) for k in range(count)]
+    if decimals is None:
+        return axis
+    return [round(val, decimals) for val in axis]
+
+
+def process_LEEM_Data(dirname, ht=None, wd=None, bits=None, byte=None, workers=None, binning=1, ebin=1,
+                      roi=None, select=None):
     """Read in .dat files, convert to numpy arrays, then stack into 3D numpy array and return.
 
+    Each file is memory mapped past its header and copied straight into a
+    preallocated 3D array by a pool of threads. When binning, each frame is
+    binned as it is read so only the binned stack is held in memory. With a
+    region of interest only the rows of each file covering it are read.
+
     :argument dirname: string path to current data directory
     :param ht: integer pixel height of image
     :param wd: integer pixel width of image
     :param bits: integer representing bit depth of image, default is 16 bit
     :param byte: string representing byte order, 'L' for Little-Endian (Intel), 'B' for Big-Endian (Motorola)
+    :param workers: integer number of threads used to read files
+    :param binning: integer spatial binning factor, see bin_image()
+    :param ebin: integer number of consecutive files averaged into each image, see group_paths()
+    :param roi: list of two tuples in (r,c) format 1st = top left corner 2nd = bottom right, see crop_images();
+                binning is applied after cropping
+    :param select: slice or list of file indices to load, see select_paths(); energy binning groups the selected files
     :return dat_arr: 3d numpy array
+    :raises IOError: if no .dat files are found in dirname
     """
     print('Processing Data ...')
     # progress = pb.ProgressBar(fd=sys.stdout)
-    arr_list = []
-    flag = True
-    # add filter on file names to exclude hidden files beginning with a leading period
     print("Searching for files in {}".format(dirname))
-    files = [name for name in os.listdir(dirname) if name.endswith('.dat') and not name.startswith(".")]
-    files.sort()
-    print('First file is {}.'.format(files[0]))
-    bitsize = bits
-    byteorder = byte
-    if byte is None:
-        byteorder = 'L'
-    for fl in files:
-        with open(os.path.join(dirname, fl), 'rb') as f:
-            # dynamically calculate file header length
-            if ht is None or wd is None:
-                raise InvalidParameterError
-                return
-
-            hdln = len(f.read()) - (int(bits/8) * ht * wd)  # multiply by number of bytes per pixel
-
-            if flag:
-                print('Calculated Header Length of First File: {}'.format(hdln))
-                # only print first file header length
-                flag = False
-            f.seek(0)
+    if ht is None or wd is None:
+        raise InvalidParameterError
+
+    # Generate format string given a bit size read from YAML config file
+    formatstring = get_raw_format_string(bits, byte)
+    if formatstring is None:
+        print("Error in process_LEEM_Data() - unknown bit size when loading raw data")
+        print("Check for incorrect bitsize in YAML experiment config file")
+        print("The paramters loaded from file were: bit size = {0}, byte order = {1}".format(bits, byte))
+        return None
 
-            # Generate format string given a bit size read from YAML config file
-            if bitsize == 8 and byteorder == 'L':
-                formatstring = '<u1'  # 1 byte (8 bits) per pixel
-            elif bitsize == 8 and byteorder == 'B':
-                formatstring = '>u1'
+    # the cached directory manifest skips hidden files, sorts by name, and records
+    # header lengths from the file sizes; only new or modified files are stat'ed again
+    manifest = get_manifest(dirname, '.dat',
+                            frame_bytes=np.dtype(formatstring).itemsize * ht * wd,
+                            dtype=formatstring)
+    if not len(manifest):
+        raise IOError("No .dat files found in {}".format(dirname))
+    print('First file is {}.'.format(manifest.names[0]))
+    headers = {path: entry.header for path, entry in zip(manifest.paths, manifest)}
+    paths = select_paths(manifest.paths, select)
+    # only print first file header length
+    print('Calculated Header Length of First File: {}'.format(headers[paths[0]]))
+
+    def read_frame(path):
+        return map_raw_frame(path, ht, wd, formatstring, hdln=headers[path], roi=roi)
+
+    if roi is not None:
+        check_roi(roi, ht, wd)
+        print('Reading region of interest {} from each file ...'.format(roi))
+    if binning > 1 or ebin > 1:
+        print('Binning {0}x{0} pixels and {1} energies per image ...'.format(binning, ebin))
+        read_frame = binned_reader(read_frame, binning)
+        paths = group_paths(paths, ebin)
 
-            elif bitsize == 16 and byteorder == 'L':
-                formatstring = '<u2'  # 2 bytes (16 bits) per pixel
-            elif bitsize == 16 and byteorder == 'B':
-                formatstring = '>u2'
+    print('Creating 3D Array ...')
+    dat_arr = load_stack(paths, read_frame, workers=workers)
+    # print('Returning New Array Shape: {}'.format(dat_arr.shape))
+    return dat_arr
 
-            elif bitsize is None:
-                formatstring = '<u2'  # default to 16 bit images
 
-            else:
-                print("Error in process_LEEM_Data() - unknown bit size when loading raw data")
-                print("Check for incorrect bitsize in YAML experiment file")
-                print("The paramters loaded from file were: bit size = {0}, byte order = {1}".format(bits, byte))
-                return None
+def gaussian_window(window_len):
+    """Return a Gaussian window of window_len points spanning GAUSSIAN_WINDOW_SIGMAS standard deviations.
 
-            arr_list.append(np.fromstring(f.read()[hdln:],
-                                          formatstring).reshape((ht, wd)))
-    print('Creating 3D Array ...')
+    :argument window_len: integer size of window
+    :return: 1d numpy array
+    """
+    sigma = window_len / float(GAUSSIAN_WINDOW_SIGMAS)
+    x = np.arange(window_len) - (window_len - 1) / 2.0
+    return np.exp(-0.5 * (x / sigma)**2)
+
+
+# window functions available for data smoothing; each takes the window length and returns an unnormalized window
+SMOOTHING_WINDOWS = {
+    'flat': lambda window_len: np.ones(window_len, 'd'),  # moving average
+    'hanning': np.hanning,
+    'hamming': np.hamming,
+    'bartlett': np.bartlett,
+    'blackman': np.blackman,
+    'gaussian': gaussian_window,
+}
+SMOOTHING_TYPES = list(SMOOTHING_WINDOWS) + [SAVGOL_TYPE]
+
+
+@functools.lru_cache(maxsize=64)
+def smoothing_window(window_len, window_type='flat'):
+    """Return the normalized smoothing window, computed once for each length and type.
+
+    :argument window_len: even integer size of window
+    :param window_type: string for type of window function, a key of SMOOTHING_WINDOWS
+    :return: 1d read-only numpy float64 array summing to one
+    :raises InvalidParameterError: if the window length or type is invalid
+    """
+    if window_len <= 3:
+        raise InvalidParameterError("Error in data smoothing - please select a larger window length")
+    if window_type not in SMOOTHING_WINDOWS:
+        raise InvalidParameterError("Error - Invalid window_type: {}".format(window_type))
+    w = np.asarray(SMOOTHING_WINDOWS[window_type](window_len), dtype=np.float64)
+    w = w / w.sum()
+    w.flags.writeable = False
+    return w
+
+
+def _fast_fft_length(n):
+    """Return the smallest integer >= n with no prime factors other than 2, 3 and 5."""
+    best = 1 << max(n - 1, 0).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            length = p35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def smoothing_fft_length(num, window_len):
+    """Choose between direct and FFT convolution for smoothing curves of num points.
+
+    Direct convolution costs one pass over the curves for each window point; FFT convolution costs a
+    transform of the reflected curves which grows only with their length.
+
+    :argument num: integer number of points in each curve
+    :argument window_len: integer size of window
+    :return: integer FFT length, or 0 if direct convolution is faster
+    """
+    nfft = _fast_fft_length(num + 3 * (window_len - 1))
+    if window_len * num <= FFT_SMOOTH_COST * nfft * math.log2(nfft):
+        return 0
+    return nfft
 
-    dat_arr = np.dstack(arr_list)  # create 3D stack of all image files
-    del arr_list[:]  # clear data from list as it ahs now been stored in numpy array
-    # print('Returning New Array Shape: {}'.format(dat_arr.shape))
-    return dat_arr
+
+def reflect_smooth(curves, w, out):
+    """Smooth curves along their last axis into out, exactly as smooth() smooths a single curve.
+
+    :argument curves: numpy array of one or more curves along the last axis, at least len(w) points long
+    :argument w: 1d numpy array, normalized window from smoothing_window()
+    :argument out: numpy float array with the shape of curves
+    :return: out
+    """
+    window_len = len(w)
+    num = curves.shape[-1]
+    curves = np.asarray(curves, dtype=out.dtype)
+    # s is the input signal doctored with reflections of the input at the beginning and end
+    # this serves to remove noise in the smoothing method
+    s = np.concatenate((curves[..., window_len-1:0:-1], curves, curves[..., -1:-window_len:-1]), axis=-1)
+    # only the points of the 'valid' convolution which are returned are computed
+    start = int(window_len/2 - 1)
+    nfft = smoothing_fft_length(num, window_len)
+    if nfft:
+        spectrum = np.fft.rfft(s, nfft, axis=-1)
+        spectrum *= np.fft.rfft(w, nfft)
+        full = np.fft.irfft(spectrum, nfft, axis=-1)
+        out[...] = full[..., start + window_len - 1:start + window_len - 1 + num]
+    elif s.ndim == 1:
+        out[...] = np.convolve(w, s, mode='valid')[start:start + num]
+    else:
+        out[...] = 0
+        for j, weight in enumerate(w[::-1].astype(out.dtype)):
+            out += weight * s[..., start + j:start + j + num]
+    return out
+
+
+@functools.lru_cache(maxsize=32)
+def savgol_matrices(points, polyorder, deriv=0):
+    """Return the Savitzky-Golay filter coefficients for derivative deriv at unit spacing.
+
+    A polynomial of order polyorder is fitted by least squares to each window of points values. Interior points
+    take the derivative of the fit at the window center; the first and last points // 2 values of a curve take
+    the derivative of the fit to the first or last full window at their own positions.
+
+    :argument points: odd integer number of points in each window
+    :argument polyorder: integer order of the fitted polynomial, less than points
+    :param deriv: integer order of the derivative, 0 for the smoothed values
+    :return: tuple of read-only numpy arrays (center coefficients (points,), first window (points // 2, points),
+             last window (points // 2, points))
+    :raises InvalidParameterError: if points is even or not larger than polyorder
+    """
+    if points % 2 == 0 or points <= polyorder:
+        raise InvalidParameterError("Error: a Savitzky-Golay window must be an odd number of points larger than "
+                                    "the polynomial order {}.".format(polyorder))
+    half = points // 2
+    x = np.arange(points, dtype=np.float64) - half
+    powers = np.arange(polyorder + 1)
+    # polynomial coefficients of the least squares fit to a window of values
+    fit = np.linalg.pinv(x[:, np.newaxis] ** powers)
+    # derivative deriv of each power of x
+    scale = np.array([math.factorial(j) // math.factorial(j - deriv) if j >= deriv else 0 for j in powers])
+    exponents = np.clip(powers - deriv, 0, None)
+
+    def evaluate(positions):
+        return (scale * positions[:, np.newaxis] ** exponents).dot(fit)
+
+    matrices = (evaluate(np.zeros(1))[0], evaluate(x[:half]), evaluate(x[half + 1:]))
+    for matrix in matrices:
+        matrix.flags.writeable = False
+    return matrices
+
+
+def savgol_filter(curves, points, polyorder=SAVGOL_POLYORDER, derivs=(0,), delta=1.0, outs=None):
+    """Savitzky-Golay filter curves along their last axis, giving the smoothed curves and their derivatives.
+
+    :argument curves: list or numpy array of one or more curves along the last axis
+    :argument points: odd integer number of points in each window
+    :param polyorder: integer order of the fitted polynomial
+    :param derivs: orders of the derivatives to return, 0 for the smoothed curves
+    :param delta: float spacing of the curve points, e.g. the energy step in eV
+    :param outs: list of numpy float arrays with the shape of curves, one for each of derivs; float64 if None
+    :return: list of numpy arrays, one for each of derivs
+    :raises InvalidParameterError: if the window is invalid or longer than the curves
+    """
+    curves = np.asarray(curves)
+    num = curves.shape[-1]
+    if num < points:
+        raise InvalidParameterError("Error: cannot filter curves of {0} points with a window of {1} "
+                                    "points.".format(num, points))
+    if outs is None:
+        outs = [np.empty(curves.shape, dtype=np.float64) for _ in derivs]
+    half = points // 2
+    curves = curves.astype(outs[0].dtype, copy=False)
+    for deriv, out in zip(derivs, outs):
+        center, first, last = savgol_matrices(points, polyorder, deriv)
+        interior = out[..., half:num - half]
+        interior[...] = 0
+        for k, weight in enumerate(center.astype(out.dtype)):
+            interior += weight * curves[..., k:k + num - 2 * half]
+        out[..., :half] = curves[..., :points].dot(first.T.astype(out.dtype))
+        out[..., num - half:] = curves[..., num - points:].dot(last.T.astype(out.dtype))
+        if deriv:
+            out /= delta ** deriv
+    return outs
 
 
 def smooth(inpt, window_len=10, window_type='flat'):
     """Smoothing function based on Scipy Cookbook recipe for data smoothing.
 
-    Uses predefined window function (selectable) to smooth a 1D data set
-    Computes the convolution with a normalized window
+    Uses predefined window function (selectable) to smooth a 1D data set, or each row of a 2D array of curves.
+    Computes the convolution with a normalized window, directly for short windows or by FFT for long ones.
 
-    :param inpt: input list or 1d array
+    A window_type of SAVGOL_TYPE uses a Savitzky-Golay filter of window_len + 1 points instead.
+
+    :param inpt: input list or 1d array, or 2d array of curves (curve number, point number)
     :param window_len: even integer size of window
-    :param window_type: string for type of window function
-    :return otpt: 1d numpy array of smoothed data with same length as inpt
+    :param window_type: string for type of window function, one of SMOOTHING_TYPES
+    :return otpt: numpy array of smoothed data with same shape as inpt
     """
     if not (window_len % 2 == 0):
         window_len += 1
         print('Window length supplied is odd - using next highest integer: {}.'.format(window_len))
 
-    if window_len <= 3:
-        print('Error in data smoothing - please select a larger window length')
-        return
+    if window_type == SAVGOL_TYPE:
+        try:
+            return savgol_filter(inpt, window_len + 1)[0]
+        except InvalidParameterError as e:
+            print(e)
+            return
 
-    # window_type = 'hanning'
-    if window_type not in ['flat', 'hanning', 'hamming', 'bartlett', 'blackman']:
-        print('Error - Invalid window_type')
+    try:
+        w = smoothing_window(window_len, window_type)
+    except InvalidParameterError as e:
+        print(e)
         return
 
-    # Generate two arguments to pass into numpy.convolve()
-    # s is the input signal doctored with reflections of the input at the beginning and end
-    # this serves to remove noise in the smoothing method
-    # w is the window matrix based on pre-defined window functions or unit matrix for flat window
-
-    s = np.r_[inpt[window_len-1:0:-1], inpt, inpt[-1:-window_len:-1]]
-    # w = eval('np.'+window_type+'(window_len)')
-    if window_type == 'flat':  # moving average
-        w = np.ones(window_len, 'd')
-    else:
-        w = eval('np.'+window_type+'(window_len)')
-
-    # create smoothed data via numpy.convolve using the normalized input window matrix
-    otpt = np.convolve(w/w.sum(), s, mode='valid')
-
-    # format otpt to be same size as inpt and return
-    return otpt[int(window_len/2-1):-int(window_len/2)]
+    inpt = np.asarray(inpt)
+    if inpt.shape[-1] < window_len:
+        print('Error in data smoothing - window length is longer than the data')
+        return
+    return reflect_smooth(inpt, w, np.empty(inpt.shape, dtype=np.float64))
 
 
 def crop_images(data, indices):
@@ -223,12 +681,81 @@ def crop_images(data, indices):
                 indices[0][1]:indices[1][1]+1]
 
 
-def get_img_array(path, ext=None, swap=False):
+def square_window(xc, yc, rad):
+    """Return the bounds of the (2*rad+1) x (2*rad+1) pixel window centered on (xc, yc).
+
+    :argument xc: integer column of the window center
+    :argument yc: integer row of the window center
+    :argument rad: integer half width of the window
+    :return: tuple (top, left, bottom, right) of inclusive pixel bounds, see integrate_windows()
+    """
+    xc, yc, rad = int(xc), int(yc), int(rad)
+    return yc - rad, xc - rad, yc + rad, xc + rad
+
+
+def integrate_windows(data, windows, block_bytes=WINDOW_BLOCK_BYTES, table=None):
+    """Calculate the mean intensity inside each of a set of rectangular windows for every image.
+
+    Windows may have any size. Each window is clipped to the image and normalized by the
+    number of pixels it covers. Every window is reduced over all energies with one numpy
+    call; for data which is not held in memory, e.g. a LazyStack, the box enclosing all the
+    windows is read once per block of images and shared by the windows. Given a summed-area
+    table of the data, each window it can hold costs four lookups per image instead.
+
+    :argument data: 3d numpy array or LazyStack (height, width, image number)
+    :argument windows: list of tuples (top, left, bottom, right) of inclusive pixel bounds
+    :param block_bytes: integer memory ceiling in bytes for each block of images read from data
+    :param table: summedarea.SummedAreaTable built from data, or None
+    :return: 2d numpy float64 array (window number, image number); rows of windows lying entirely
+             outside the image are NaN
+    """
+    ht, wd, num = data.shape
+    out = np.full((len(windows), num), np.nan)
+    bounds = []
+    for idx, (top, left, bottom, right) in enumerate(windows):
+        top, left = max(int(top), 0), max(int(left), 0)
+        bottom, right = min(int(bottom), ht - 1), min(int(right), wd - 1)
+        if top <= bottom and left <= right:
+            bounds.append((idx, top, left, bottom, right))
+    if table is not None:
+        fits = [b for b in bounds if (b[3] - b[1] + 1) * (b[4] - b[2] + 1) <= table.max_pixels]
+        if fits:
+            sums = table.window_sums([b[1:] for b in fits])
+            for (idx, top, left, bottom, right), curve in zip(fits, sums):
+                out[idx] = curve / ((bottom - top + 1) * (right - left + 1))
+            bounds = [b for b in bounds if (b[3] - b[1] + 1) * (b[4] - b[2] + 1) > table.max_pixels]
+    if not bounds:
+        return out
+    box_top = min(b[1] for b in bounds)
+    box_left = min(b[2] for b in bounds)
+    box_bottom = max(b[3] for b in bounds)
+    box_right = max(b[4] for b in bounds)
+    if isinstance(data, np.ndarray):
+        step = num  # slicing an array is free; reduce each window over every energy at once
+    else:
+        box_bytes = (box_bottom - box_top + 1) * (box_right - box_left + 1) * np.dtype(data.dtype).itemsize
+        step = max(1, block_bytes // box_bytes)
+    for start in range(0, num, step):
+        block = np.asarray(data[box_top:box_bottom + 1, box_left:box_right + 1, start:start + step])
+        for idx, top, left, bottom, right in bounds:
+            window = block[top - box_top:bottom - box_top + 1, left - box_left:right - box_left + 1]
+            out[idx, start:start + block.shape[2]] = (window.sum(axis=(0, 1), dtype=np.float64) /
+                                                      ((bottom - top + 1) * (right - left + 1)))
+    return out
+
+
+def get_img_array(path, ext=None, swap=False, workers=None, binning=1, ebin=1, roi=None, select=None):
     """Generate a 3d numpy array of gray-scale image files.
 
     :param path: path to image files
     :param ext: file extension, default None for raw (.dat) data (not yet implemented)
     :param swap: boolean to swap the byte order of the array; default False
+    :param workers: integer number of threads used to decode image files
+    :param binning: integer spatial binning factor, see bin_image()
+    :param ebin: integer number of consecutive files averaged into each image, see group_paths()
+    :param roi: list of two tuples in (r,c) format 1st = top left corner 2nd = bottom right, see crop_images();
+                each image is cropped as it is decoded and binning is applied after cropping
+    :param select: slice or list of file indices to load, see select_paths(); energy binning groups the selected files
     :return dat_3d: 3d numpy array (height, width, image number)
     """
     if ext is None:
@@ -237,20 +764,20 @@ def get_img_array(path, ext=None, swap=False):
     else:
         # Handle Tiff and Png with '.tif', '.tiff',  and '.png'
         print('Searching for {0} files in path: {1}'.format(ext, path))
-        files = [name for name in os.listdir(path) if name.endswith(ext)]
+        files = get_manifest(path, ext).names
 
         if not files and ext == '.tif':
             # ext = .tif, but not files found, try ext=.tiff
             # print('Error: No Files Found')
             print('Directory does not contain files with \'.tif\' extensions')
             print('Trying \'.tiff\' instead')
-            files = [name for name in os.listdir(path) if name.endswith('.tiff')]
+            files = get_manifest(path, '.tiff').names
 
         elif not files and ext == '.tiff':
             # ext=.tiff but no files found, try .tif
             print('Directory does not contain files with \'.tiff\' extensions')
             print('Trying \'.tif\' instead')
-            files = [name for name in os.listdir(path) if name.endswith('.tif')]
+            files = get_manifest(path, '.tif').names
 
         elif not files:
             # ext must be '.png' but no files were found
@@ -266,58 +793,47 @@ def get_img_array(path, ext=None, swap=False):
 
         # at this point we have found a list of files to parse
         print("Found {} data files to parse.".format(len(files)))
-        files.sort()
-        arr_list = []
-        for fl in files:
-            arr_list.append(read_img(os.path.join(path, fl)))
+        paths = select_paths([os.path.join(path, fl) for fl in files], select)
+        read_frame = read_img
+        if roi is not None:
+            print('Cropping images to region of interest {} ...'.format(roi))
+            read_frame = roi_reader(read_frame, roi)
+        if binning > 1 or ebin > 1:
+            print('Binning {0}x{0} pixels and {1} energies per image ...'.format(binning, ebin))
+            read_frame = binned_reader(read_frame, binning)
+            paths = group_paths(paths, ebin)
+        dat_arr = load_stack(paths, read_frame, workers=workers)
         if swap:
-            return np.dstack(arr_list).byteswap()
-        else:
-            return np.dstack(arr_list)
+            dat_arr.byteswap(inplace=True)
+        return dat_arr
 
 
 def read_img(path):
-        """Use PIL to open an image file, convert to greyscale and output a 2D numpy array.
-
-        In principle should work for .tif, .png, .jpg,
-        and possibly anything else supported by Image.open().
-
-        :param path: path to image to be opened
-        :return:
-        """
-        # print 'opening image %s' % path
-
-        im = Image.open(path)
-
-        # Use the greyscale transformation as defined in the Python Image Library
-        # When converting from a colour image to black and white, the library uses the
-        # ITU - R 601 - 2 luma transform:
-        # L = R * 299 / 1000 + G * 587 / 1000 + B * 114 / 1000
-
-        im = im.convert('L')
-
-        pixels = list(im.getdata())
-        w, h = im.size
-        # generate list of lists of pixel values then convert to numpy array
-        pixels = [pixels[i*w:(i+1)*w] for i in range(h)]
-
-        # try to determine optimal numpy data type
-        m = max(max(pixels))
-        if 0 < m <= 255:
-            typ = np.uint8
-        elif 255 < m <= 65535:
-            typ = np.uint16
-        elif 65535 < m <= 4294967295:
-            typ = np.uint32
-        else:
-            typ = np.uint64
+    """Use PIL to decode an image file straight into a 2D numpy array at its native bit depth.
 
-        try:
-            return np.array(pixels).astype(typ)
-        except TypeError as e:
-            print("Error reading image into numpy array")
-            print("Max value stored exceeds that of 64 bit integer")
-            raise e
+    In principle should work for .tif, .png, .jpg,
+    and possibly anything else supported by Image.open().
+    Greyscale images keep their bit depth, e.g. 16 bit TIFF files give uint16 arrays.
+    Colour and palette images are converted to 8 bit greyscale.
+
+    :param path: path to image to be opened
+    :return: 2d numpy array
+    """
+    with Image.open(path) as im:
+        if im.mode not in NATIVE_IMAGE_MODES:
+            # Use the greyscale transformation as defined in the Python Image Library
+            # When converting from a colour image to black and white, the library uses the
+            # ITU - R 601 - 2 luma transform:
+            # L = R * 299 / 1000 + G * 587 / 1000 + B * 114 / 1000
+            im = im.convert('L')
+        arr = np.array(im)
+
+    if arr.dtype.byteorder == '>':
+        # big endian 16 bit images; use native byte order for arithmetic
+        arr = arr.astype(arr.dtype.newbyteorder('='))
+    # the dtype follows the image mode only, never the pixel values, so every frame of a stack shares it;
+    # 32 bit integer images (mode 'I') stay int32 as decoded by PIL
+    return arr
 
 
 def parse_tiff_header(img, w, h, byte_depth):
@@ -369,16 +885,84 @@ def parse_tiff_header(img, w, h, byte_depth):
                          errors=None)
 
 
+DEFAULT_CONVERSION_MEMORY = 256 * 1024**2  # memory ceiling in bytes for buffers used by convert_to_dat()
+
+
+def convert_to_dat(paths, outdirname, frame_bytes, workers=None, max_memory=DEFAULT_CONVERSION_MEMORY,
+                   progress=None):
+    """Strip the header from data files and write the image data as raw .dat files.
+
+    The image data is taken to be the last frame_bytes bytes of each file, which are copied
+    unchanged (including byte order) to outdirname/<name>.dat. Files are converted by a pool
+    of threads, each of which reuses a single frame sized buffer; the number of threads is
+    limited so that the buffers never exceed max_memory. Output is written to a temporary
+    file which is renamed once complete, so a conversion can be interrupted and resumed:
+    existing output files of the correct size are skipped.
+
+    :argument paths: list of string paths to input files
+    :argument outdirname: string path to directory to output raw .dat files
+    :argument frame_bytes: integer size in bytes of the image data in each file
+    :param workers: integer maximum number of threads; None uses the ThreadPoolExecutor default
+    :param max_memory: integer memory ceiling in bytes for the reused frame buffers
+    :param progress: callable(name, status, count) called after each file, where status is
+                     'converted', 'skipped' or 'failed' and count is the number of files finished so far
+    :return: tuple of integers (converted, skipped, failed)
+    """
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) + 4)  # the ThreadPoolExecutor default
+    workers = max(1, min(workers, max_memory // max(frame_bytes, 1)))
+    local = threading.local()
+    lock = threading.Lock()
+    counts = {'converted': 0, 'skipped': 0, 'failed': 0}
+
+    def convert(path):
+        name = os.path.basename(path).split('.')[0] + '.dat'
+        outpath = os.path.join(outdirname, name)
+        status = 'converted'
+        try:
+            if os.path.exists(outpath) and os.path.getsize(outpath) == frame_bytes:
+                status = 'skipped'
+            else:
+                buf = getattr(local, 'buf', None)
+                if buf is None:
+                    buf = local.buf = bytearray(frame_bytes)
+                with open(path, 'rb') as infile:
+                    header = os.fstat(infile.fileno()).st_size - frame_bytes
+                    if header < 0:
+                        raise InvalidParameterError("Error: file {0} is smaller than one frame of "
+                                                    "{1} bytes.".format(path, frame_bytes))
+                    infile.seek(header)
+                    if infile.readinto(buf) != frame_bytes:
+                        raise IOError("Error: short read from {}".format(path))
+                partial = outpath + '.part'
+                with open(partial, 'wb') as outfile:
+                    outfile.write(buf)
+                os.replace(partial, outpath)
+        except (IOError, OSError, InvalidParameterError) as e:
+            print(e)
+            status = 'failed'
+        with lock:
+            counts[status] += 1
+            finished = sum(counts.values())
+        if progress is not None:
+            progress(name, status, finished)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(convert, paths))
+    return counts['converted'], counts['skipped'], counts['failed']
+
+
 def gen_dat_files(dirname=None, outdirname=None, ext=None,
-                  w=None, h=None, byte_depth=None):
+                  w=None, h=None, byte_depth=None, workers=None):
     """Given a directory with image files, output raw binary files with no header.
 
     :param dirname: string path to directory containing image files
     :param outdirname: string path to directory to output raw .dat files
     :param w: img width
     :param h: imh height
-    :param byte_depth: number of bits per pixel
+    :param byte_depth: number of bytes per pixel
     :param ext:
+    :param workers: integer maximum number of threads used to convert files
     :return:
     """
     if dirname is None or outdirname is None or ext is None or w is None or h is None or byte_depth is None:
@@ -386,7 +970,7 @@ def gen_dat_files(dirname=None, outdirname=None, ext=None,
               image width, image height, and image byte_depth.")
         return
     print('Searching for files in {0} ...'.format(dirname))
-    files = [name for name in os.listdir(dirname) if name.endswith(ext)]
+    files = get_manifest(dirname, ext).names
 
     if not files:
         print("Error: no files found with file extension {0}".format(ext))
@@ -409,23 +993,16 @@ def gen_dat_files(dirname=None, outdirname=None, ext=None,
     else:
         # PNG and JPEG always use Big Endian
         byte_order = 'B'  # default to big endian
-
-    # swap to numpy syntax
-    if byte_order == 'L':
-        byte_order = '<'
-    elif byte_order == 'B':
-        byte_order = '>'
-
-    for file in files:
-        with open(os.path.join(dirname, file), 'rb') as f:
-            header = len(f.read()) - byte_depth * w * h
-            f.seek(0)
-            # generate numpy friendly data format string: ex. '<u2' = little endian, unsigned integer, 2 bytes per pixel
-            fmtstr = byte_order + 'u' + str(byte_depth)
-            data = np.fromstring(f.read()[header:], fmtstr).reshape((h, w))  # strip header information
-            with open(os.path.join(outdirname, file.split('.')[0]+'.dat'), 'wb') as o:
-                data.tofile(o)  # store image data as raw binary file
-    print("Done outputting dat files ...")
+    # image bytes are copied unchanged, so the .dat files keep the byte order of the input files
+    print('Output .dat files use byte order {0}'.format(byte_order))
+
+    converted, skipped, failed = convert_to_dat([os.path.join(dirname, fl) for fl in files],
+                                                outdirname,
+                                                byte_depth * w * h,
+                                                workers=workers)
+    print("Done outputting dat files: {0} converted, {1} already present, {2} failed ...".format(converted,
+                                                                                                skipped,
+                                                                                                failed))
     return
 
 
@@ -0,0 +1,217 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Segmenting a LEEM image into surface phases by the shape of pixel I(V) curves.
+
+minibatch_kmeans() clusters the I(V) curve of every pixel of a 3D stack with
+mini-batch k-means, never holding more than a tile of image rows in memory:
+    1. k-means++ chooses the initial centroids from a regular grid of pixels
+       sampled across the whole image.
+    2. The tiles are read in random order and their curves, shuffled, update
+       the centroids a mini-batch at a time; each centroid moves towards the
+       mean of the curves assigned to it by a step which shrinks with the
+       number of curves it has received.
+    3. A final pass assigns every pixel to its nearest centroid and
+       accumulates the mean I(V) curve of each cluster.
+Curves can be smoothed (with any of the LF.SMOOTHING_TYPES) and normalized
+before clustering, so that clusters follow the shape rather than the
+brightness of the curves. The next tile is read in a background thread
+while the current one is processed. The stack may be an in-memory array, a
+memory mapped stack file or a lazily loaded stack.
+
+A ClusterMap keeps the label map, the centroids and the mean I(V) curve of
+each cluster together with the settings used to find them. Clusters are
+numbered from the largest to the smallest.
+"""
+
+import math
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from LEEMFUNCTIONS import InvalidParameterError, smooth
+
+CLUSTER_BLOCK_BYTES = 256 * 1024**2  # memory ceiling in bytes for the tiles of curves held at once
+NORMALIZATIONS = ['none', 'max', 'standard']
+INIT_SAMPLES_PER_CLUSTER = 256  # pixels sampled for each centroid chosen by k-means++
+
+
+def prepare_curves(block, normalize='none', window_len=None, window_type='flat'):
+    """Flatten a block of a stack into curves, smoothed and normalized for clustering.
+
+    :argument block: 3d numpy array (height, width, image number)
+    :param normalize: 'none'; 'max' to divide each curve by its maximum; 'standard' to subtract the mean of
+                      each curve and divide by its standard deviation
+    :param window_len: even integer size of the smoothing window; None does not smooth
+    :param window_type: string for type of smoothing, one of LF.SMOOTHING_TYPES
+    :return: 2d numpy float32 array (pixel number, image number)
+    :raises InvalidParameterError: if the normalization or smoothing settings are invalid
+    """
+    curves = np.asarray(block, dtype=np.float32).reshape((-1, block.shape[-1]))
+    if window_len:
+        curves = smooth(curves, window_len=window_len, window_type=window_type)
+        if curves is None:
+            raise InvalidParameterError("Error: invalid smoothing settings for clustering.")
+        curves = curves.astype(np.float32)
+    if normalize == 'max':
+        peak = curves.max(axis=1, keepdims=True)
+        curves /= np.where(peak > 0, peak, 1)
+    elif normalize == 'standard':
+        curves -= curves.mean(axis=1, keepdims=True)
+        spread = curves.std(axis=1, keepdims=True)
+        curves /= np.where(spread > 0, spread, 1)
+    elif normalize != 'none':
+        raise InvalidParameterError("Error: invalid normalization {0}; use one of {1}.".format(
+            normalize, NORMALIZATIONS))
+    return curves
+
+
+def nearest_centroid(curves, centroids):
+    """Return the index of the centroid nearest to each curve.
+
+    :argument curves: 2d numpy array (curve number, point number)
+    :argument centroids: 2d numpy array (cluster number, point number)
+    :return: 1d numpy integer array
+    """
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, and |x|^2 is the same for every centroid
+    distance = curves.dot(centroids.T)
+    distance *= -2
+    distance += (centroids**2).sum(axis=1)
+    return distance.argmin(axis=1)
+
+
+def _cluster_sums(curves, labels, k):
+    """Return the float64 sum of the curves with each label (cluster number, point number)."""
+    sums = np.zeros((k, curves.shape[-1]), dtype=np.float64)
+    for label in np.unique(labels):
+        sums[label] = curves[labels == label].sum(axis=0, dtype=np.float64)
+    return sums
+
+
+def _kmeans_plus_plus(curves, k, rng):
+    """Choose k initial centroids from curves, each new centroid far from those already chosen."""
+    chosen = [rng.integers(len(curves))]
+    nearest = ((curves - curves[chosen[0]])**2).sum(axis=1)
+    for _ in range(1, k):
+        total = nearest.sum()
+        idx = rng.choice(len(curves), p=nearest / total) if total > 0 else rng.integers(len(curves))
+        chosen.append(idx)
+        np.minimum(nearest, ((curves - curves[idx])**2).sum(axis=1), out=nearest)
+    return curves[chosen].copy()
+
+
+def minibatch_kmeans(data, k, batch_size=1024, epochs=1, normalize='none', window_len=None, window_type='flat',
+                     seed=None, workers=None, block_bytes=CLUSTER_BLOCK_BYTES):
+    """Cluster the I(V) curve of every pixel of a 3D stack with mini-batch k-means.
+
+    :argument data: 3d numpy array (height, width, image number), memory mapped array or LazyStack
+    :argument k: integer number of clusters
+    :param batch_size: integer number of curves in each mini-batch
+    :param epochs: integer number of passes over the stack updating the centroids
+    :param normalize: normalization of each curve, one of NORMALIZATIONS, see prepare_curves()
+    :param window_len: even integer size of the smoothing window applied to each curve first; None does not smooth
+    :param window_type: string for type of smoothing, one of LF.SMOOTHING_TYPES
+    :param seed: integer seed of the random number generator, for repeatable clusters
+    :param workers: integer number of threads labelling the tiles; None uses the number of CPUs
+    :param block_bytes: integer memory ceiling in bytes for the tiles of curves held at once
+    :return: tuple of 2d numpy int16 label map (height, width), 2d numpy float32 centroids (cluster number,
+             image number) of the prepared curves, and 2d numpy float64 mean I(V) curve of the pixels of each
+             cluster (cluster number, image number); clusters are numbered from the largest to the smallest
+    :raises InvalidParameterError: if k is not between 1 and the number of pixels, or a setting is invalid
+    """
+    ht, wd, num = data.shape
+    pixels = ht * wd
+    if not 1 <= k <= min(pixels, np.iinfo(np.int16).max):
+        raise InvalidParameterError("Error: cannot make {0} clusters of {1} pixels.".format(k, pixels))
+    rng = np.random.default_rng(seed)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, workers)
+    # each tile in flight holds its data, its curves as float32 and the smoothed curves as float64
+    rows = max(1, min(ht, block_bytes // max(2, workers) // max(wd * num * (data.dtype.itemsize + 12), 1)))
+    starts = list(range(0, ht, rows))
+
+    def load(start, block=None):
+        if block is None:
+            block = data[start:start + rows]
+        return prepare_curves(block, normalize=normalize, window_len=window_len, window_type=window_type)
+
+    # initial centroids from a regular grid of pixels spread over the image
+    stride = max(1, int(math.sqrt(pixels / float(k * INIT_SAMPLES_PER_CLUSTER))))
+    sample = prepare_curves(data[::stride, ::stride], normalize=normalize, window_len=window_len,
+                            window_type=window_type)
+    centroids = _kmeans_plus_plus(sample, k, rng)
+    del sample
+
+    received = np.zeros(k, dtype=np.float64)
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        for _ in range(epochs):
+            order = rng.permutation(starts)
+            upcoming = reader.submit(load, order[0])
+            for position in range(len(order)):
+                curves = upcoming.result()
+                if position + 1 < len(order):
+                    upcoming = reader.submit(load, order[position + 1])
+                curves = curves[rng.permutation(len(curves))]
+                for first in range(0, len(curves), batch_size):
+                    batch = curves[first:first + batch_size]
+                    labels = nearest_centroid(batch, centroids)
+                    counts = np.bincount(labels, minlength=k)
+                    sums = _cluster_sums(batch, labels, k)
+                    received += counts
+                    moved = counts > 0
+                    # move each centroid towards the mean of its new curves by counts / received
+                    centroids[moved] += ((sums[moved] - counts[moved, np.newaxis] * centroids[moved]) /
+                                         received[moved, np.newaxis]).astype(np.float32)
+
+    labels = np.empty((ht, wd), dtype=np.int16)
+    totals = []
+
+    def assign(start):
+        block = np.asarray(data[start:start + rows])
+        tile_labels = nearest_centroid(load(start, block), centroids)
+        labels[start:start + rows] = tile_labels.reshape(block.shape[:2])
+        totals.append(_cluster_sums(block.reshape((-1, num)), tile_labels, k))
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(starts))) as pool:
+        list(pool.map(assign, starts))
+
+    sizes = np.bincount(labels.ravel(), minlength=k)
+    curves = np.sum(totals, axis=0) / np.maximum(sizes, 1)[:, np.newaxis]
+    # number the clusters from the largest to the smallest
+    order = np.argsort(-sizes, kind='stable')
+    rank = np.empty(k, dtype=np.int16)
+    rank[order] = np.arange(k)
+    return rank[labels], centroids[order], curves[order]
+
+
+class ClusterMap(object):
+    """Cluster labels of each pixel of a 3D data stack, with the centroid curves and settings used to find them."""
+
+    def __init__(self, data, k, normalize='none', window_len=None, window_type='flat', seed=None, workers=None):
+        """Cluster every curve of data, see minibatch_kmeans().
+
+        :argument data: 3d numpy array (height, width, image number)
+        :argument k: integer number of clusters
+        """
+        self.k = k
+        self.normalize = normalize
+        self.window_len = window_len
+        self.window_type = window_type
+        self.labels, self.centroids, self.curves = minibatch_kmeans(data, k, normalize=normalize,
+                                                                    window_len=window_len, window_type=window_type,
+                                                                    seed=seed, workers=workers)
+        try:
+            self.source = weakref.ref(data)
+        except TypeError:
+            self.source = None
+
+    def describes(self, data):
+        """Return True if the clusters were found in the array data."""
+        return self.source is not None and self.source() is data
+
+    def sizes(self):
+        """Return the number of pixels in each cluster."""
+        return np.bincount(self.labels.ravel(), minlength=self.k)
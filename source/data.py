@@ -15,7 +15,66 @@ or raw binary data.
 Alongside the 3d numpy array there must be some type of list or
 container for energy parameters which corresponds directly to the
 third axis of the numpy array.
+
+For raw UView data the header values of each image (start voltage,
+acquisition time, exposure, ...) are kept in a numpy structured array
+alongside the energy list.
+
+Smoothed I(V) curves are memoized per pixel in a CurveCache
+with a fixed memory budget rather than in a second full size array.
+I(V) curves integrated over rectangular windows are memoized the same
+way, so plotting, averaging and exporting the same windows share one
+integration.
 """
+from collections import OrderedDict
+
+DEFAULT_CURVE_CACHE_BYTES = 64 * 1024**2  # 64 MB of smoothed I(V) curves
+
+
+class CurveCache(object):
+    """LRU cache of smoothed I(V) curves with a memory budget.
+
+    Keys should include the pixel position and every setting used to
+    compute the curve, e.g. (y, x, window_type, window_len, rescaled), so
+    that changing a smoothing setting can never return a stale curve.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CURVE_CACHE_BYTES):
+        """Initialize an empty cache.
+
+        :param max_bytes: integer maximum total size in bytes of cached curves
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._curves = OrderedDict()
+
+    def __len__(self):
+        return len(self._curves)
+
+    def get(self, key):
+        """Return the cached curve for key, marking it most recently used, or None."""
+        curve = self._curves.get(key)
+        if curve is not None:
+            self._curves.move_to_end(key)
+        return curve
+
+    def put(self, key, curve):
+        """Store a curve (numpy array), evicting least recently used curves to stay within budget."""
+        old = self._curves.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        if curve.nbytes > self.max_bytes:
+            return
+        self._curves[key] = curve
+        self.nbytes += curve.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._curves.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        """Drop all cached curves, e.g. when new data is loaded."""
+        self._curves.clear()
+        self.nbytes = 0
 
 
 class LeedData(object):
@@ -33,6 +92,17 @@ class LeedData(object):
         self.box_rad = br  # default value is 20 yielding a 40x40 rectangular integration window
         self.average_ilist = None
         self.timelist = []  # used for plotting I(t) data
+        self.smoothcache = CurveCache()  # smoothed I(V) curves keyed by pixel and smoothing settings
+        self.windowcache = CurveCache()  # window I(V) curves keyed by (top, left, bottom, right) bounds
+        self.sat = None  # summedarea.SummedAreaTable of dat3d, built in the background when enabled
+        self.metadata = None  # uview.HEADER_DTYPE array of per image header values for raw UView data
+        self.raw = None  # rawformat.RawBuffer of the loaded raw files when they were read unbinned
+
+    def clear_caches(self):
+        """Drop cached curves and the summed-area table; call whenever dat3d changes."""
+        self.smoothcache.clear()
+        self.windowcache.clear()
+        self.sat = None
 
 
 class LeemData(object):
@@ -57,3 +127,20 @@ class LeemData(object):
         self.curX = 0
         self.curY = 0
         self.timelist = []  # used for plotting I(t) data
+        self.smoothcache = CurveCache()  # smoothed I(V) curves keyed by pixel and smoothing settings
+        self.windowcache = CurveCache()  # window I(V) curves keyed by (top, left, bottom, right) bounds
+        self.sat = None  # summedarea.SummedAreaTable of dat3d, built in the background when enabled
+        self.smoothed = None  # smoothing.SmoothedStack of dat3d, built in the background on request
+        self.minima = None  # minima.MinimaMap of the I(V) minima of each pixel of dat3d, counted on request
+        self.clusters = None  # clustering.ClusterMap of the I(V) curves of dat3d, clustered on request
+        self.metadata = None  # uview.HEADER_DTYPE array of per image header values for raw UView data
+        self.raw = None  # rawformat.RawBuffer of the loaded raw files when they were read unbinned
+
+    def clear_caches(self):
+        """Drop cached curves and every result derived from dat3d; call whenever dat3d changes."""
+        self.smoothcache.clear()
+        self.windowcache.clear()
+        self.sat = None
+        self.smoothed = None
+        self.minima = None
+        self.clusters = None
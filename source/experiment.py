@@ -37,6 +37,18 @@ class Experiment(object):
         self.num_files = ''
         self.imw = ''
         self.imh = ''
+        self.load_workers = None  # number of threads used to read data files; None uses the default
+        self.memory_map = False  # flag to memory map stack files rather than read them into memory
+        self.lazy_load = False  # flag to read raw/image frames on demand rather than all at once
+        self.frame_cache_mb = 512  # memory budget for frames cached by lazily loaded data
+        self.read_ahead = 8  # frames read in the background on each side of the viewed lazily loaded image
+        self.summed_area = False  # flag to build a summed-area table of loaded data for fast window I(V)
+        self.smooth_on_load = False  # flag to smooth every LEEM I(V) curve in the background after loading
+        self.spatial_bin = None  # side length of pixel blocks averaged on load; None uses the Config tab
+        self.energy_bin = None  # number of consecutive files averaged on load; None uses the Config tab
+        self.roi = None  # [(top, left), (bottom, right)] region of each image to load; None loads whole images
+        self.energy_range = None  # (min, max, stride) window of energies (or times) to load; None loads all files
+        self.selection = None  # slice of file indices to load, set from energy_range when the experiment is loaded
 
         self.loaded_settings = None
 
@@ -122,6 +134,26 @@ class Experiment(object):
             self.imw = img_settings['Width']
             self.imh = img_settings['Height']
 
+            # Optional performance settings
+            self.load_workers = exp_settings.get("Load Workers", None)
+            self.memory_map = exp_settings.get("Memory Map", False)
+            self.lazy_load = exp_settings.get("Lazy Loading", False)
+            self.frame_cache_mb = exp_settings.get("Frame Cache Size", 512)
+            self.read_ahead = exp_settings.get("Read Ahead", 8)
+            self.summed_area = exp_settings.get("Summed Area Table", False)
+            self.smooth_on_load = exp_settings.get("Smooth On Load", False)
+            self.spatial_bin = exp_settings.get("Spatial Binning", None)
+            self.energy_bin = exp_settings.get("Energy Binning", None)
+            roi_settings = exp_settings.get("ROI", None)
+            if roi_settings is not None:
+                top, left = roi_settings['Top'], roi_settings['Left']
+                self.roi = [(top, left), (top + roi_settings['Height'] - 1, left + roi_settings['Width'] - 1)]
+            range_settings = exp_settings.get("Load Range", None)
+            if range_settings is not None:
+                self.energy_range = (range_settings.get("Min", None),
+                                     range_settings.get("Max", None),
+                                     range_settings.get("Stride", 1))
+
             # self.loaded_settings = None
             # pp.pprint(vars(self))
 
@@ -0,0 +1,76 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Growable 3D data stacks for live acquisition.
+
+A GrowableStack holds a (height, width, image number) array in a buffer with
+spare capacity along the image axis. Appending frames writes into the spare
+capacity; when the buffer is full its capacity is doubled, so appending is
+amortized O(1) per frame. The data property returns a numpy view of the
+filled portion of the buffer which can be used anywhere the main data array
+is expected.
+"""
+
+import numpy as np
+
+MIN_CAPACITY = 16  # minimum number of frames allocated
+
+
+class GrowableStack(object):
+    """3D data stack which can be extended one or more frames at a time."""
+
+    def __init__(self, data, capacity=None):
+        """Copy an existing 3D array into a buffer with room to grow.
+
+        :argument data: 3d numpy array (height, width, image number)
+        :param capacity: integer initial capacity in frames; default is twice the current number of frames
+        """
+        data = np.asarray(data)
+        if data.ndim != 3:
+            raise ValueError("Error: GrowableStack requires a 3D array (height, width, image number).")
+        self.count = data.shape[2]
+        if capacity is None:
+            capacity = 2 * self.count
+        self._buffer = np.empty(data.shape[:2] + (max(capacity, self.count, MIN_CAPACITY),), dtype=data.dtype)
+        self._buffer[:, :, :self.count] = data
+
+    @property
+    def capacity(self):
+        """Number of frames which can be held before the buffer is reallocated."""
+        return self._buffer.shape[2]
+
+    @property
+    def data(self):
+        """View of the filled portion of the buffer (height, width, image number)."""
+        return self._buffer[:, :, :self.count]
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, count):
+        """Ensure the buffer can hold count frames, growing the capacity geometrically."""
+        if count <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < count:
+            capacity *= 2
+        buffer = np.empty(self._buffer.shape[:2] + (capacity,), dtype=self._buffer.dtype)
+        buffer[:, :, :self.count] = self._buffer[:, :, :self.count]
+        self._buffer = buffer
+
+    def append(self, frames):
+        """Append a single 2D frame or a 3D block of frames to the end of the stack.
+
+        :argument frames: 2d numpy array (height, width) or 3d numpy array (height, width, image number)
+        :return: view of the filled portion of the buffer
+        """
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[:, :, np.newaxis]
+        if frames.shape[:2] != self._buffer.shape[:2]:
+            raise ValueError("Error: frame shape {0} does not match stack shape {1}.".format(frames.shape[:2],
+                                                                                           self._buffer.shape[:2]))
+        self._reserve(self.count + frames.shape[2])
+        self._buffer[:, :, self.count:self.count + frames.shape[2]] = frames
+        self.count += frames.shape[2]
+        return self.data
@@ -0,0 +1,292 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Lazily loaded 3D data stacks.
+
+A LazyStack stands in for the (height, width, image number) numpy array
+normally produced by LF.process_LEEM_Data() or LF.get_img_array(). Frames
+are only read from disk when they are indexed, and a bounded LRU cache of
+decoded frames keeps recently viewed images in memory. This allows browsing
+experiments which do not fit in RAM.
+
+Indexing follows numpy semantics for the common access patterns used in
+please.py:
+    stack[::-1, :, idx]          single image (cached)
+    stack[y, x, :]               I(V) curve of a single pixel
+    stack[y0:y1, x0:x1, :]       I(V) curves of a window of pixels
+
+Requests for a single image go through the frame cache. Requests spanning
+many images use cached frames and never evict any, so that extracting an
+I(V) curve does not evict the images being browsed. For raw data files,
+which are memory mapped, the spatial index is applied to each frame as it
+is read, which only touches the pages containing the requested pixels;
+cached frames are copied out of their memory maps, so the cache holds no
+open files. Frames of image files (TIFF, PNG, ...) are decoded whole, so
+those read for a curve are added to the cache while it has room, and the
+next curve is served from memory rather than decoding every image again.
+
+A ReadAhead attached to a LazyStack decodes the images on either side of
+the one being viewed in background threads, reading first in the direction
+the User is moving through the stack. Read-ahead frames are stored in the
+frame cache, and a request for a frame which is still being read waits for
+that read rather than starting a second one. Reads which have not started
+are dropped when the User jumps to a distant image.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_CACHE_BYTES = 512 * 1024**2  # 512 MB of decoded frames
+DEFAULT_READ_AHEAD = 8  # frames read ahead on each side of the viewed image
+
+
+class LazyStack(object):
+    """Array-like 3D data stack whose frames are read on demand."""
+
+    def __init__(self, paths, read_frame, cache_bytes=DEFAULT_CACHE_BYTES):
+        """Initialize the stack from a list of data files.
+
+        The first file is read to determine the frame shape and dtype.
+
+        :argument paths: list of string paths to data files in stacking order
+        :argument read_frame: callable taking a string path and returning a 2d numpy array
+        :param cache_bytes: integer maximum size in bytes of the decoded frame cache
+        """
+        if not paths:
+            raise ValueError("Error: LazyStack requires at least one data file.")
+        self.paths = list(paths)
+        self.read_frame = read_frame
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.readahead = None  # ReadAhead attached to this stack, if any
+
+        first = np.array(read_frame(self.paths[0]))
+        if first.ndim != 2:
+            raise ValueError("Error: file {0} is not a 2D image.".format(self.paths[0]))
+        self.shape = first.shape + (len(self.paths),)
+        self.dtype = first.dtype
+        self._insert(0, first)
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        """Materialize the full stack as a numpy array."""
+        arr = self[:, :, :]
+        return arr if dtype is None else arr.astype(dtype)
+
+    def _insert(self, idx, frame, evict=True):
+        """Add a frame to the cache, evicting least recently used frames to stay within budget.
+
+        :param evict: if False, the frame is only added if it fits in the budget without evicting others
+        """
+        with self._lock:
+            if idx in self._cache or frame.nbytes > self.cache_bytes:
+                return
+            if not evict and self._cached_bytes + frame.nbytes > self.cache_bytes:
+                return
+            self._cache[idx] = frame
+            self._cached_bytes += frame.nbytes
+            while self._cached_bytes > self.cache_bytes:
+                _, old = self._cache.popitem(last=False)
+                self._cached_bytes -= old.nbytes
+
+    def _cached(self, idx):
+        """Return a cached frame, marking it most recently used, or None."""
+        with self._lock:
+            frame = self._cache.get(idx)
+            if frame is not None:
+                self._cache.move_to_end(idx)
+            return frame
+
+    def _read(self, idx):
+        """Read a single frame from disk and check its shape."""
+        frame = np.asarray(self.read_frame(self.paths[idx]))
+        if frame.shape != self.shape[:2]:
+            raise ValueError("Error: file {0} has shape {1}, expected {2}.".format(self.paths[idx],
+                                                                                 frame.shape,
+                                                                                 self.shape[:2]))
+        return frame
+
+    def _load(self, idx):
+        """Read a single frame into memory for the cache.
+
+        Frames of raw files are memory maps, each holding an open file; cached frames are copies so that the
+        cache holds neither open files nor pages which were never read.
+        """
+        return np.array(self._read(idx))
+
+    def get_frame(self, idx):
+        """Return the full 2D image at index idx, reading it through the cache.
+
+        :argument idx: integer image number
+        :return: 2d numpy array (height, width)
+        """
+        if idx < 0:
+            idx += self.shape[2]
+        if not 0 <= idx < self.shape[2]:
+            raise IndexError("Error: image index {0} out of range for {1} images.".format(idx, self.shape[2]))
+        frame = self._cached(idx)
+        if frame is None and self.readahead is not None:
+            frame = self.readahead.wait(idx)
+        if frame is None:
+            frame = self._load(idx)
+            self._insert(idx, frame)
+        return frame
+
+    def clear_cache(self):
+        """Drop all cached frames."""
+        with self._lock:
+            self._cache.clear()
+            self._cached_bytes = 0
+
+    def _normalize_key(self, key):
+        """Expand a numpy style index into a (rows, cols, images) tuple."""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            pos = key.index(Ellipsis)
+            fill = (slice(None),) * (3 - len(key) + 1)
+            key = key[:pos] + fill + key[pos + 1:]
+        if len(key) > 3:
+            raise IndexError("Error: too many indices for a 3D stack.")
+        return key + (slice(None),) * (3 - len(key))
+
+    def __getitem__(self, key):
+        """Index the stack as a (height, width, image number) numpy array."""
+        rows, cols, images = self._normalize_key(key)
+        if isinstance(images, (int, np.integer)):
+            return self.get_frame(int(images))[rows, cols]
+
+        indices = np.arange(self.shape[2])[images]
+        out = None
+        for k, idx in enumerate(indices):
+            frame = self._cached(idx)
+            if frame is None:
+                frame = self._read(idx)
+                if not isinstance(frame, np.memmap):
+                    # a decoded image; keep it for the next curve if there is room
+                    self._insert(idx, frame, evict=False)
+            part = np.asarray(frame[rows, cols])
+            if out is None:
+                out = np.empty(part.shape + (len(indices),), dtype=self.dtype)
+            out[..., k] = part
+        if out is None:
+            # empty selection along the image axis
+            out = np.empty(np.empty(self.shape[:2])[rows, cols].shape + (0,), dtype=self.dtype)
+        return out
+
+
+class ReadAhead(object):
+    """Read the frames around the viewed image of a LazyStack in background threads."""
+
+    def __init__(self, stack, depth=DEFAULT_READ_AHEAD, workers=2):
+        """Attach a read-ahead buffer to a LazyStack.
+
+        :argument stack: LazyStack to read ahead in
+        :param depth: integer number of frames to read on each side of the viewed image; limited so
+                      that read-ahead frames fill at most half of the stack's frame cache
+        :param workers: integer number of reading threads
+        """
+        frame_bytes = stack.shape[0] * stack.shape[1] * stack.dtype.itemsize
+        self.stack = stack
+        self.depth = max(0, min(depth, stack.cache_bytes // max(frame_bytes, 1) // 4))
+        self.direction = 1
+        self._last = None
+        self._generation = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        stack.readahead = self
+
+    def _read(self, idx, generation):
+        """Read a frame into the cache unless the request has been superseded."""
+        if generation != self._generation:
+            return None
+        frame = self.stack._cached(idx)
+        if frame is None:
+            # _load copies the frame, so the disk reads happen in this thread rather than when it is displayed
+            frame = self.stack._load(idx)
+            self.stack._insert(idx, frame)
+        return frame
+
+    def _forget(self, idx, future):
+        """Drop a finished read from the list of reads in flight."""
+        with self._lock:
+            if self._futures.get(idx) is future:
+                del self._futures[idx]
+
+    def update(self, idx):
+        """Record that image idx is being viewed and queue reads of the frames around it.
+
+        Frames in the direction of travel are read first. Moving more than one
+        image at a time cancels reads which have not started.
+
+        :argument idx: integer index of the viewed image
+        """
+        if self._last is not None:
+            step = idx - self._last
+            if step:
+                self.direction = 1 if step > 0 else -1
+            if abs(step) > 1:
+                self.cancel()
+        self._last = idx
+        order = [idx + self.direction * k for k in range(1, self.depth + 1)]
+        order += [idx - self.direction * k for k in range(1, self.depth + 1)]
+        queued = []
+        with self._lock:
+            for target in order:
+                if not 0 <= target < self.stack.shape[2] or target in self._futures:
+                    continue
+                if self.stack._cached(target) is not None:
+                    continue
+                future = self._pool.submit(self._read, target, self._generation)
+                self._futures[target] = future
+                queued.append((target, future))
+        # callbacks run immediately for reads which have already finished, so add them without the lock held
+        for target, future in queued:
+            future.add_done_callback(lambda f, target=target: self._forget(target, f))
+
+    def wait(self, idx):
+        """Return frame idx if it is being read ahead, waiting for the read to finish, otherwise None."""
+        with self._lock:
+            future = self._futures.get(idx)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except CancelledError:
+            return None
+
+    def cancel(self):
+        """Drop queued reads; reads already in progress finish and are cached."""
+        with self._lock:
+            self._generation += 1
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            future.cancel()
+
+    def close(self):
+        """Cancel queued reads, stop the reading threads and detach from the stack."""
+        self.cancel()
+        self._pool.shutdown(wait=False)
+        if self.stack.readahead is self:
+            self.stack.readahead = None
@@ -0,0 +1,159 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Cached manifests of experiment data directories.
+
+A manifest records, for each data file in a directory, the file name, size,
+modification time, detected header length, dtype and energy index (position
+in the sorted file list). Manifests are built with os.scandir() and stat only;
+no data file is opened. Header length and dtype are only known for raw data,
+where the image dimensions and format are given by the experiment settings.
+
+Manifests are cached per directory for the lifetime of the process. A later
+call to get_manifest() for the same directory only rescans the directory
+listing if the directory's mtime has changed since the last scan, i.e. files
+were added, removed or renamed. A rescan reuses the entries of files whose
+size and mtime are unchanged, and only inspects files which were added or
+modified since the last scan. Files rewritten in place do not change the
+directory's mtime; callers which must see them, such as the thread watching
+a directory for files still being written, rescan with update().
+
+A manifest is shared by every loader of its directory and by the thread
+watching it for new files. Rescans hold a per manifest lock, and the new
+listing replaces the old one in a single assignment, so a reader always sees
+a complete listing, either before or after the rescan.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+ManifestEntry = namedtuple('ManifestEntry', ['name', 'size', 'mtime', 'header', 'dtype', 'index'])
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+class DirectoryManifest(object):
+    """Cached listing of the data files in a single directory."""
+
+    def __init__(self, dirname, exts, frame_bytes=None, dtype=None):
+        """Initialize an empty manifest; call update() to scan the directory.
+
+        :argument dirname: string path to data directory
+        :argument exts: string or tuple of strings of accepted file extensions
+        :param frame_bytes: integer size in bytes of the image data in each raw file;
+                            used to calculate header lengths
+        :param dtype: numpy dtype string of raw files
+        """
+        self.dirname = dirname
+        self.exts = tuple(exts) if isinstance(exts, (list, tuple)) else (exts,)
+        self.frame_bytes = frame_bytes
+        self.dtype = dtype
+        self._lock = threading.Lock()  # serializes rescans
+        self._listing = ([], {})  # (entries in stacking order, entries by file name), replaced as a whole
+        self._dir_mtime = None  # st_mtime_ns of the directory when it was last scanned
+
+    def _inspect(self, name, stat):
+        """Create a manifest entry for a new or modified file."""
+        header = None
+        if self.frame_bytes is not None:
+            header = stat.st_size - self.frame_bytes
+        return ManifestEntry(name, stat.st_size, stat.st_mtime_ns, header, self.dtype, None)
+
+    def update(self):
+        """Rescan the directory, only inspecting files added or changed since the last scan.
+
+        Hidden files (beginning with a leading period) are ignored.
+
+        :return: number of entries added or changed
+        """
+        with self._lock:
+            # taken before the scan, so files added while scanning cause the next refresh() to rescan
+            dir_mtime = os.stat(self.dirname).st_mtime_ns
+            by_name = self._listing[1]
+            found = {}
+            changed = 0
+            with os.scandir(self.dirname) as it:
+                for dirent in it:
+                    name = dirent.name
+                    if name.startswith('.') or not name.endswith(self.exts) or not dirent.is_file():
+                        continue
+                    stat = dirent.stat()
+                    old = by_name.get(name)
+                    if old is not None and old.size == stat.st_size and old.mtime == stat.st_mtime_ns:
+                        found[name] = old
+                    else:
+                        found[name] = self._inspect(name, stat)
+                        changed += 1
+            entries = [found[name]._replace(index=idx) for idx, name in enumerate(sorted(found))]
+            self._listing = (entries, {entry.name: entry for entry in entries})
+            self._dir_mtime = dir_mtime
+        return changed
+
+    def refresh(self):
+        """Rescan the directory only if its mtime has changed since the last scan.
+
+        :return: number of entries added or changed
+        """
+        if os.stat(self.dirname).st_mtime_ns == self._dir_mtime:
+            return 0
+        return self.update()
+
+    @property
+    def entries(self):
+        """List of ManifestEntry in stacking (energy index) order, as of the last completed scan."""
+        return self._listing[0]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    @property
+    def names(self):
+        """List of file names in stacking (energy index) order."""
+        return [entry.name for entry in self.entries]
+
+    @property
+    def paths(self):
+        """List of full file paths in stacking (energy index) order."""
+        return [os.path.join(self.dirname, entry.name) for entry in self.entries]
+
+    def header_length(self, name):
+        """Return the header length recorded for a file name or path, or None if unknown."""
+        entry = self._listing[1].get(os.path.basename(name))
+        return None if entry is None else entry.header
+
+
+def get_manifest(dirname, exts, frame_bytes=None, dtype=None, rescan=False):
+    """Return an up to date manifest of a data directory, reusing the cached manifest if present.
+
+    :argument dirname: string path to data directory
+    :argument exts: string or tuple of strings of accepted file extensions
+    :param frame_bytes: integer size in bytes of the image data in each raw file
+    :param dtype: numpy dtype string of raw files
+    :param rescan: bool flag to rescan even if the directory's mtime is unchanged
+    :return: DirectoryManifest
+    """
+    key = (os.path.realpath(dirname),
+           tuple(exts) if isinstance(exts, (list, tuple)) else (exts,),
+           frame_bytes,
+           dtype)
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = DirectoryManifest(dirname, exts, frame_bytes=frame_bytes, dtype=dtype)
+            _manifests[key] = manifest
+    if rescan:
+        manifest.update()
+    else:
+        manifest.refresh()
+    return manifest
+
+
+def clear_manifests():
+    """Drop all cached manifests."""
+    with _manifests_lock:
+        _manifests.clear()
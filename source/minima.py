@@ -0,0 +1,183 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Counting the minima of the I(V) curve of every pixel in a 3D data stack.
+
+The number of minima in a LEEM-I(V) curve counts the layers of few-layer
+materials such as graphene. find_minima() marks the local minima of a batch
+of curves which are deep enough and fall in an energy window; the depth of
+a minimum is its prominence: the smaller of the highest points reached on
+either side before the curve drops below the minimum again (or the search
+window or curve ends), less the minimum itself. Every step is a vectorized
+operation over the whole batch (the search for the prominence of each
+candidate stops as soon as the curve drops below it), so count_minima()
+processes a stack in tiles of image rows in parallel threads with bounded
+temporary memory. Each tile can be smoothed first with any of the
+LF.SMOOTHING_TYPES.
+
+A MinimaMap keeps the per pixel count of minima and their energies, padded
+with NaN, together with the settings used to find them.
+"""
+
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from LEEMFUNCTIONS import InvalidParameterError, smooth
+
+MINIMA_BLOCK_BYTES = 32 * 1024**2  # memory ceiling in bytes for the temporary arrays of each tile
+
+
+def find_minima(curves, energies, prominence=0.0, emin=None, emax=None, search=None):
+    """Mark the local minima of curves which are prominent enough and lie inside an energy window.
+
+    A flat bottomed minimum is marked at its first point.
+
+    :argument curves: numpy array of one or more curves along the last axis
+    :argument energies: 1d array of the energy (or time) of each curve point
+    :param prominence: float smallest prominence of a minimum, in the units of curves
+    :param emin: float lowest energy of a minimum; None for no limit
+    :param emax: float highest energy of a minimum; None for no limit
+    :param search: integer number of points searched on each side of a minimum for its prominence;
+                   None searches the whole curve
+    :return: boolean numpy array with the shape of curves, True at each minimum
+    """
+    curves = np.asarray(curves, dtype=np.float32)
+    energies = np.asarray(energies, dtype=np.float64)
+    num = curves.shape[-1]
+    found = np.zeros(curves.shape, dtype=bool)
+    if num < 3:
+        return found
+    # candidates are lower than the point before and no higher than the point after
+    inner = found[..., 1:-1]
+    inner[...] = (curves[..., 1:-1] < curves[..., :-2]) & (curves[..., 1:-1] <= curves[..., 2:])
+    in_window = np.ones(num, dtype=bool)
+    if emin is not None:
+        in_window &= energies >= emin
+    if emax is not None:
+        in_window &= energies <= emax
+    found &= in_window
+    if not found.any():
+        return found
+
+    # highest point on each side before the curve drops below the candidate; only candidates are searched,
+    # and each search ends as soon as its side drops below the candidate, so the work follows the curves
+    flat = curves.reshape((-1, num))
+    marks = found.reshape((-1, num))
+    curve, index = np.nonzero(marks)
+    value = flat[curve, index]
+    search = num - 1 if search is None else min(int(search), num - 1)
+    sides = []
+    for direction in (-1, 1):
+        highest = value.copy()
+        alive = np.arange(value.size)
+        for step in range(1, search + 1):
+            position = index[alive] + direction * step
+            inside = (position >= 0) & (position < num)
+            alive, position = alive[inside], position[inside]
+            reached = flat[curve[alive], position]
+            higher = reached >= value[alive]
+            alive, reached = alive[higher], reached[higher]
+            if not alive.size:
+                break
+            highest[alive] = np.maximum(highest[alive], reached)
+        sides.append(highest)
+    depth = np.minimum(sides[0], sides[1]) - value
+    shallow = (depth <= 0) | (depth < prominence)
+    marks[curve[shallow], index[shallow]] = False
+    return found
+
+
+def _minima_energies(found, energies, count):
+    """Return the energies of the first count minima of each curve, padded with NaN."""
+    shape = found.shape[:-1] + (count,)
+    if not count:
+        return np.empty(shape, dtype=np.float32)
+    # stable sort brings the indices of the minima to the front in energy order
+    order = np.argsort(~found, axis=-1, kind='stable')[..., :count]
+    positions = np.asarray(energies, dtype=np.float32)[order]
+    positions[np.arange(count) >= found.sum(axis=-1)[..., np.newaxis]] = np.nan
+    return positions
+
+
+def count_minima(data, energies, prominence=0.0, emin=None, emax=None, search=None, window_len=None,
+                 window_type='flat', workers=None, block_bytes=MINIMA_BLOCK_BYTES):
+    """Count the minima of the I(V) curve of every pixel of a 3D stack.
+
+    :argument data: 3d numpy array (height, width, image number) or array-like LazyStack
+    :argument energies: list of the energy (or time) of each image
+    :param prominence: float smallest prominence of a minimum, see find_minima()
+    :param emin: float lowest energy of a minimum; None for no limit
+    :param emax: float highest energy of a minimum; None for no limit
+    :param search: integer number of points searched on each side of a minimum; None searches the whole curve
+    :param window_len: even integer size of the smoothing window applied to each curve first; None does not smooth
+    :param window_type: string for type of smoothing, one of LF.SMOOTHING_TYPES
+    :param workers: integer number of threads; None uses the number of CPUs
+    :param block_bytes: integer memory ceiling in bytes for the temporary arrays of each tile
+    :return: tuple of 2d numpy uint16 array of minima counts (height, width) and 3d numpy float32 array of minima
+             energies (height, width, largest count) padded with NaN
+    :raises InvalidParameterError: if the energies do not match the stack or the smoothing settings are invalid
+    """
+    ht, wd, num = data.shape
+    if len(energies) != num:
+        raise InvalidParameterError("Error: {0} energies given for {1} images.".format(len(energies), num))
+    counts = np.zeros((ht, wd), dtype=np.uint16)
+    # a tile holds the curves as float32, the smoothed curves and their reflections as float64, and the minima mask
+    row_bytes = max(wd * num * 32, 1)
+    rows = max(1, min(ht, block_bytes // row_bytes))
+    tiles = {}
+
+    def work(start):
+        tile = np.asarray(data[start:start + rows], dtype=np.float32)
+        if window_len:
+            tile = smooth(tile, window_len=window_len, window_type=window_type)
+            if tile is None:
+                raise InvalidParameterError("Error: invalid smoothing settings for counting minima.")
+        found = find_minima(tile, energies, prominence=prominence, emin=emin, emax=emax, search=search)
+        counts[start:start + rows] = found.sum(axis=-1)
+        tiles[start] = _minima_energies(found, energies, int(counts[start:start + rows].max(initial=0)))
+
+    starts = range(0, ht, rows)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(starts)))) as pool:
+        list(pool.map(work, starts))
+
+    positions = np.full((ht, wd, int(counts.max(initial=0))), np.nan, dtype=np.float32)
+    for start, tile in tiles.items():
+        positions[start:start + rows, :, :tile.shape[-1]] = tile
+    return counts, positions
+
+
+class MinimaMap(object):
+    """Per pixel minima counts and energies of a 3D data stack and the settings used to find them."""
+
+    def __init__(self, data, energies, prominence=0.0, emin=None, emax=None, search=None, window_len=None,
+                 window_type='flat', workers=None):
+        """Count the minima of every curve of data, see count_minima().
+
+        :argument data: 3d numpy array (height, width, image number)
+        :argument energies: list of the energy (or time) of each image
+        """
+        self.prominence = prominence
+        self.emin = emin
+        self.emax = emax
+        self.window_len = window_len
+        self.window_type = window_type
+        self.counts, self.energies = count_minima(data, energies, prominence=prominence, emin=emin, emax=emax,
+                                                  search=search, window_len=window_len, window_type=window_type,
+                                                  workers=workers)
+        try:
+            self.source = weakref.ref(data)
+        except TypeError:
+            self.source = None
+
+    def describes(self, data):
+        """Return True if the minima were counted in the array data."""
+        return self.source is not None and self.source() is data
+
+    def histogram(self):
+        """Return the number of pixels with each count of minima, indexed by count."""
+        return np.bincount(self.counts.ravel())
@@ -0,0 +1,86 @@
+"""Pack an experiment directory into a single PLEASE stack file.
+
+Read all data files described by an Experiment YAML config file and
+write them, along with the energy list and experiment settings, to a
+chunked .pstk stack file. See stackfile.py for the file format.
+
+Usage:
+python pack_stack.py experiment.yaml outputfile [compression] [layout]
+
+compression is one of none, zlib (default), or lzma.
+layout is one of frame (default) or pixel. The pixel layout keeps each pixel's
+I(V) curve contiguous on disk; combined with no compression the stack can be
+memory mapped when loaded (set "Memory Map: true" in the Experiment YAML).
+"""
+import os
+import sys
+
+import numpy as np
+
+import LEEMFUNCTIONS as LF
+from experiment import Experiment
+from manifest import get_manifest
+from stackfile import COMPRESSION_TYPES, FRAME_LAYOUT, LAYOUT_TYPES, STACK_EXTENSION, pack_stack_file
+
+
+def main():
+    """Run from the commandline - user arguments passed into sys.argv."""
+    if len(sys.argv) < 3:
+        print("Error: Invalid number of command line arguments")
+        print("Usage: python pack_stack.py experiment.yaml outputfile [compression] [layout]")
+        return
+
+    config = sys.argv[1]
+    if not os.path.exists(config):
+        print("Error: experiment config file, {}, does not exist.".format(config))
+        return
+
+    outfile = sys.argv[2]
+    if not outfile.endswith(STACK_EXTENSION):
+        outfile += STACK_EXTENSION
+
+    compression = sys.argv[3] if len(sys.argv) > 3 else 'zlib'
+    if compression not in COMPRESSION_TYPES:
+        print("Error: invalid compression type, {0}. Valid types are {1}.".format(compression, COMPRESSION_TYPES))
+        return
+
+    layout = sys.argv[4] if len(sys.argv) > 4 else FRAME_LAYOUT
+    if layout not in LAYOUT_TYPES:
+        print("Error: invalid layout, {0}. Valid layouts are {1}.".format(layout, LAYOUT_TYPES))
+        return
+
+    exp = Experiment()
+    exp.fromFile(config)
+    if exp.data_type.lower() == 'raw':
+        formatstring = LF.get_raw_format_string(exp.bit, exp.byte_order)
+        manifest = get_manifest(exp.path, exp.ext,
+                                frame_bytes=np.dtype(formatstring).itemsize * exp.imh * exp.imw,
+                                dtype=formatstring)
+
+        def read_frame(path):
+            return LF.map_raw_frame(path, exp.imh, exp.imw, formatstring, hdln=manifest.header_length(path))
+    else:
+        manifest = get_manifest(exp.path, exp.ext)
+        read_frame = LF.read_img
+
+    if not len(manifest):
+        print("Error: no {0} files found in data directory, {1}".format(exp.ext, exp.path))
+        return
+    print("Found {} files to pack.".format(len(manifest)))
+
+    energies = [exp.mine]
+    while len(energies) < len(manifest):
+        energies.append(round(energies[-1] + exp.stepe, 2))
+
+    pack_stack_file(outfile,
+                    manifest.paths,
+                    read_frame,
+                    energies=energies,
+                    metadata=exp.loaded_settings['Experiment'],
+                    compression=compression,
+                    layout=layout)
+    print("Wrote stack file, {}".format(outfile))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
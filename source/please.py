@@ -50,7 +50,10 @@ from bline import bline
 from colors import Palette
 from data import LeedData, LeemData
 from experiment import Experiment
+from growstack import GrowableStack
+from lazystack import LazyStack, ReadAhead
 from qthreads import WorkerThread
+from rawformat import probe_formats
 from terminal import MessageConsole
 from yamloutput import ExperimentYAMLOutput
 from adjimage import ImageAdjust
@@ -197,6 +200,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.extractLEEMWindowAction.setEnabled(self.viewer.LEEMRectWindowEnabled)
         rectMenu.addAction(self.extractLEEMWindowAction)
 
+        self.reloadLEEMWindowAction = QtWidgets.QAction("Reload Data in First Window", self)
+        self.reloadLEEMWindowAction.triggered.connect(self.viewer.reloadLEEMWindow)
+        self.reloadLEEMWindowAction.setEnabled(self.viewer.LEEMRectWindowEnabled)
+        rectMenu.addAction(self.reloadLEEMWindowAction)
+
         lineprofileMenu = LEEMMenu.addMenu("Line Profile Analysis")
         self.enableLEEMLinesAction = QtWidgets.QAction("Enable LEEM Line Profile", self)
         self.enableLEEMLinesAction.triggered.connect(self.viewer.enableLEEMLineProfile)
@@ -219,6 +227,30 @@ class MainWindow(QtWidgets.QMainWindow):
         self.toggleLEEMReflectivityAction.triggered.connect(lambda: self.viewer.toggleReflectivity(data="LEEM"))
         LEEMMenu.addAction(self.toggleLEEMReflectivityAction)
 
+        self.extendLEEMAction = QtWidgets.QAction("Extend Loaded Energy Range", self)
+        self.extendLEEMAction.triggered.connect(lambda: self.viewer.extendEnergyRange(datatype='LEEM'))
+        LEEMMenu.addAction(self.extendLEEMAction)
+
+        self.watchLEEMAction = QtWidgets.QAction("Watch Data Path", self)
+        self.watchLEEMAction.triggered.connect(lambda: self.viewer.startWatch(datatype='LEEM'))
+        LEEMMenu.addAction(self.watchLEEMAction)
+
+        self.smoothLEEMAction = QtWidgets.QAction("Smooth All LEEM Data", self)
+        self.smoothLEEMAction.triggered.connect(lambda: self.viewer.smoothLEEMStack(force=True))
+        LEEMMenu.addAction(self.smoothLEEMAction)
+
+        self.minimaLEEMAction = QtWidgets.QAction("Count I(V) Minima", self)
+        self.minimaLEEMAction.triggered.connect(self.viewer.countLEEMMinima)
+        LEEMMenu.addAction(self.minimaLEEMAction)
+
+        self.clusterLEEMAction = QtWidgets.QAction("Cluster I(V) Curves", self)
+        self.clusterLEEMAction.triggered.connect(self.viewer.clusterLEEMCurves)
+        LEEMMenu.addAction(self.clusterLEEMAction)
+
+        self.stopWatchLEEMAction = QtWidgets.QAction("Stop Watching Data Path", self)
+        self.stopWatchLEEMAction.triggered.connect(lambda: self.viewer.stopWatch(datatype='LEEM'))
+        LEEMMenu.addAction(self.stopWatchLEEMAction)
+
         # LEED menu
         self.extractAction = QtWidgets.QAction("Extract I(V)", self)
         # extractAction.setShortcut("Ctrl-E")
@@ -241,6 +273,18 @@ class MainWindow(QtWidgets.QMainWindow):
         self.undoSelection.triggered.connect(self.viewer.undoLEEDSelection)
         LEEDMenu.addAction(self.undoSelection)
 
+        self.extendLEEDAction = QtWidgets.QAction("Extend Loaded Energy Range", self)
+        self.extendLEEDAction.triggered.connect(lambda: self.viewer.extendEnergyRange(datatype='LEED'))
+        LEEDMenu.addAction(self.extendLEEDAction)
+
+        self.watchLEEDAction = QtWidgets.QAction("Watch Data Path", self)
+        self.watchLEEDAction.triggered.connect(lambda: self.viewer.startWatch(datatype='LEED'))
+        LEEDMenu.addAction(self.watchLEEDAction)
+
+        self.stopWatchLEEDAction = QtWidgets.QAction("Stop Watching Data Path", self)
+        self.stopWatchLEEDAction.triggered.connect(lambda: self.viewer.stopWatch(datatype='LEED'))
+        LEEDMenu.addAction(self.stopWatchLEEDAction)
+
         self.toggleLEEDReflectivityAction = QtWidgets.QAction("Toggle Reflectivty", self)
         self.toggleLEEDReflectivityAction.triggered.connect(lambda: self.viewer.toggleReflectivity(data="LEED"))
         # LEEDMenu.addAction(self.toggleLEEDReflectivityAction)  # TODO: If this feature is added; enable menu action
@@ -357,6 +401,32 @@ class Viewer(QtWidgets.QWidget):
         self.LEED_tab_active_exp = None
         self.LEEM_tab_active_exp = None
 
+        # live acquisition: worker threads watching the data path and the stacks they append to
+        self.LEEMWatchThread = None
+        self.LEEDWatchThread = None
+        self.LEEMLiveStack = None
+        self.LEEDLiveStack = None
+        # loading extra files to widen the loaded energy range: worker threads and a dict describing the
+        # pending extension (number of images below the loaded range, first file, stride, header metadata)
+        self.LEEMExtendThread = None
+        self.LEEDExtendThread = None
+        self.LEEMExtension = None
+        self.LEEDExtension = None
+        # background readers of the images around the one being viewed in lazily loaded data
+        self.LEEMReadAhead = None
+        self.LEEDReadAhead = None
+        # worker threads building summed-area tables of loaded data, and the I(V) of a LEEM window being drawn
+        self.LEEMSATThread = None
+        self.LEEDSATThread = None
+        self.LEEMWindowPreview = None
+        # worker thread smoothing every LEEM I(V) curve
+        self.LEEMSmoothThread = None
+        # worker threads counting the minima of every LEEM I(V) curve and clustering the curves,
+        # and the image item showing minima counts or cluster labels over the LEEM image
+        self.LEEMMinimaThread = None
+        self.LEEMClusterThread = None
+        self.LEEMOverlay = None
+
         self.currentLEEMTime = False  # flag for plotting LEEM I(t) instead of I(V)
         self.currentLEEDTime = False  # flag for plotting LEED I(t) instead of I(V)
 
@@ -445,6 +515,8 @@ class Viewer(QtWidgets.QWidget):
         self.smooth_LEED_window_type_menu.addItem("Hamming")
         self.smooth_LEED_window_type_menu.addItem("Bartlett")
         self.smooth_LEED_window_type_menu.addItem("Blackman")
+        self.smooth_LEED_window_type_menu.addItem("Gaussian")
+        self.smooth_LEED_window_type_menu.addItem("Savitzky-Golay")
         window_LEED_hbox.addWidget(self.LEED_window_label)
         window_LEED_hbox.addWidget(self.smooth_LEED_window_type_menu)
         smoothLEEDVBox.addLayout(window_LEED_hbox)
@@ -486,6 +558,8 @@ class Viewer(QtWidgets.QWidget):
         self.smooth_LEEM_window_type_menu.addItem("Hamming")
         self.smooth_LEEM_window_type_menu.addItem("Bartlett")
         self.smooth_LEEM_window_type_menu.addItem("Blackman")
+        self.smooth_LEEM_window_type_menu.addItem("Gaussian")
+        self.smooth_LEEM_window_type_menu.addItem("Savitzky-Golay")
         window_LEEM_hbox.addWidget(self.LEEM_window_label)
         window_LEEM_hbox.addWidget(self.smooth_LEEM_window_type_menu)
         smooth_LEEM_vbox.addLayout(window_LEEM_hbox)
@@ -686,6 +760,138 @@ class Viewer(QtWidgets.QWidget):
         #settings and vbox to hbox^ this sets the layout for everything ** but leaves long text box
         
         configTabVBox.addWidget(LEEM_patch_settings_groupbox)
+
+        # load time binning; used when the experiment YAML does not set "Spatial Binning" or "Energy Binning"
+        binning_groupbox = QtWidgets.QGroupBox()
+        binning_hbox = QtWidgets.QHBoxLayout()
+        binning_vbox = QtWidgets.QVBoxLayout()
+        binning_vbox.addWidget(QtWidgets.QLabel("Load Binning (applied to Raw and Image data as it is read)"))
+
+        spatial_bin_hbox = QtWidgets.QHBoxLayout()
+        spatial_bin_hbox.addWidget(QtWidgets.QLabel("Spatial Binning [N x N pixels]"))
+        self.spatial_bin_spinbox = QtWidgets.QSpinBox()
+        self.spatial_bin_spinbox.setRange(1, 16)
+        spatial_bin_hbox.addWidget(self.spatial_bin_spinbox)
+        binning_vbox.addLayout(spatial_bin_hbox)
+
+        energy_bin_hbox = QtWidgets.QHBoxLayout()
+        energy_bin_hbox.addWidget(QtWidgets.QLabel("Energy Binning [files per image]"))
+        self.energy_bin_spinbox = QtWidgets.QSpinBox()
+        self.energy_bin_spinbox.setRange(1, 64)
+        energy_bin_hbox.addWidget(self.energy_bin_spinbox)
+        binning_vbox.addLayout(energy_bin_hbox)
+
+        binning_hbox.addLayout(binning_vbox)
+        binning_hbox.addStretch()
+        binning_groupbox.setLayout(binning_hbox)
+        configTabVBox.addWidget(binning_groupbox)
+
+        # raw data format; filled in from the experiment YAML when Raw data is loaded
+        raw_format_groupbox = QtWidgets.QGroupBox()
+        raw_format_hbox = QtWidgets.QHBoxLayout()
+        raw_format_vbox = QtWidgets.QVBoxLayout()
+        raw_format_vbox.addWidget(QtWidgets.QLabel("Raw Data Format (applied to loaded Raw data in memory)"))
+
+        raw_size_hbox = QtWidgets.QHBoxLayout()
+        raw_size_hbox.addWidget(QtWidgets.QLabel("Height"))
+        self.raw_height_spinbox = QtWidgets.QSpinBox()
+        self.raw_height_spinbox.setRange(1, 16384)
+        self.raw_height_spinbox.setValue(600)
+        raw_size_hbox.addWidget(self.raw_height_spinbox)
+        raw_size_hbox.addWidget(QtWidgets.QLabel("Width"))
+        self.raw_width_spinbox = QtWidgets.QSpinBox()
+        self.raw_width_spinbox.setRange(1, 16384)
+        self.raw_width_spinbox.setValue(592)
+        raw_size_hbox.addWidget(self.raw_width_spinbox)
+        raw_size_hbox.addWidget(QtWidgets.QLabel("Bit Size"))
+        self.raw_bits_menu = QtWidgets.QComboBox()
+        self.raw_bits_menu.addItems(["16", "8"])
+        raw_size_hbox.addWidget(self.raw_bits_menu)
+        raw_size_hbox.addWidget(QtWidgets.QLabel("Byte Order"))
+        self.raw_byte_menu = QtWidgets.QComboBox()
+        self.raw_byte_menu.addItems(["L", "B"])
+        raw_size_hbox.addWidget(self.raw_byte_menu)
+        raw_format_vbox.addLayout(raw_size_hbox)
+
+        raw_button_hbox = QtWidgets.QHBoxLayout()
+        self.apply_raw_format_button = QtWidgets.QPushButton("Apply Raw Format", self)
+        self.apply_raw_format_button.clicked.connect(self.applyRawFormat)
+        raw_button_hbox.addWidget(self.apply_raw_format_button)
+        self.probe_raw_format_button = QtWidgets.QPushButton("Probe Raw Format", self)
+        self.probe_raw_format_button.clicked.connect(self.probeRawFormat)
+        raw_button_hbox.addWidget(self.probe_raw_format_button)
+        raw_format_vbox.addLayout(raw_button_hbox)
+
+        raw_format_hbox.addLayout(raw_format_vbox)
+        raw_format_hbox.addStretch()
+        raw_format_groupbox.setLayout(raw_format_hbox)
+        configTabVBox.addWidget(raw_format_groupbox)
+
+        # counting LEEM I(V) minima; curves are smoothed first with the LEEM smoothing settings when enabled
+        minima_groupbox = QtWidgets.QGroupBox()
+        minima_hbox = QtWidgets.QHBoxLayout()
+        minima_vbox = QtWidgets.QVBoxLayout()
+        minima_vbox.addWidget(QtWidgets.QLabel("LEEM I(V) Minima (leave Min/Max Energy empty for no limit)"))
+
+        minima_settings_hbox = QtWidgets.QHBoxLayout()
+        minima_settings_hbox.addWidget(QtWidgets.QLabel("Min Prominence"))
+        self.minima_prominence_entry = QtWidgets.QLineEdit("0")
+        minima_settings_hbox.addWidget(self.minima_prominence_entry)
+        minima_settings_hbox.addWidget(QtWidgets.QLabel("Min Energy"))
+        self.minima_emin_entry = QtWidgets.QLineEdit()
+        minima_settings_hbox.addWidget(self.minima_emin_entry)
+        minima_settings_hbox.addWidget(QtWidgets.QLabel("Max Energy"))
+        self.minima_emax_entry = QtWidgets.QLineEdit()
+        minima_settings_hbox.addWidget(self.minima_emax_entry)
+        minima_vbox.addLayout(minima_settings_hbox)
+
+        minima_button_hbox = QtWidgets.QHBoxLayout()
+        self.count_minima_button = QtWidgets.QPushButton("Count Minima", self)
+        self.count_minima_button.clicked.connect(self.countLEEMMinima)
+        minima_button_hbox.addWidget(self.count_minima_button)
+        self.minima_overlay_checkbox = QtWidgets.QCheckBox()
+        self.minima_overlay_checkbox.setText("Show Minima Overlay")
+        self.minima_overlay_checkbox.stateChanged.connect(self.showLEEMOverlay)
+        minima_button_hbox.addWidget(self.minima_overlay_checkbox)
+        minima_vbox.addLayout(minima_button_hbox)
+
+        minima_hbox.addLayout(minima_vbox)
+        minima_hbox.addStretch()
+        minima_groupbox.setLayout(minima_hbox)
+        configTabVBox.addWidget(minima_groupbox)
+
+        # clustering LEEM I(V) curves; curves are smoothed first with the LEEM smoothing settings when enabled
+        cluster_groupbox = QtWidgets.QGroupBox()
+        cluster_hbox = QtWidgets.QHBoxLayout()
+        cluster_vbox = QtWidgets.QVBoxLayout()
+        cluster_vbox.addWidget(QtWidgets.QLabel("LEEM I(V) Clusters (k-means segmentation by curve shape)"))
+
+        cluster_settings_hbox = QtWidgets.QHBoxLayout()
+        cluster_settings_hbox.addWidget(QtWidgets.QLabel("Clusters"))
+        self.cluster_count_spinbox = QtWidgets.QSpinBox()
+        self.cluster_count_spinbox.setRange(2, len(self.qcolors))
+        self.cluster_count_spinbox.setValue(3)
+        cluster_settings_hbox.addWidget(self.cluster_count_spinbox)
+        cluster_settings_hbox.addWidget(QtWidgets.QLabel("Normalization"))
+        self.cluster_normalize_menu = QtWidgets.QComboBox()
+        self.cluster_normalize_menu.addItems(["None", "Max", "Standard"])
+        cluster_settings_hbox.addWidget(self.cluster_normalize_menu)
+        cluster_vbox.addLayout(cluster_settings_hbox)
+
+        cluster_button_hbox = QtWidgets.QHBoxLayout()
+        self.cluster_curves_button = QtWidgets.QPushButton("Cluster Curves", self)
+        self.cluster_curves_button.clicked.connect(self.clusterLEEMCurves)
+        cluster_button_hbox.addWidget(self.cluster_curves_button)
+        self.cluster_overlay_checkbox = QtWidgets.QCheckBox()
+        self.cluster_overlay_checkbox.setText("Show Cluster Overlay")
+        self.cluster_overlay_checkbox.stateChanged.connect(self.showLEEMOverlay)
+        cluster_button_hbox.addWidget(self.cluster_overlay_checkbox)
+        cluster_vbox.addLayout(cluster_button_hbox)
+
+        cluster_hbox.addLayout(cluster_vbox)
+        cluster_hbox.addStretch()
+        cluster_groupbox.setLayout(cluster_hbox)
+        configTabVBox.addWidget(cluster_groupbox)
         self.ConfigTab.setLayout(configTabVBox)
 
 
@@ -841,6 +1047,98 @@ class Viewer(QtWidgets.QWidget):
                 self.handleLEEMClick
         print ("Patch Width set to ", pw)
 
+    def setRawFormatWidgets(self, ht, wd, bits, byte):
+        """Show a raw data format in the Config tab."""
+        self.raw_height_spinbox.setValue(int(ht))
+        self.raw_width_spinbox.setValue(int(wd))
+        self.raw_bits_menu.setCurrentText(str(bits or 16))
+        self.raw_byte_menu.setCurrentText(byte or 'L')
+
+    def applyRawFormat(self):
+        """Reinterpret loaded Raw data with the image format set in the Config tab.
+
+        Unbinned data is refilled from the RawBuffer of its files, without loading the experiment again;
+        binned, cropped, lazily loaded or extended data is reloaded.
+        """
+        ht = self.raw_height_spinbox.value()
+        wd = self.raw_width_spinbox.value()
+        bits = int(self.raw_bits_menu.currentText())
+        byte = self.raw_byte_menu.currentText()
+        formatstring = LF.get_raw_format_string(bits, byte)
+        loaded = False
+        for datatype, dat, exp in (('LEEM', self.leemdat, self.LEEM_tab_active_exp),
+                                   ('LEED', self.leeddat, self.LEED_tab_active_exp)):
+            if exp is None or exp.data_type.lower() != 'raw':
+                continue
+            loaded = True
+            self.stopWatch(datatype=datatype)
+            exp.imh, exp.imw, exp.bit, exp.byte_order = ht, wd, bits, byte
+            self.exp = exp
+            if dat.raw is None:
+                print("Reloading {0} data as {1}x{2} {3} bit images ...".format(datatype, ht, wd, bits))
+                if datatype == 'LEEM':
+                    self.load_LEEM_experiment()
+                else:
+                    self.load_LEED_experiment()
+                continue
+            try:
+                dat.dat3d = dat.raw.frames(ht, wd, formatstring)
+            except LF.InvalidParameterError as e:
+                print(e.message)
+                continue
+            dat.clear_caches()
+            print("Reinterpreted {0} data as {1}x{2} {3} bit images with a {4} byte header.".format(
+                datatype, ht, wd, bits, dat.raw.file_bytes - ht * wd * bits // 8))
+            if datatype == 'LEEM':
+                self.disableLEEMWindow()
+                self.LEEMimageplotwidget.clear()
+                self.LEEMivplotwidget.clear()
+                self.update_LEEM_img_after_load()
+            else:
+                self.LEEDivplotwidget.getPlotItem().clear()
+                self.LEEDimagewidget.clear()
+                self.update_LEED_img_after_load()
+        if not loaded:
+            print("No Raw data is loaded; load an experiment with Data Type Raw before applying a format.")
+
+    def probeRawFormat(self):
+        """Rank likely image formats for one raw file and show the best in the Config tab.
+
+        Uses the first file of the loaded Raw data, or asks for a file if none is loaded.
+        """
+        raw = None
+        for dat, exp in ((self.leemdat, self.LEEM_tab_active_exp), (self.leeddat, self.LEED_tab_active_exp)):
+            if exp is not None and exp.data_type.lower() == 'raw':
+                if dat.raw is not None:
+                    raw = dat.raw.file(0)
+                else:
+                    path = exp.path
+                    names = sorted(name for name in os.listdir(path) if name.endswith('.dat'))
+                    if names:
+                        raw = np.fromfile(os.path.join(path, names[0]), dtype=np.uint8)
+                break
+        if raw is None:
+            fileName = QtWidgets.QFileDialog.getOpenFileName(self, "Select Raw Data File",
+                                                             directory=os.getenv("HOME"),
+                                                             filter="Raw Data (*.dat);;All Files (*)")
+            fileName = fileName[0] if isinstance(fileName, tuple) else fileName
+            if not fileName:
+                print("Probe canceled")
+                return
+            raw = np.fromfile(fileName, dtype=np.uint8)
+        print("Probing image formats of a {} byte raw file ...".format(len(raw)))
+        formats = probe_formats(raw)
+        if not formats:
+            print("No image format fits the file size.")
+            return
+        print("Height  Width  Bits  Byte Order  Header  Roughness")
+        for fmt in formats:
+            print("{0:6d} {1:6d} {2:5d} {3:>11} {4:7d} {5:10.3f}".format(fmt.height, fmt.width, fmt.bits, fmt.byte,
+                                                                        fmt.header, fmt.score))
+        best = formats[0]
+        self.setRawFormatWidgets(best.height, best.width, best.bits, best.byte)
+        print("Best format shown in the Config tab; press Apply Raw Format to use it.")
+
                 
     def createExperimentConfigFile(self):
         """Get User settings and generate a .yaml file."""
@@ -909,6 +1207,19 @@ class Viewer(QtWidgets.QWidget):
         self.exp = Experiment()
         # path_to_config = os.path.join(new_dir, config)
         self.exp.fromFile(config)
+        # binning not set in the YAML file is taken from the Config tab
+        if self.exp.spatial_bin is None:
+            self.exp.spatial_bin = self.spatial_bin_spinbox.value()
+        if self.exp.energy_bin is None:
+            self.exp.energy_bin = self.energy_bin_spinbox.value()
+        if self.exp.data_type.lower() == 'raw':
+            self.setRawFormatWidgets(self.exp.imh, self.exp.imw, self.exp.bit, self.exp.byte_order)
+        if self.exp.energy_range is not None:
+            try:
+                self.exp.selection = LF.energy_selection(*(self.fileAxis(self.exp) + self.exp.energy_range))
+            except LF.InvalidParameterError as e:
+                print(e.message)
+                return
         print("New Data Path loaded from file: {}".format(self.exp.path))
         print("Loaded the following settings:")
 
@@ -930,7 +1241,10 @@ class Viewer(QtWidgets.QWidget):
         """Load LEEM data from settings described by YAML config file."""
         if self.exp is None:
             return
+        self.stopWatch(datatype='LEEM')
         self.LEEM_tab_active_exp = self.exp
+        self.leemdat.metadata = None
+        self.leemdat.raw = None
         self.tabs.setCurrentIndex(0)
         if str(self.LEEMimtitle.text) != "LEEM Real Space Image":
             # reset title if it was changed from PEEM data
@@ -954,7 +1268,31 @@ class Viewer(QtWidgets.QWidget):
             self.LEEMivplotwidget.setLabel('bottom', 'Energy', units='eV', **self.labelStyle)
             self.currentLEEMTime = False
 
-        if self.exp.data_type.lower() == 'raw':
+        if self.exp.lazy_load and self.exp.data_type.lower() in ('raw', 'image'):
+            # read frames on demand; only recently viewed images are held in memory
+            is_raw = self.exp.data_type.lower() == 'raw'
+            self.thread = WorkerThread(task='LOAD_LAZY',
+                                       path=str(self.exp.path),
+                                       ext=None if is_raw else self.exp.ext,
+                                       imht=self.exp.imh,
+                                       imwd=self.exp.imw,
+                                       bits=self.exp.bit if is_raw else None,
+                                       byte=self.exp.byte_order if is_raw else 'L',
+                                       cache=int(self.exp.frame_cache_mb * 1024**2),
+                                       binning=self.exp.spatial_bin,
+                                       ebin=self.exp.energy_bin,
+                                       roi=self.exp.roi,
+                                       select=self.exp.selection)
+            try:
+                self.thread.disconnect()
+            except TypeError:
+                pass  # no signals connected, that's OK, continue as needed
+            self.thread.connectOutputSignal(self.retrieve_LEEM_data)
+            self.thread.metadataSIGNAL.connect(self.retrieve_LEEM_metadata)
+            self.thread.finished.connect(self.update_LEEM_img_after_load)
+            self.thread.start()
+
+        elif self.exp.data_type.lower() == 'raw':
             try:
                 # use settings from self.sexp
                 self.thread = WorkerThread(task='LOAD_LEEM',
@@ -962,12 +1300,19 @@ class Viewer(QtWidgets.QWidget):
                                            imht=self.exp.imh,
                                            imwd=self.exp.imw,
                                            bits=self.exp.bit,
-                                           byte=self.exp.byte_order)
+                                           byte=self.exp.byte_order,
+                                           workers=self.exp.load_workers,
+                                           binning=self.exp.spatial_bin,
+                                           ebin=self.exp.energy_bin,
+                                           roi=self.exp.roi,
+                                           select=self.exp.selection)
                 try:
                     self.thread.disconnect()
                 except TypeError:
                     pass  # no signals connected, that's OK, continue as needed
                 self.thread.connectOutputSignal(self.retrieve_LEEM_data)
+                self.thread.metadataSIGNAL.connect(self.retrieve_LEEM_metadata)
+                self.thread.rawSIGNAL.connect(self.retrieve_LEEM_raw)
                 self.thread.finished.connect(self.update_LEEM_img_after_load)
                 self.thread.start()
             except ValueError:
@@ -975,16 +1320,41 @@ class Viewer(QtWidgets.QWidget):
                 print("Please Verify Experiment Config Settings.")
                 return
 
+        elif self.exp.data_type.lower() == 'stack':
+            if ((self.exp.spatial_bin or 1) > 1 or (self.exp.energy_bin or 1) > 1 or
+                    self.exp.roi is not None or self.exp.selection is not None):
+                print("Binning, ROI and Load Range are only applied to Raw and Image data; loading the full stack.")
+                self.exp.spatial_bin = self.exp.energy_bin = 1
+                self.exp.roi = self.exp.selection = None
+            self.thread = WorkerThread(task='LOAD_STACK',
+                                       path=str(self.exp.path),
+                                       workers=self.exp.load_workers,
+                                       mmap=self.exp.memory_map)
+            try:
+                self.thread.disconnect()
+            except TypeError:
+                pass  # no signals connected, that's OK, continue as needed
+            self.thread.connectOutputSignal(self.retrieve_LEEM_data)
+            self.thread.metadataSIGNAL.connect(self.retrieve_LEEM_metadata)
+            self.thread.finished.connect(self.update_LEEM_img_after_load)
+            self.thread.start()
+
         elif self.exp.data_type.lower() == 'image':
             try:
                 self.thread = WorkerThread(task='LOAD_LEEM_IMAGES',
                                            path=self.exp.path,
-                                           ext=self.exp.ext)
+                                           ext=self.exp.ext,
+                                           workers=self.exp.load_workers,
+                                           binning=self.exp.spatial_bin,
+                                           ebin=self.exp.energy_bin,
+                                           roi=self.exp.roi,
+                                           select=self.exp.selection)
                 try:
                     self.thread.disconnect()
                 except TypeError:
                     pass  # no signals connected, that's OK, continue as needed
                 self.thread.connectOutputSignal(self.retrieve_LEEM_data)
+                self.thread.metadataSIGNAL.connect(self.retrieve_LEEM_metadata)
                 self.thread.finished.connect(self.update_LEEM_img_after_load)
                 self.thread.start()
             except ValueError:
@@ -999,7 +1369,10 @@ class Viewer(QtWidgets.QWidget):
         """Load LEED data from settings described by YAML config file."""
         if self.exp is None:
             return
+        self.stopWatch(datatype='LEED')
         self.LEED_tab_active_exp = self.exp
+        self.leeddat.metadata = None
+        self.leeddat.raw = None
         self.tabs.setCurrentIndex(1)
 
         if self.hasdisplayedLEEDdata:
@@ -1011,7 +1384,32 @@ class Viewer(QtWidgets.QWidget):
             print("Loading data as Time Series")
             self.LEEDivplotwidget.setLabel('bottom', 'Time', units='s', **self.labelStyle)
             self.currentLEEDTime = True
-        if self.exp.data_type.lower() == 'raw':
+        if self.exp.lazy_load and self.exp.data_type.lower() in ('raw', 'image'):
+            # read frames on demand; only recently viewed images are held in memory
+            is_raw = self.exp.data_type.lower() == 'raw'
+            self.thread = WorkerThread(task='LOAD_LAZY',
+                                       path=str(self.exp.path),
+                                       ext=None if is_raw else self.exp.ext,
+                                       imht=self.exp.imh,
+                                       imwd=self.exp.imw,
+                                       bits=self.exp.bit if is_raw else None,
+                                       byte=self.exp.byte_order if is_raw else 'L',
+                                       cache=int(self.exp.frame_cache_mb * 1024**2),
+                                       binning=self.exp.spatial_bin,
+                                       ebin=self.exp.energy_bin,
+                                       roi=self.exp.roi,
+                                       select=self.exp.selection)
+            try:
+                self.thread.disconnect()
+            except TypeError:
+                # no signal connections - this is OK
+                pass
+            self.thread.connectOutputSignal(self.retrieve_LEED_data)
+            self.thread.metadataSIGNAL.connect(self.retrieve_LEED_metadata)
+            self.thread.finished.connect(self.update_LEED_img_after_load)
+            self.thread.start()
+
+        elif self.exp.data_type.lower() == 'raw':
             try:
                 # use settings from self.exp
                 self.thread = WorkerThread(task='LOAD_LEED',
@@ -1019,31 +1417,64 @@ class Viewer(QtWidgets.QWidget):
                                            imht=self.exp.imh,
                                            imwd=self.exp.imw,
                                            bits=self.exp.bit,
-                                           byte=self.exp.byte_order)
+                                           byte=self.exp.byte_order,
+                                           workers=self.exp.load_workers,
+                                           binning=self.exp.spatial_bin,
+                                           ebin=self.exp.energy_bin,
+                                           roi=self.exp.roi,
+                                           select=self.exp.selection)
                 try:
                     self.thread.disconnect()
                 except TypeError:
                     # no signal connections - this is OK
                     pass
                 self.thread.connectOutputSignal(self.retrieve_LEED_data)
+                self.thread.metadataSIGNAL.connect(self.retrieve_LEED_metadata)
+                self.thread.rawSIGNAL.connect(self.retrieve_LEED_raw)
                 self.thread.finished.connect(self.update_LEED_img_after_load)
                 self.thread.start()
             except ValueError:
                 print('Error Loading LEED Data: Please Recheck YAML Settings')
                 return
 
+        elif self.exp.data_type.lower() == 'stack':
+            if ((self.exp.spatial_bin or 1) > 1 or (self.exp.energy_bin or 1) > 1 or
+                    self.exp.roi is not None or self.exp.selection is not None):
+                print("Binning, ROI and Load Range are only applied to Raw and Image data; loading the full stack.")
+                self.exp.spatial_bin = self.exp.energy_bin = 1
+                self.exp.roi = self.exp.selection = None
+            self.thread = WorkerThread(task='LOAD_STACK',
+                                       path=str(self.exp.path),
+                                       workers=self.exp.load_workers,
+                                       mmap=self.exp.memory_map)
+            try:
+                self.thread.disconnect()
+            except TypeError:
+                # no signal connections - this is OK
+                pass
+            self.thread.connectOutputSignal(self.retrieve_LEED_data)
+            self.thread.metadataSIGNAL.connect(self.retrieve_LEED_metadata)
+            self.thread.finished.connect(self.update_LEED_img_after_load)
+            self.thread.start()
+
         elif self.exp.data_type.lower() == 'image':
             try:
                 self.thread = WorkerThread(task='LOAD_LEED_IMAGES',
                                            ext=self.exp.ext,
                                            path=self.exp.path,
-                                           byte=self.exp.byte_order)
+                                           byte=self.exp.byte_order,
+                                           workers=self.exp.load_workers,
+                                           binning=self.exp.spatial_bin,
+                                           ebin=self.exp.energy_bin,
+                                           roi=self.exp.roi,
+                                           select=self.exp.selection)
                 try:
                     self.thread.disconnect()
                 except TypeError:
                     # no signals were connected - this is OK
                     pass
                 self.thread.connectOutputSignal(self.retrieve_LEED_data)
+                self.thread.metadataSIGNAL.connect(self.retrieve_LEED_metadata)
                 self.thread.finished.connect(self.update_LEED_img_after_load)
                 self.thread.start()
             except ValueError:
@@ -1108,9 +1539,7 @@ class Viewer(QtWidgets.QWidget):
                 y = tup[1]
                 ilist = self.leemdat.dat3d[y, x, :]
                 if self.smoothLEEMoutput:
-                    ilist = LF.smooth(ilist,
-                                      window_len=self.LEEMWindowLen,
-                                      window_type=self.LEEMWindowType)
+                    ilist = self.smoothedLEEMCurve(y, x)
                 thread = WorkerThread(task='OUTPUT_TO_TEXT',
                                            elist=self.leemdat.elist,
                                            ilist=ilist,
@@ -1165,6 +1594,9 @@ class Viewer(QtWidgets.QWidget):
                     ilist = LF.smooth(self.LEEDAverageIV,
                                       window_len=self.LEEDWindowLen,
                                       window_type=self.LEEDWindowType)
+                    if ilist is None:
+                        print("Error: invalid LEED smoothing settings; no I(V) curve was written.")
+                        return
                 else:
                     ilist = self.LEEDAverageIV
                 thread = WorkerThread(task='OUTPUT_TO_TEXT',
@@ -1189,21 +1621,28 @@ class Viewer(QtWidgets.QWidget):
                     print("Error: Mismatch between number of beam selections and number of background selections.")
                     return
 
+                # get average intensity per window
+                beam_curves = self.windowIV(self.leeddat, self.squareWindows(self.LEEDclickpos, self.LEEDrects))
+                if self.smoothLEEDoutput:
+                    beam_curves = LF.smooth(beam_curves,
+                                            window_len=self.LEEDWindowLen,
+                                            window_type=self.LEEDWindowType)
+                    if beam_curves is None:
+                        print("Error: invalid LEED smoothing settings; no I(V) curves were written.")
+                        return
                 if self.LEEDBackgroundrects:
                     # There are background curves to output and all sizes match
-                    for beam_idx, tup in enumerate(self.LEEDclickpos):
+                    background_curves = self.windowIV(self.leeddat, self.squareWindows(self.LEEDBackgroundcenters,
+                                                                                       self.LEEDBackgroundrects))
+                    if self.smoothLEEDoutput:
+                        background_curves = LF.smooth(background_curves,
+                                                      window_len=self.LEEDWindowLen,
+                                                      window_type=self.LEEDWindowType)
+                        if background_curves is None:
+                            print("Error: invalid LEED smoothing settings; no I(V) curves were written.")
+                            return
+                    for beam_idx, ilist in enumerate(beam_curves):
                         outfile = os.path.join(outdir, outname+'beam_'+str(beam_idx)+'.txt')
-                        rad = int(self.LEEDrects[beam_idx][3])
-                        x = int(tup[0])
-                        y = int(tup[1])
-                        int_window = self.leeddat.dat3d[y - rad:y + rad + 1,
-                                                        x - rad:x + rad + 1, :]
-                        # get average intensity per window
-                        ilist = [img.sum()/(2*rad*2*rad) for img in np.rollaxis(int_window, 2)]
-                        if self.smoothLEEDoutput:
-                            ilist = LF.smooth(ilist,
-                                              window_len=self.LEEDWindowLen,
-                                              window_type=self.LEEDWindowType)
                         thread = WorkerThread(task='OUTPUT_TO_TEXT',
                                                    elist=self.leeddat.elist,
                                                    ilist=ilist,
@@ -1211,20 +1650,9 @@ class Viewer(QtWidgets.QWidget):
                         thread.finished.connect(self.output_complete)
                         self.threads.append(thread)
                         thread.start()
-                        for idx, tup in enumerate(self.LEEDBackgroundcenters[beam_idx:
-                                                                             beam_idx+self.num_background_per_beam]):
+                        for idx, ilist in enumerate(background_curves[beam_idx:
+                                                                      beam_idx+self.num_background_per_beam]):
                             outfile = os.path.join(outdir, outname+'beam_'+str(beam_idx)+'bkgd_'+str(idx)+'.txt')
-                            rad = int(self.LEEDBackgroundrects[idx][3])
-                            x = int(tup[0])
-                            y = int(tup[1])
-                            int_window = self.leeddat.dat3d[y - rad:y + rad + 1,
-                                                            x - rad:x + rad + 1, :]
-                            # get average intensity per window
-                            ilist = [img.sum()/(2*rad*2*rad) for img in np.rollaxis(int_window, 2)]
-                            if self.smoothLEEDoutput:
-                                ilist = LF.smooth(ilist,
-                                                  window_len=self.LEEDWindowLen,
-                                                  window_type=self.LEEDWindowType)
                             thread = WorkerThread(task='OUTPUT_TO_TEXT',
                                                        elist=self.leeddat.elist,
                                                        ilist=ilist,
@@ -1234,19 +1662,8 @@ class Viewer(QtWidgets.QWidget):
                             thread.start()
                 else:
                     # There are no background curves to output
-                    for idx, tup in enumerate(self.LEEDclickpos):
+                    for idx, ilist in enumerate(beam_curves):
                         outfile = os.path.join(outdir, outname+str(idx)+'.txt')
-                        rad = int(self.LEEDrects[idx][3])
-                        x = int(tup[0])
-                        y = int(tup[1])
-                        int_window = self.leeddat.dat3d[y - rad:y + rad + 1,
-                                                        x - rad:x + rad + 1, :]
-                        # get average intensity per window
-                        ilist = [img.sum()/(2*rad*2*rad) for img in np.rollaxis(int_window, 2)]
-                        if self.smoothLEEDoutput:
-                            ilist = LF.smooth(ilist,
-                                              window_len=self.LEEDWindowLen,
-                                              window_type=self.LEEDWindowType)
                         thread = WorkerThread(task='OUTPUT_TO_TEXT',
                                                    elist=self.leeddat.elist,
                                                    ilist=ilist,
@@ -1283,9 +1700,7 @@ class Viewer(QtWidgets.QWidget):
         elif window_len % 2 != 0:
             print("Warning: Window Length was odd. Using next highest even integer")
             window_len += 1
-        if window_type.lower() not in ['flat', 'hanning',
-                                       'hamming', 'bartlett',
-                                       'blackman']:
+        if window_type.lower() not in LF.SMOOTHING_TYPES:
             print("Error: Invalid Window Type for data smoothing.")
             return
         if but == "LEED":
@@ -1294,12 +1709,12 @@ class Viewer(QtWidgets.QWidget):
         else:
             self.LEEMWindowType = window_type.lower()
             self.LEEMWindowLen = window_len
-            # Changing the LEEM smoothing settings means we need to
-            # reset our position mask array which declared if we had
-            # previously calculated the smoothed data for a given point (x, y)
-            if self.hasdisplayedLEEMdata:
-                # if we haven't displayed data yet, don't bother with this step.
-                self.leemdat.posMask.fill(0)
+            # cached smoothed curves are keyed by the smoothing settings, so curves
+            # computed with the old settings are never reused; free their memory now
+            self.leemdat.smoothcache.clear()
+            if self.leemdat.smoothed is not None and not self.leemdat.smoothed.matches(window_len, window_type.lower()):
+                self.leemdat.smoothed = None
+                self.smoothLEEMStack()
         return
 
 
@@ -1365,13 +1780,72 @@ class Viewer(QtWidgets.QWidget):
         """Recieved a finished() SIGNAL from a QThread object."""
         print('File output successfully')
 
-    @QtCore.pyqtSlot(np.ndarray)
+    @staticmethod
+    def fileAxis(exp):
+        """Return (start, step) of the energy (or time) of each data file of an experiment."""
+        if exp.time:
+            return 0.0, exp.time_step
+        return exp.mine, exp.stepe
+
+    @staticmethod
+    def loadedAxis(exp, count, time_step=None, metadata=None):
+        """Generate the energy (or time) list of count images loaded with the experiment's Load Range and binning.
+
+        If header metadata of raw UView data is given, the recorded start voltage (or acquisition
+        time) of each image is used, so that non-uniform sweeps are plotted correctly. Otherwise
+        the list is generated from the experiment energy parameters.
+
+        :param exp: Experiment object used to load the data
+        :param count: integer number of loaded images
+        :param time_step: float seconds per data file; if given, a time list is generated instead of an energy list
+        :param metadata: numpy structured array of uview.HEADER_DTYPE, one record per image, or None
+        :return: list of floats
+        """
+        if metadata is not None and len(metadata) == count and metadata['valid'].all():
+            if time_step is None:
+                voltages = metadata['start_voltage']
+                # a constant start voltage means the files are not an energy sweep
+                if np.isfinite(voltages).all() and (count == 1 or np.ptp(voltages) > 0):
+                    return [round(float(val), 2) for val in voltages]
+            else:
+                times = metadata['timestamp']
+                if np.isfinite(times).all() and (np.diff(times) > 0).all():
+                    return [float(val) for val in times - times[0]]
+        selection = exp.selection or slice(0, None, 1)
+        if time_step is None:
+            start, step, decimals = exp.mine, exp.stepe, 2
+        else:
+            start, step, decimals = 0.0, time_step, None
+        # binned images are placed at the mean energy of the files averaged into them
+        return LF.binned_axis(start + selection.start * step, step * selection.step, count,
+                              ebin=exp.energy_bin or 1, decimals=decimals)
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEEM_metadata(self, metadata):
+        """Grab the per image header values emitted before the raw LEEM data."""
+        self.leemdat.metadata = metadata
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEED_metadata(self, metadata):
+        """Grab the per image header values emitted before the raw LEED data."""
+        self.leeddat.metadata = metadata
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEEM_raw(self, raw):
+        """Grab the RawBuffer holding the raw LEEM files, kept so the data can be reinterpreted."""
+        self.leemdat.raw = raw
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEED_raw(self, raw):
+        """Grab the RawBuffer holding the raw LEED files, kept so the data can be reinterpreted."""
+        self.leeddat.raw = raw
+
+    @QtCore.pyqtSlot(object)
     def retrieve_LEEM_data(self, data):########## This loads the image I think 
-        """Grab the 3d numpy array emitted from the data loading I/O thread."""
+        """Grab the 3d numpy array (or LazyStack) emitted from the data loading I/O thread."""
         self.leemdat.dat3d = data
-        self.leemdat.dat3ds = data.copy()
-        self.leemdat.posMask = np.zeros((self.leemdat.dat3d.shape[0],
-                                         self.leemdat.dat3d.shape[1]))
+        self.leemdat.clear_caches()
+        self.LEEMReadAhead = self.startReadAhead(data, self.LEEMReadAhead)
         if self.currentLEEMTime:
             # populate self.leemdat.timelist via settings from self.exp
             try:
@@ -1381,18 +1855,18 @@ class Viewer(QtWidgets.QWidget):
                 print("Defaulting to 1.0s per image.")
                 time_step = 1.0
             print("Creating LEEM time series ...")
-            self.leemdat.timelist = [k * time_step for k in range(self.leemdat.dat3d.shape[2])]
+            self.leemdat.timelist = self.loadedAxis(self.exp, self.leemdat.dat3d.shape[2], time_step=time_step,
+                                                  metadata=self.leemdat.metadata)
         return
 
-    @QtCore.pyqtSlot(np.ndarray)
+    @QtCore.pyqtSlot(object)
     def retrieve_LEED_data(self, data):
-        """Grab the numpy array emitted from the data loading I/O thread."""
+        """Grab the numpy array (or LazyStack) emitted from the data loading I/O thread."""
         # data = [np.fliplr(np.rot90(np.rot90(img))) for img in np.rollaxis(data, 2)]
         # data = np.dstack(data)
         self.leeddat.dat3d = data
-        self.leeddat.dat3ds = data.copy()
-        self.leeddat.posMask = np.zeros((self.leeddat.dat3d.shape[0],
-                                         self.leeddat.dat3d.shape[1]))
+        self.leeddat.clear_caches()
+        self.LEEDReadAhead = self.startReadAhead(data, self.LEEDReadAhead)
         if self.currentLEEDTime:
             # populate self.leeddat.timelist via settings from self.exp
             try:
@@ -1402,7 +1876,8 @@ class Viewer(QtWidgets.QWidget):
                 print("Defaulting to 1.0s per image.")
                 time_step = 1.0
             print("Creating LEED time series ...")
-            self.leeddat.timelist = [k * time_step for k in range(self.leeddat.dat3d.shape[2])]
+            self.leeddat.timelist = self.loadedAxis(self.exp, self.leeddat.dat3d.shape[2], time_step=time_step,
+                                                  metadata=self.leeddat.metadata)
         return
 
 ######
@@ -1444,11 +1919,7 @@ class Viewer(QtWidgets.QWidget):
         self.LEEMimageplotwidget.addItem(self.crosshair.vline,
                                          ignoreBounds=True)
 
-        self.leemdat.elist = [self.exp.mine]
-        while len(self.leemdat.elist) < self.leemdat.dat3d.shape[2]:
-            nextEnergy = self.leemdat.elist[-1] + self.exp.stepe
-            self.leemdat.elist.append(round(nextEnergy, 2))
-        self.checkDataSize(datatype="LEEM")
+        self.leemdat.elist = self.loadedAxis(self.exp, self.leemdat.dat3d.shape[2], metadata=self.leemdat.metadata)
         self.hasdisplayedLEEMdata = True
 
         energy = LF.filenumber_to_energy(self.leemdat.elist, self.curLEEMIndex)
@@ -1468,7 +1939,193 @@ class Viewer(QtWidgets.QWidget):
                                               energy,
                                               unit))
         self.LEEMimageplotwidget.setFocus()
+        self.buildSummedAreaTable(datatype='LEEM')
+        self.smoothLEEMStack()
+
+
+    def buildSummedAreaTable(self, datatype):
+        """Build a summed-area table of the displayed data in a worker thread if the experiment enables it.
+
+        :param datatype: String designating either 'LEEM' or 'LEED' data
+        """
+        if datatype == 'LEEM':
+            dat, exp, slot = self.leemdat, self.LEEM_tab_active_exp, self.retrieve_LEEM_sat
+        else:
+            dat, exp, slot = self.leeddat, self.LEED_tab_active_exp, self.retrieve_LEED_sat
+        dat.sat = None
+        if exp is None or not getattr(exp, 'summed_area', False) or not isinstance(dat.dat3d, np.ndarray):
+            return
+        print("Building summed-area table of {} data in the background ...".format(datatype))
+        thread = WorkerThread(task='BUILD_SAT', data=dat.dat3d)
+        thread.connectOutputSignal(slot)
+        if datatype == 'LEEM':
+            self.LEEMSATThread = thread
+        else:
+            self.LEEDSATThread = thread
+        thread.start()
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEEM_sat(self, table):
+        """Grab the summed-area table emitted from the worker thread, unless the data has changed since."""
+        if table.describes(self.leemdat.dat3d):
+            self.leemdat.sat = table
+            print("LEEM summed-area table ready ({:.0f} MB).".format(table.nbytes / 1024**2))
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEED_sat(self, table):
+        """Grab the summed-area table emitted from the worker thread, unless the data has changed since."""
+        if table.describes(self.leeddat.dat3d):
+            self.leeddat.sat = table
+            print("LEED summed-area table ready ({:.0f} MB).".format(table.nbytes / 1024**2))
+
+    def smoothLEEMStack(self, force=False):
+        """Smooth every LEEM I(V) curve in a worker thread if the experiment enables it.
+
+        :param force: bool flag to smooth the data even if the experiment does not enable it
+        """
+        exp = self.LEEM_tab_active_exp
+        if exp is None or not (force or getattr(exp, 'smooth_on_load', False)):
+            return
+        if not isinstance(self.leemdat.dat3d, np.ndarray):
+            if force:
+                print("Error: Smoothing all data requires LEEM data loaded into memory.")
+            return
+        print("Smoothing all LEEM I(V) curves in the background ...")
+        thread = WorkerThread(task='SMOOTH', data=self.leemdat.dat3d,
+                              window_len=self.LEEMWindowLen, window_type=self.LEEMWindowType,
+                              workers=exp.load_workers)
+        thread.connectOutputSignal(self.retrieve_LEEM_smoothed)
+        self.LEEMSmoothThread = thread
+        thread.start()
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEEM_smoothed(self, smoothed):
+        """Grab the smoothed data emitted from the worker thread, unless the data or settings have changed since."""
+        if smoothed.describes(self.leemdat.dat3d) and smoothed.matches(self.LEEMWindowLen, self.LEEMWindowType):
+            self.leemdat.smoothed = smoothed
+            print("Smoothed LEEM data ready ({:.0f} MB).".format(smoothed.nbytes / 1024**2))
+
+    def countLEEMMinima(self):
+        """Count the minima of every LEEM I(V) curve in a worker thread using the settings in the Config tab."""
+        if not self.hasdisplayedLEEMdata or self.leemdat.dat3d is None:
+            return
+        try:
+            prominence = float(self.minima_prominence_entry.text() or 0)
+            limits = [float(entry.text()) if entry.text().strip() else None
+                      for entry in (self.minima_emin_entry, self.minima_emax_entry)]
+        except ValueError:
+            print("Error: I(V) minima settings must be numbers.")
+            return
+        if self.currentLEEMTime:
+            elist = self.leemdat.timelist
+        else:
+            elist = self.leemdat.elist
+        exp = self.LEEM_tab_active_exp
+        print("Counting I(V) minima of every LEEM pixel in the background ...")
+        thread = WorkerThread(task='COUNT_MINIMA', data=self.leemdat.dat3d, elist=list(elist),
+                              prominence=prominence, emin=limits[0], emax=limits[1],
+                              window_len=self.LEEMWindowLen if self.smoothLEEMplot else None,
+                              window_type=self.LEEMWindowType,
+                              workers=exp.load_workers if exp is not None else None)
+        thread.connectOutputSignal(self.retrieve_LEEM_minima)
+        self.LEEMMinimaThread = thread
+        thread.start()
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEEM_minima(self, minima):
+        """Grab the minima counts emitted from the worker thread, unless the data has changed since, and show them."""
+        if not minima.describes(self.leemdat.dat3d):
+            return
+        self.leemdat.minima = minima
+        for count, pixels in enumerate(minima.histogram()):
+            if pixels:
+                print("{0} pixels with {1} minima".format(pixels, count))
+        if self.minima_overlay_checkbox.isChecked():
+            self.showLEEMOverlay()
+        else:
+            self.minima_overlay_checkbox.setChecked(True)
+
+    def clusterLEEMCurves(self):
+        """Cluster the LEEM I(V) curves of every pixel in a worker thread using the settings in the Config tab."""
+        if not self.hasdisplayedLEEMdata or self.leemdat.dat3d is None:
+            return
+        exp = self.LEEM_tab_active_exp
+        print("Clustering the I(V) curves of every LEEM pixel in the background ...")
+        thread = WorkerThread(task='CLUSTER', data=self.leemdat.dat3d,
+                              clusters=self.cluster_count_spinbox.value(),
+                              normalize=str(self.cluster_normalize_menu.currentText()).lower(),
+                              window_len=self.LEEMWindowLen if self.smoothLEEMplot else None,
+                              window_type=self.LEEMWindowType,
+                              workers=exp.load_workers if exp is not None else None)
+        thread.connectOutputSignal(self.retrieve_LEEM_clusters)
+        self.LEEMClusterThread = thread
+        thread.start()
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEEM_clusters(self, clusters):
+        """Grab the clusters emitted from the worker thread, unless the data has changed since, and show them.
+
+        The mean I(V) curve of each cluster is plotted in the color of the cluster in the overlay.
+        """
+        if not clusters.describes(self.leemdat.dat3d):
+            return
+        self.leemdat.clusters = clusters
+        if self.currentLEEMTime:
+            xdata = self.leemdat.timelist
+        else:
+            xdata = self.leemdat.elist
+        self.LEEMivplotwidget.clear()
+        for label, (pixels, curve) in enumerate(zip(clusters.sizes(), clusters.curves)):
+            print("Cluster {0}: {1} pixels".format(label, pixels))
+            self.LEEMivplotwidget.plot(xdata, curve, pen=pg.mkPen(self.qcolors[label % len(self.qcolors)],
+                                                                   width=self.LEEM_Linewidth))
+        # minima counts take precedence over clusters in the overlay
+        self.minima_overlay_checkbox.setChecked(False)
+        if self.cluster_overlay_checkbox.isChecked():
+            self.showLEEMOverlay()
+        else:
+            self.cluster_overlay_checkbox.setChecked(True)
+
+    @QtCore.pyqtSlot()
+    def showLEEMOverlay(self):
+        """Show minima counts or cluster labels over the LEEM image, one palette color per value.
+
+        Minima counts are shown if "Show Minima Overlay" is checked, otherwise cluster labels if
+        "Show Cluster Overlay" is checked.
+        """
+        if self.LEEMOverlay is not None:
+            self.LEEMimageplotwidget.removeItem(self.LEEMOverlay)
+            self.LEEMOverlay = None
+        minima, clusters = self.leemdat.minima, self.leemdat.clusters
+        if self.minima_overlay_checkbox.isChecked() and minima is not None:
+            values = minima.counts
+            # pixels without minima are transparent
+            lut = np.zeros((int(values.max()) + 1, 4), dtype=np.uint8)
+            for count in range(1, len(lut)):
+                lut[count] = self.colors[(count - 1) % len(self.colors)] + (160,)
+        elif self.cluster_overlay_checkbox.isChecked() and clusters is not None:
+            values = clusters.labels
+            lut = np.array([self.colors[label % len(self.colors)] + (160,) for label in range(clusters.k)],
+                           dtype=np.uint8)
+        else:
+            return
+        overlay = pg.ImageItem()
+        overlay.setLookupTable(lut)
+        overlay.setImage(values[::-1, :].T, autoLevels=False, levels=(0, len(lut)))
+        overlay.setZValue(10)
+        self.LEEMimageplotwidget.addItem(overlay)
+        self.LEEMOverlay = overlay
+
+    def smoothedLEEMCurve(self, ymp, xmp):
+        """Return the smoothed I(V) curve of the pixel at array coordinates (xmp, ymp).
 
+        The curve is taken from the smoothed data when it was made with the current settings.
+        """
+        smoothed = self.leemdat.smoothed
+        if smoothed is not None and smoothed.matches(self.LEEMWindowLen, self.LEEMWindowType):
+            return smoothed.data[ymp, xmp, :]
+        return LF.smooth(self.leemdat.dat3d[ymp, xmp, :], window_len=self.LEEMWindowLen,
+                         window_type=self.LEEMWindowType)
 
     def adjustLoadedImage(self):
         self.imageAdjustWidget = ImageAdjust()
@@ -1498,30 +2155,13 @@ class Viewer(QtWidgets.QWidget):
         self.LEEDimagewidget.hideAxis('bottom')
         self.LEEDimagewidget.hideAxis('left')
 
-        self.leeddat.elist = [self.exp.mine]
-        while len(self.leeddat.elist) < self.leeddat.dat3d.shape[2]:
-            newEnergy = self.leeddat.elist[-1] + self.exp.stepe
-            self.leeddat.elist.append(round(newEnergy, 2))
+        self.leeddat.elist = self.loadedAxis(self.exp, self.leeddat.dat3d.shape[2], metadata=self.leeddat.metadata)
         self.hasdisplayedLEEDdata = True
         title = "Reciprocal Space LEED Image: {} eV"
         energy = LF.filenumber_to_energy(self.leeddat.elist, self.curLEEDIndex)
         self.LEEDTitle.setText(title.format(energy))
         self.LEEDimagewidget.setFocus()
-
-    def checkDataSize(self, datatype=None):
-        """Ensure helper array sizes all match main data array size."""
-        if datatype is None:
-            return
-        elif datatype == 'LEEM':
-            mainshape = self.leemdat.dat3d.shape
-            if self.leemdat.dat3ds.shape != mainshape:
-                self.leemdat.dat3ds = np.zeros(mainshape)
-            if self.leemdat.posMask.shape != (mainshape[0], mainshape[1]):
-                self.leemdat.posMask = np.zeros((mainshape[0], mainshape[1]))
-        elif datatype == 'LEED':
-            pass
-        else:
-            return
+        self.buildSummedAreaTable(datatype='LEED')
 
     def enableLEEMWindow(self):
         """Enable I(V) extraction from rectangular window.
@@ -1563,6 +2203,7 @@ class Viewer(QtWidgets.QWidget):
 
         self.LEEMRectWindowEnabled = True
         self.parentWidget().extractLEEMWindowAction.setEnabled(True)
+        self.parentWidget().reloadLEEMWindowAction.setEnabled(True)
 
     def disableLEEMWindow(self):
         """Disable I(V) extraction from rectangular window.
@@ -1586,6 +2227,7 @@ class Viewer(QtWidgets.QWidget):
             # LEEM mouse click handler
             pass
 
+        self.stopLEEMWindowPreview()
         # delete current rect windows and reset click count
         for tup in self.LEEMRects:
             self.LEEMimageplotwidget.scene().removeItem(tup[0])
@@ -1599,6 +2241,7 @@ class Viewer(QtWidgets.QWidget):
         self.sigmmvLEEM.connect(self.handleLEEMMouseMoved)
         self.LEEMRectWindowEnabled = False
         self.parentWidget().extractLEEMWindowAction.setEnabled(False)
+        self.parentWidget().reloadLEEMWindowAction.setEnabled(False)
 
 
     def handleLEEMWindow(self, event):
@@ -1631,11 +2274,17 @@ class Viewer(QtWidgets.QWidget):
             ymp = self.leemdat.dat3d.shape[0] - 1 - int(mappedclick.y())
             self.firstclickmap = (xmp, ymp)  # location of first click in array coordinates
             self.LEEMclicks += 1
+            if self.leemdat.sat is not None:
+                # window sums are four table lookups per image, fast enough to follow the mouse
+                pen = pg.mkPen(self.qcolors[len(self.LEEMRects)], width=self.LEEM_Linewidth)
+                self.LEEMWindowPreview = self.LEEMivplotwidget.plot([], [], pen=pen)
+                self.sigmmvLEEM.connect(self.previewLEEMWindow)
             return
 
         elif self.LEEMclicks == 1:
             # this is the second click
             self.secondclick = (event.pos().x(), event.pos().y())
+            self.stopLEEMWindowPreview()
             vb = self.LEEMimageplotwidget.getPlotItem().getViewBox()
             mappedclick = vb.mapSceneToView(event.scenePos())
             xmp = int(mappedclick.x())
@@ -1665,11 +2314,40 @@ class Viewer(QtWidgets.QWidget):
             self.LEEMcircs = []
 
 
+    def previewLEEMWindow(self, pos):
+        """Plot the I(V) of the window between the first click and the mouse position."""
+        if self.LEEMWindowPreview is None or self.leemdat.sat is None:
+            return
+        if isinstance(pos, tuple):
+            if not pos:
+                return
+            pos = pos[0]
+        mappedPos = self.LEEMimage.mapFromScene(pos)
+        xmp = min(max(int(mappedPos.x()), 0), self.leemdat.dat3d.shape[1] - 1)
+        ymp = self.leemdat.dat3d.shape[0] - 1 - min(max(int(mappedPos.y()), 0), self.leemdat.dat3d.shape[0] - 1)
+        x0, y0 = self.firstclickmap
+        window = (min(y0, ymp), min(x0, xmp), max(y0, ymp), max(x0, xmp))
+        ilist = LF.integrate_windows(self.leemdat.dat3d, [window], table=self.leemdat.sat)[0]
+        xdata = self.leemdat.timelist if self.currentLEEMTime else self.leemdat.elist
+        self.LEEMWindowPreview.setData(xdata, ilist)
+
+    def stopLEEMWindowPreview(self):
+        """Stop following the mouse with the I(V) of the window being drawn."""
+        if self.LEEMWindowPreview is None:
+            return
+        try:
+            self.sigmmvLEEM.disconnect(self.previewLEEMWindow)
+        except TypeError:
+            pass  # not connected
+        self.LEEMivplotwidget.removeItem(self.LEEMWindowPreview)
+        self.LEEMWindowPreview = None
+
     def extractLEEMWindows(self):
         """Extract I(V) from User defined rectangular windows and Plot in main IV area."""
         if not self.hasdisplayedLEEMdata or not self.LEEMRects or self.LEEMRectCount == 0:
             return
         self.LEEMivplotwidget.clear()
+        windows = []
         for tup in self.LEEMRects:
             topleft = tup[3]
             bottomright = tup[4]
@@ -1680,11 +2358,15 @@ class Viewer(QtWidgets.QWidget):
             # print("Topleft: {}".format(topleft))
             # print("Bottomright: {}".format(bottomright))
             print("Window Selected: X={0}, Y={1}, Width={2}, Height={3}".format(xtl, ytl, width, height))
-            window = self.leemdat.dat3d[ytl:ytl + height + 1,
-                                        xtl:xtl + width + 1, :]
-            ilist = [img.sum()/(width*height) for img in np.rollaxis(window, 2)]
-            if self.smoothLEEMplot:
-                ilist = LF.smooth(ilist, window_len=self.LEEMWindowLen, window_type=self.LEEMWindowType)
+            windows.append((ytl, xtl, ytl + height, xtl + width))
+        curves = self.windowIV(self.leemdat, windows)
+        if self.smoothLEEMplot:
+            smoothed = LF.smooth(curves, window_len=self.LEEMWindowLen, window_type=self.LEEMWindowType)
+            if smoothed is None:
+                print("Error: invalid LEEM smoothing settings; plotting unsmoothed I(V) curves.")
+            else:
+                curves = smoothed
+        for tup, ilist in zip(self.LEEMRects, curves):
             if self.currentLEEMTime:
                 xdata = self.leemdat.timelist
             else:
@@ -1693,6 +2375,33 @@ class Viewer(QtWidgets.QWidget):
                                        ilist,
                                        pen=pg.mkPen(tup[2].color(), width=self.LEEM_Linewidth))
 
+    def reloadLEEMWindow(self):
+        """Reload the LEEM experiment reading only the region inside the first rectangular window.
+
+        The window is converted from displayed array coordinates to image file coordinates,
+        accounting for any region of interest and spatial binning used to load the current data.
+        """
+        exp = self.LEEM_tab_active_exp
+        if not self.hasdisplayedLEEMdata or not self.LEEMRects or exp is None:
+            print("Error: Draw a window on the LEEM image before reloading.")
+            return
+        if exp.data_type.lower() not in ('raw', 'image'):
+            print("Error: Loading a region of interest requires Raw or Image data files.")
+            return
+        ht, wd = self.leemdat.dat3d.shape[:2]
+        topleft, bottomright = self.LEEMRects[0][3], self.LEEMRects[0][4]  # (x, y) array coordinates
+        xtl, ytl = min(max(int(topleft[0]), 0), wd - 1), min(max(int(topleft[1]), 0), ht - 1)
+        xbr, ybr = min(max(int(bottomright[0]), 0), wd - 1), min(max(int(bottomright[1]), 0), ht - 1)
+
+        binning = exp.spatial_bin or 1
+        top, left = exp.roi[0] if exp.roi is not None else (0, 0)
+        exp.roi = [(top + ytl * binning, left + xtl * binning),
+                   (top + (ybr + 1) * binning - 1, left + (xbr + 1) * binning - 1)]
+        print("Reloading region of interest {}".format(exp.roi))
+        self.disableLEEMWindow()
+        self.exp = exp
+        self.load_LEEM_experiment()
+
     def enableLEEMLineProfile(self):
         """Enable fixed energy contrast analysis along a straight line segment.
 
@@ -1891,7 +2600,7 @@ class Viewer(QtWidgets.QWidget):
         xdata = self.leemdat.elist
         ydata = self.leemdat.dat3d[ymp, xmp, :]
         if self.smoothLEEMplot:
-            ydata = LF.smooth(ydata, window_len=self.LEEMWindowLen, window_type=self.LEEMWindowType)
+            ydata = self.smoothedLEEMCurve(ymp, xmp)
 
         brush = QtGui.QBrush(self.qcolors[self.LEEMclicks - 1])
 
@@ -1965,26 +2674,30 @@ class Viewer(QtWidgets.QWidget):
         ymp = self.leemdat.dat3d.shape[0] - 1 - ymp
         self.currentLEEMPos = (xmp, ymp)  # used for handleLEEMClick()
         # print("Mouse moved to: {0}, {1}".format(xmp, ymp))  # array coordinates
+        self.plotLEEMIV(xmp, ymp)
 
-        # update IV plot
+    def plotLEEMIV(self, xmp, ymp):
+        """Plot the I(V) curve of the pixel at array coordinates (xmp, ymp)."""
         if self.currentLEEMTime:
             xdata = self.leemdat.timelist
         else:
             xdata = self.leemdat.elist
         ydata = self.leemdat.dat3d[ymp, xmp, :]  # raw unsmoothed data
 
-        if self.rescaleLEEMIntensity:
+        if self.smoothLEEMplot:
+            # smoothed curves are memoized for visited pixels; the key includes every
+            # setting the curve depends on so changing a setting never returns a stale curve
+            key = (ymp, xmp, self.LEEMWindowType, self.LEEMWindowLen, self.rescaleLEEMIntensity)
+            smoothed = self.leemdat.smoothcache.get(key)
+            if smoothed is None:
+                # smoothing is linear, so rescaling the smoothed curve is the same as smoothing the rescaled one
+                smoothed = np.asarray(self.smoothedLEEMCurve(ymp, xmp), dtype=np.float64)
+                if self.rescaleLEEMIntensity:
+                    smoothed = smoothed / float(max(ydata))
+                self.leemdat.smoothcache.put(key, smoothed)
+            ydata = smoothed
+        elif self.rescaleLEEMIntensity:
             ydata = [point/float(max(ydata)) for point in ydata]
-        if self.smoothLEEMplot and not self.leemdat.posMask[ymp, xmp]:
-            # We want to plot smoothed dat but the I(V) of the current pixel position
-            # has not yet been smoothed
-            ydata = LF.smooth(ydata, window_type=self.LEEMWindowType, window_len=self.LEEMWindowLen)
-            self.leemdat.dat3ds[ymp, xmp, :] = ydata
-            self.leemdat.posMask[ymp, xmp] = 1
-
-        elif self.smoothLEEMplot and self.leemdat.posMask[ymp, xmp]:
-            # We want to plot smoothed data and have already calculated it for this pixel position
-            ydata = self.leemdat.dat3ds[ymp, xmp, :]
 
         pen = pg.mkPen(self.qcolors[0], width=self.LEEM_Linewidth)
         pdi = pg.PlotDataItem(xdata, ydata, pen=pen)
@@ -2254,6 +2967,28 @@ class Viewer(QtWidgets.QWidget):
                 self.LEEDBackgroundrects.append((rectitem, background_rects[idx], pen, r2))
                 self.LEEDBackgroundcenters.append(centers[idx])
 
+    @staticmethod
+    def squareWindows(centers, rects):
+        """Return the bounds of the square LEED window of each rect around each center, see LF.square_window()."""
+        return [LF.square_window(center[0], center[1], rect[3]) for center, rect in zip(centers, rects)]
+
+    @staticmethod
+    def windowIV(dat, windows):
+        """Return the mean intensity in each window for every image, integrating only windows not seen before.
+
+        :argument dat: LeemData or LeedData
+        :argument windows: list of tuples (top, left, bottom, right) of inclusive pixel bounds
+        :return: 2d numpy array (window number, image number)
+        """
+        windows = [tuple(int(b) for b in window) for window in windows]
+        curves = {window: dat.windowcache.get(window) for window in windows}
+        missing = [window for window, curve in curves.items() if curve is None]
+        if missing:
+            for window, curve in zip(missing, LF.integrate_windows(dat.dat3d, missing, table=dat.sat)):
+                dat.windowcache.put(window, curve)
+                curves[window] = curve
+        return np.array([curves[window] for window in windows]).reshape((len(windows), dat.dat3d.shape[2]))
+
     def processLEEDIV(self):
         """Plot I(V) from User selections."""
         if not self.hasdisplayedLEEDdata or not self.LEEDrects or not self.LEEDclickpos:
@@ -2262,56 +2997,32 @@ class Viewer(QtWidgets.QWidget):
             print("Error: Number of LEED windows does not match number of stored click positions")
             return
 
-        # loop over user slections
-        for idx, tup in enumerate(self.LEEDclickpos):
-            # center coordinates
-            xc = tup[0]
-            yc = tup[1]
-
-            # the lengths of LEEDclickpos and LEEDrects are ensured to be equal now
-            rad = int(self.LEEDrects[idx][3])  # cast to int to ensure array indexing uses ints
-
-            # top left corner in array coordinates
-            xtl = xc - rad
-            ytl = yc - rad
-
-            int_window = self.leeddat.dat3d[ytl:ytl + 2*rad + 1,
-                                            xtl:xtl + 2*rad + 1, :]
-            # store average intensity per window
-            ilist = [img.sum()/(2*rad*2*rad) for img in np.rollaxis(int_window, 2)]
-            # ilist = [img.sum() for img in np.rollaxis(int_window, 2)]
-            if self.smoothLEEDplot:
-                ilist = LF.smooth(ilist, window_type=self.LEEDWindowType, window_len=self.LEEDWindowLen)
-            # self.LEEDivplotwidget.plot(self.leeddat.elist, ilist, pen=pg.mkPen(self.qcolors[idx], width=4))
+        # average intensity per window for every User selection
+        curves = self.windowIV(self.leeddat, self.squareWindows(self.LEEDclickpos, self.LEEDrects))
+        if self.smoothLEEDplot:
+            smoothed = LF.smooth(curves, window_type=self.LEEDWindowType, window_len=self.LEEDWindowLen)
+            if smoothed is None:
+                print("Error: invalid LEED smoothing settings; plotting unsmoothed I(V) curves.")
+            else:
+                curves = smoothed
+        for idx, ilist in enumerate(curves):
             self.LEEDivplotwidget.plot(self.leeddat.elist,
                                        ilist,
                                        pen=pg.mkPen(self.LEEDrects[idx][2].color(), width=4))
-            if self.LEEDBackgroundrects:
-                for idx, tup in enumerate(self.LEEDBackgroundcenters):
-                    # center coordinates
-                    xc = tup[0]
-                    yc = tup[1]
-
-                    # the lengths of LEEDclickpos and LEEDrects are ensured to be equal now
-                    rad = int(self.LEEDBackgroundrects[idx][3])  # cast to int to ensure array indexing uses ints
-
-                    # top left corner in array coordinates
-                    xtl = xc - rad
-                    ytl = yc - rad
-
-                    int_window = self.leeddat.dat3d[ytl:ytl + 2*rad + 1,
-                                                    xtl:xtl + 2*rad + 1, :]
-                    # store average intensity per window
-                    ilist = [img.sum()/(2*rad*2*rad) for img in np.rollaxis(int_window, 2)]
-                    # ilist = [img.sum() for img in np.rollaxis(int_window, 2)]
-                    if self.smoothLEEDplot:
-                        ilist = LF.smooth(ilist, window_type=self.LEEDWindowType, window_len=self.LEEDWindowLen)
-                    # self.LEEDivplotwidget.plot(self.leeddat.elist, ilist, pen=pg.mkPen(self.qcolors[idx], width=4))
-
-                    # width set to 6 for image clarity; reset to 4 if needed
-                    self.LEEDivplotwidget.plot(self.leeddat.elist,
-                                               ilist,
-                                               pen=pg.mkPen(self.LEEDBackgroundrects[idx][2].color(), width=6))
+        if self.LEEDBackgroundrects:
+            curves = self.windowIV(self.leeddat, self.squareWindows(self.LEEDBackgroundcenters,
+                                                                    self.LEEDBackgroundrects))
+            if self.smoothLEEDplot:
+                smoothed = LF.smooth(curves, window_type=self.LEEDWindowType, window_len=self.LEEDWindowLen)
+                if smoothed is None:
+                    print("Error: invalid LEED smoothing settings; plotting unsmoothed background curves.")
+                else:
+                    curves = smoothed
+            for idx, ilist in enumerate(curves):
+                # width set to 6 for image clarity; reset to 4 if needed
+                self.LEEDivplotwidget.plot(self.leeddat.elist,
+                                           ilist,
+                                           pen=pg.mkPen(self.LEEDBackgroundrects[idx][2].color(), width=6))
 
     def averageLEEDIV(self):
         """Extract IV from current user selections and average the curves."""
@@ -2323,25 +3034,8 @@ class Viewer(QtWidgets.QWidget):
         if len(self.LEEDrects) == 1:
             print("Averaging LEED I(V) curves requires more than one selection.")
             return
-        curves = []
-        for idx, tup in enumerate(self.LEEDclickpos):
-            # center coordinates
-            xc = tup[0]
-            yc = tup[1]
-
-            # the lengths of LEEDclickpos and LEEDrects are ensured to be equal now
-            rad = int(self.LEEDrects[idx][3])  # cast to int to ensure array indexing uses ints
-
-            # top left corner in array coordinates
-            xtl = int(xc - rad)
-            ytl = int(yc - rad)
-            int_window = self.leeddat.dat3d[ytl:ytl + 2*rad + 1,
-                                            xtl:xtl + 2*rad + 1, :]
-            # store average intensity per window
-            ilist = [img.sum()/(2*rad*2*rad) for img in np.rollaxis(int_window, 2)]
-            # ilist = [img.sum() for img in np.rollaxis(int_window, 2)]
-            curves.append(ilist)
-        self.LEEDAverageIV = list(map(lambda l: sum(l)/float(len(l)), zip(*curves)))
+        curves = self.windowIV(self.leeddat, self.squareWindows(self.LEEDclickpos, self.LEEDrects))
+        self.LEEDAverageIV = curves.mean(axis=0).tolist()
         # clear current I(V) plot then plot the averaged I(V) data
         self.LEEDivplotwidget.clear()
         if self.smoothLEEDplot:
@@ -2428,6 +3122,231 @@ class Viewer(QtWidgets.QWidget):
         self.LEEMcircs = []
 
 
+    def startWatch(self, datatype=None):
+        """Watch the data path of the loaded experiment and append new images as they are written.
+
+        :param datatype: string 'LEEM' or 'LEED'
+        """
+        if datatype == 'LEEM':
+            exp, dat, loaded = self.LEEM_tab_active_exp, self.leemdat, self.hasdisplayedLEEMdata
+        elif datatype == 'LEED':
+            exp, dat, loaded = self.LEED_tab_active_exp, self.leeddat, self.hasdisplayedLEEDdata
+        else:
+            return
+        if exp is None or not loaded:
+            print("Error: Load a {} experiment before watching its data path.".format(datatype))
+            return
+        if exp.data_type.lower() not in ('raw', 'image'):
+            print("Error: Watching the data path requires Raw or Image data files.")
+            return
+        if isinstance(dat.dat3d, LazyStack):
+            print("Error: Watching the data path requires the data to be loaded into memory.")
+            print("Disable Lazy Loading in the experiment config file and reload the data.")
+            return
+        if (exp.energy_bin or 1) > 1:
+            print("Error: Watching the data path is not supported with Energy Binning.")
+            return
+        selection = exp.selection or slice(0, None, 1)
+        if selection.step != 1 or selection.stop is not None:
+            print("Error: Watching the data path requires a Load Range without a Max or Stride.")
+            return
+        self.stopWatch(datatype=datatype)
+
+        # copy the loaded data once into a buffer with room to grow
+        live = GrowableStack(dat.dat3d)
+        dat.dat3d = live.data
+        dat.raw = None
+        is_raw = exp.data_type.lower() == 'raw'
+        thread = WorkerThread(task='WATCH',
+                              path=str(exp.path),
+                              ext=None if is_raw else exp.ext,
+                              imht=exp.imh,
+                              imwd=exp.imw,
+                              bits=exp.bit if is_raw else None,
+                              byte=exp.byte_order if is_raw else 'L',
+                              skip=selection.start + live.count,
+                              binning=exp.spatial_bin or 1,
+                              roi=exp.roi)
+        if datatype == 'LEEM':
+            thread.connectOutputSignal(self.append_LEEM_data)
+            self.LEEMLiveStack, self.LEEMWatchThread = live, thread
+        else:
+            thread.connectOutputSignal(self.append_LEED_data)
+            self.LEEDLiveStack, self.LEEDWatchThread = live, thread
+        thread.start()
+
+    def stopWatch(self, datatype=None):
+        """Stop watching the data path for new images.
+
+        :param datatype: string 'LEEM' or 'LEED'
+        """
+        if datatype == 'LEEM':
+            thread = self.LEEMWatchThread
+            self.LEEMWatchThread = self.LEEMLiveStack = None
+        elif datatype == 'LEED':
+            thread = self.LEEDWatchThread
+            self.LEEDWatchThread = self.LEEDLiveStack = None
+        else:
+            return
+        if thread is not None:
+            thread.stop()
+            thread.wait()
+
+    @QtCore.pyqtSlot(object)
+    def append_LEEM_data(self, frames):
+        """Append new images emitted by the watch thread to the LEEM data."""
+        if self.LEEMLiveStack is None:
+            return
+        self.leemdat.dat3d = self.LEEMLiveStack.append(frames)
+        num_images = self.leemdat.dat3d.shape[2]
+        while len(self.leemdat.elist) < num_images:
+            self.leemdat.elist.append(round(self.leemdat.elist[-1] + self.LEEM_tab_active_exp.stepe, 2))
+        if self.currentLEEMTime:
+            time_step = self.LEEM_tab_active_exp.time_step
+            self.leemdat.timelist.extend(k * time_step for k in range(len(self.leemdat.timelist), num_images))
+        # I(V) curves are longer now so previously smoothed curves are recomputed on demand
+        self.leemdat.clear_caches()
+        print("Appended {0} new LEEM images; {1} images loaded.".format(frames.shape[2], num_images))
+        if getattr(self, 'currentLEEMPos', None) is not None:
+            self.plotLEEMIV(*self.currentLEEMPos)
+
+    @QtCore.pyqtSlot(object)
+    def append_LEED_data(self, frames):
+        """Append new images emitted by the watch thread to the LEED data."""
+        if self.LEEDLiveStack is None:
+            return
+        self.leeddat.dat3d = self.LEEDLiveStack.append(frames)
+        num_images = self.leeddat.dat3d.shape[2]
+        while len(self.leeddat.elist) < num_images:
+            self.leeddat.elist.append(round(self.leeddat.elist[-1] + self.LEED_tab_active_exp.stepe, 2))
+        if self.currentLEEDTime:
+            time_step = self.LEED_tab_active_exp.time_step
+            self.leeddat.timelist.extend(k * time_step for k in range(len(self.leeddat.timelist), num_images))
+        self.leeddat.clear_caches()
+        print("Appended {0} new LEED images; {1} images loaded.".format(frames.shape[2], num_images))
+        if self.LEEDclickpos and len(self.LEEDrects) == len(self.LEEDclickpos):
+            # re-plot the selected beams with the new images
+            self.LEEDivplotwidget.getPlotItem().clear()
+            self.processLEEDIV()
+
+    def extendEnergyRange(self, datatype=None):
+        """Load the files needed to widen the loaded energy (or time) window, keeping the images already loaded.
+
+        The User is asked for the new lowest and highest energy. Files are added at the
+        stride used to load the current data.
+
+        :param datatype: string 'LEEM' or 'LEED'
+        """
+        if datatype == 'LEEM':
+            exp, dat, loaded = self.LEEM_tab_active_exp, self.leemdat, self.hasdisplayedLEEMdata
+            watching, is_time = self.LEEMWatchThread is not None, self.currentLEEMTime
+        elif datatype == 'LEED':
+            exp, dat, loaded = self.LEED_tab_active_exp, self.leeddat, self.hasdisplayedLEEDdata
+            watching, is_time = self.LEEDWatchThread is not None, self.currentLEEDTime
+        else:
+            return
+        if exp is None or not loaded:
+            print("Error: Load a {} experiment before extending its energy range.".format(datatype))
+            return
+        if exp.data_type.lower() not in ('raw', 'image') or isinstance(dat.dat3d, LazyStack):
+            print("Error: Extending the energy range requires Raw or Image data loaded into memory.")
+            return
+        if (exp.energy_bin or 1) > 1 or watching:
+            print("Error: Extending the energy range is not supported with Energy Binning or while watching.")
+            return
+
+        axis = dat.timelist if is_time else dat.elist
+        unit = "s" if is_time else "eV"
+        emin, ok = QtWidgets.QInputDialog.getDouble(self, "Extend Loaded Energy Range",
+                                                    "Lowest value to load [{}]".format(unit),
+                                                    value=axis[0], min=-1e6, max=1e6, decimals=2)
+        if not ok:
+            return
+        emax, ok = QtWidgets.QInputDialog.getDouble(self, "Extend Loaded Energy Range",
+                                                    "Highest value to load [{}]".format(unit),
+                                                    value=axis[-1], min=-1e6, max=1e6, decimals=2)
+        if not ok:
+            return
+
+        selection = exp.selection or slice(0, None, 1)
+        first, stride = selection.start, selection.step
+        last = first + stride * (dat.dat3d.shape[2] - 1)
+        window = LF.energy_selection(*(self.fileAxis(exp) + (emin, emax)))
+        lower = list(range(first - stride, window.start - 1, -stride))[::-1]
+        upper = list(range(last + stride, window.stop, stride))
+        if not lower and not upper:
+            print("The requested range is already loaded.")
+            return
+
+        is_raw = exp.data_type.lower() == 'raw'
+        task = 'LOAD_{0}{1}'.format(datatype, '' if is_raw else '_IMAGES')
+        thread = WorkerThread(task=task,
+                              path=str(exp.path),
+                              ext=None if is_raw else exp.ext,
+                              imht=exp.imh,
+                              imwd=exp.imw,
+                              bits=exp.bit if is_raw else None,
+                              byte=exp.byte_order if is_raw else 'L',
+                              workers=exp.load_workers,
+                              binning=exp.spatial_bin,
+                              roi=exp.roi,
+                              select=lower + upper)
+        extension = {'lower': len(lower), 'first': first - stride * len(lower), 'stride': stride, 'metadata': None}
+        if datatype == 'LEEM':
+            thread.connectOutputSignal(self.extend_LEEM_data)
+            thread.metadataSIGNAL.connect(lambda metadata: extension.update(metadata=metadata))
+            self.LEEMExtension, self.LEEMExtendThread = extension, thread
+        else:
+            thread.connectOutputSignal(self.extend_LEED_data)
+            thread.metadataSIGNAL.connect(lambda metadata: extension.update(metadata=metadata))
+            self.LEEDExtension, self.LEEDExtendThread = extension, thread
+        print("Loading {0} additional {1} files ...".format(len(lower) + len(upper), datatype))
+        thread.start()
+
+    def mergeExtension(self, datatype, frames):
+        """Combine images loaded by extendEnergyRange() with the loaded data and refresh the display.
+
+        :param datatype: string 'LEEM' or 'LEED'
+        :param frames: 3d numpy array of the new images below the loaded range followed by those above it
+        """
+        if datatype == 'LEEM':
+            exp, dat, is_time = self.LEEM_tab_active_exp, self.leemdat, self.currentLEEMTime
+            extension, self.LEEMExtension = self.LEEMExtension, None
+        else:
+            exp, dat, is_time = self.LEED_tab_active_exp, self.leeddat, self.currentLEEDTime
+            extension, self.LEEDExtension = self.LEEDExtension, None
+        if extension is None:
+            return
+        num_lower, first, stride = extension['lower'], extension['first'], extension['stride']
+        metadata = extension['metadata']
+        if dat.metadata is not None and metadata is not None and len(dat.metadata) == dat.dat3d.shape[2]:
+            dat.metadata = np.concatenate((metadata[:num_lower], dat.metadata, metadata[num_lower:]))
+        else:
+            dat.metadata = None
+        dat.dat3d = np.concatenate((frames[:, :, :num_lower], dat.dat3d, frames[:, :, num_lower:]), axis=2)
+        dat.raw = None
+        num_images = dat.dat3d.shape[2]
+        exp.selection = slice(first, first + stride * num_images, stride)
+        dat.clear_caches()
+        if is_time:
+            dat.timelist = self.loadedAxis(exp, num_images, time_step=exp.time_step, metadata=dat.metadata)
+        print("Added {0} {1} images; {2} images loaded.".format(frames.shape[2], datatype, num_images))
+        self.exp = exp
+        if datatype == 'LEEM':
+            self.update_LEEM_img_after_load()
+        else:
+            self.update_LEED_img_after_load()
+
+    @QtCore.pyqtSlot(object)
+    def extend_LEEM_data(self, frames):
+        """Grab the images emitted by the thread started in extendEnergyRange()."""
+        self.mergeExtension('LEEM', frames)
+
+    @QtCore.pyqtSlot(object)
+    def extend_LEED_data(self, frames):
+        """Grab the images emitted by the thread started in extendEnergyRange()."""
+        self.mergeExtension('LEED', frames)
+
     def keyPressEvent(self, event):
         """Set Arrow keys for navigation."""
         # LEEM Tab is active
@@ -2511,6 +3430,20 @@ class Viewer(QtWidgets.QWidget):
                                                   energy,
                                                   unit))
 
+    def startReadAhead(self, data, previous=None):
+        """Stop the read ahead of previously loaded data and start reading ahead in newly loaded data.
+
+        :argument data: 3d numpy array or LazyStack emitted from the data loading I/O thread
+        :param previous: ReadAhead of the data being replaced, if any
+        :return: ReadAhead for data, or None if data is not a LazyStack or read ahead is disabled
+        """
+        if previous is not None:
+            previous.close()
+        depth = getattr(self.exp, 'read_ahead', 0) if self.exp is not None else 0
+        if not isinstance(data, LazyStack) or not depth:
+            return None
+        return ReadAhead(data, depth=int(depth))
+
     def showLEEMImage(self, idx):####
         """Display LEEM image from main data array at index=idx."""
         if idx not in range(self.leemdat.dat3d.shape[2] - 1):
@@ -2519,6 +3452,8 @@ class Viewer(QtWidgets.QWidget):
         # see note in instance method update_LEEM_img_after_load()
         # for why the displayed image uses a horizontal flip + transpose
         self.LEEMimage.setImage(self.leemdat.dat3d[::-1, :, idx].T)
+        if self.LEEMReadAhead is not None:
+            self.LEEMReadAhead.update(idx)
 
     def showLEEDImage(self, idx):
         """Display LEED image from main data array at index=idx."""
@@ -2528,3 +3463,5 @@ class Viewer(QtWidgets.QWidget):
         # see note in instance method update_LEED_img_after_load()
         # for why the displayed image uses a horizontal flip + transpose
         self.LEEDimage.setImage(self.leeddat.dat3d[::-1, :, idx].T)
+        if self.LEEDReadAhead is not None:
+            self.LEEDReadAhead.update(idx)
@@ -3,22 +3,101 @@
 Read .asc files and convert to numpy arrays.
 Write arrays to file as .dat files.
 
+Each file is read in a single call, the numeric block following the
+Datasection marker is decoded by numpy in one pass, and whole directories
+are converted across a pool of processes. Output files are written as soon
+as each conversion finishes.
+
 Author: Maxwell Grady
 Date: May 2017
 
 Usage:
-python process_ascii.py inputdirectory outputdirectory
+python process_ascii.py inputdirectory outputdirectory [workers]
 """
 import numpy as np
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DATA_MARKER = b'Datasection'
+
+
+def parse_ascii(path):
+    """Decode the image data of an .asc file into a 2D numpy array.
+
+    :argument path: string path to .asc file
+    :return: 2d numpy array of uint16
+    :raises ValueError: if the file has no Datasection or the data block is not rectangular
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    start = raw.find(DATA_MARKER)
+    if start < 0:
+        raise ValueError("Error: no {0} marker found in {1}".format(DATA_MARKER.decode(), path))
+    # skip the marker line; the numeric block is whitespace separated with one image row per line
+    start = raw.find(b'\n', start) + 1
+    body = raw[start:].strip()
+    rows = body.count(b'\n') + 1
+    data = np.fromstring(body, dtype=np.uint16, sep=' ')
+    if data.size % rows:
+        raise ValueError("Error: data block in {} is not rectangular".format(path))
+    return data.reshape((rows, data.size // rows))
+
+
+def convert_ascii_file(inpath, outpath):
+    """Convert a single .asc file to a headerless raw .dat file.
+
+    :argument inpath: string path to .asc file
+    :argument outpath: string path to output .dat file
+    :return: integer number of bytes read from the .asc file
+    """
+    data = parse_ascii(inpath)
+    with open(outpath, 'wb') as o:
+        data.tofile(o)
+    return os.path.getsize(inpath)
+
+
+def convert_directory(indir, outdir, workers=None):
+    """Convert every .asc file in a directory using a pool of processes.
+
+    :argument indir: string path to directory of .asc files
+    :argument outdir: string path to directory for output .dat files
+    :param workers: integer number of processes; None uses the ProcessPoolExecutor default
+    :return: integer number of files converted
+    """
+    asc = sorted(name for name in os.listdir(indir) if name.endswith('.asc'))
+    if not asc:
+        print("Error: no .asc files found in input directory, {}".format(indir))
+        return 0
+    print("Found {} .asc files to process.".format(len(asc)))
+
+    start = time.time()
+    nbytes = 0
+    converted = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_ascii_file,
+                               os.path.join(indir, fl),
+                               os.path.join(outdir, fl.split('.')[0] + '.dat')): fl for fl in asc}
+        for future in as_completed(futures):
+            try:
+                nbytes += future.result()
+            except ValueError as e:
+                print(e)
+                continue
+            converted += 1
+            print("Writing raw data to file, {}".format(futures[future].split('.')[0] + '.dat'))
+    elapsed = max(time.time() - start, 1e-9)
+    print("Converted {0} files in {1:.2f} s ({2:.1f} files/s, {3:.1f} MB/s of ASCII input).".format(
+        converted, elapsed, converted / elapsed, nbytes / elapsed / 1024**2))
+    return converted
 
 
 def main():
     """Run from the commandline - user arguments passed into sys.argv."""
     if len(sys.argv) < 3:
         print("Error: Invalid number of command line arguments")
-        print("Usage: python process_ascii.py inputdirectory outputdirectory")
+        print("Usage: python process_ascii.py inputdirectory outputdirectory [workers]")
         return
 
     indir = sys.argv[1]
@@ -35,27 +114,15 @@ def main():
             print("Attempt to create directory failed.")
             return
 
-    asc = [name for name in os.listdir(indir) if name.endswith('.asc')]
-    if not asc:
-        print("Error: no .asc files found in input directory, {}".format(indir))
-        return
-    print("Found {} .asc files to process.".format(len(asc)))
-    for fl in asc:
-        with open(os.path.join(indir, fl), 'rb') as f:
-            lines = f.readlines()
-        for idx, line in enumerate(lines):
-            if line == b'Datasection\r\n':
-                di = idx + 1
-                break
-        data = []
-        text = lines[di:]
-        for line in text:
-            data.append(line.decode().split(' ')[:-1])
-        data = np.array(data, np.uint16)
-        outfile = os.path.join(outdir, fl.split('.')[0] + '.dat')
-        with open(outfile, 'wb') as o:
-            data.tofile(o)
-            print("Writing raw data to file, {}".format(outfile))
+    workers = None
+    if len(sys.argv) > 3:
+        try:
+            workers = int(sys.argv[3])
+        except ValueError:
+            print("Error: workers must be an integer, got {}".format(sys.argv[3]))
+            return
+
+    convert_directory(indir, outdir, workers=workers)
 
 
 if __name__ == '__main__':
@@ -13,14 +13,30 @@ computationally intensive task or an I/O bound task without blocking usage of th
 Common tasks for the worker thread will be:
     Loading raw data files from disk to memory
     Loading image files from disk to memory
+    Loading PLEASE stack files from disk to memory
+    Opening raw data or image files as a lazily loaded stack
+    Watching a data directory for new frames during acquisition
+    Building a summed-area table of loaded data for fast window I(V)
+    Smoothing the I(V) curve of every pixel of loaded data
+    Counting the minima of the I(V) curve of every pixel of loaded data
+    Clustering the I(V) curves of every pixel of loaded data
     Outputting IV-data to text files(s)
 """
 
 import os
 import LEEMFUNCTIONS as LF
 import numpy as np
+from clustering import ClusterMap
 from configinfo import output_environment_config
 from experiment import Experiment
+from lazystack import LazyStack
+from manifest import get_manifest
+from minima import MinimaMap
+from rawformat import RawBuffer
+from smoothing import SmoothedStack
+from summedarea import SummedAreaTable
+from stackfile import StackFile, find_stack_file
+from uview import bin_headers, check_headers, read_headers
 from PyQt5 import QtCore
 
 # TODO: Consider splitting to multiple classes for separate tasks
@@ -31,8 +47,11 @@ class WorkerThread(QtCore.QThread):
 
     # Pyqt5 Signals must be declared at class level
     done = QtCore.pyqtSignal()
-    outputSIGNAL = QtCore.pyqtSignal(np.ndarray)
+    outputSIGNAL = QtCore.pyqtSignal(object)  # np.ndarray, LazyStack or a result such as SummedAreaTable or ClusterMap
     yamlFileOutput = QtCore.pyqtSignal(bool)
+    progressSIGNAL = QtCore.pyqtSignal(str, str, int, int)  # file name, status, files finished, total files
+    metadataSIGNAL = QtCore.pyqtSignal(object)  # np.ndarray of uview.HEADER_DTYPE, one record per loaded image
+    rawSIGNAL = QtCore.pyqtSignal(object)  # rawformat.RawBuffer holding the loaded raw data files
 
     def __init__(self, task=None, **kwargs):
         """Initialize QThread with required parameters.
@@ -51,15 +70,35 @@ class WorkerThread(QtCore.QThread):
         byte: string 'L or 'B' denoting endian-ness of data
         outpath: string path to directory in which to output .dat files
         files: list of strings of file names to be output as raw data to outpath
+        workers: int number of threads used to read or convert data files
+        mmap: bool flag to memory map stack files instead of reading them into memory
+        cache: int maximum size in bytes of the frame cache for lazily loaded data
+        skip: int number of data files already loaded when watching a directory
+        interval: int polling interval in milliseconds when watching a directory
+        binning: int spatial binning factor applied to each raw or image frame as it is read
+        ebin: int number of consecutive raw or image files averaged into each loaded image
+        roi: list of two tuples (top, left), (bottom, right) of the region of each raw or image frame to load
+        select: slice or list of indices of the raw or image files to load, see LF.select_paths()
+        window_len: even integer size of the smoothing window
+        window_type: string for type of smoothing window function
+        prominence: float smallest prominence of an I(V) minimum to count
+        emin: float lowest energy of an I(V) minimum to count; None for no limit
+        emax: float highest energy of an I(V) minimum to count; None for no limit
+        clusters: int number of clusters of I(V) curves
+        normalize: string normalization of I(V) curves before clustering, see clustering.NORMALIZATIONS
         """
         super(WorkerThread, self).__init__()
         self.task = task
+        self._watching = False
         # Get parameters as dictionary and validate against keys
         self.params = kwargs
         # path refers to input data path
         # output data path is labeled as outpath
         self.valid_keys = ['path', 'data', 'ilist', 'elist',
-                           'imht', 'imwd', 'name', 'bits', 'ext', 'byte', 'outpath', 'files', 'settings']
+                           'imht', 'imwd', 'name', 'bits', 'ext', 'byte', 'outpath', 'files', 'settings',
+                           'workers', 'mmap', 'cache', 'skip', 'interval', 'binning', 'ebin',
+                           'roi', 'select', 'window_len', 'window_type', 'prominence', 'emin', 'emax',
+                           'clusters', 'normalize']
         for key in self.params.keys():
             if key not in self.valid_keys:
                 print('Terminating - ERROR Invalid Task Parameter: {}'.format(key))
@@ -105,15 +144,40 @@ class WorkerThread(QtCore.QThread):
             self.quit()
             self.exit()  # restrict action to one task
 
+        elif self.task == 'LOAD_STACK':
+            self.load_Stack()
+            self.quit()
+            self.exit()  # restrict action to one task
+
+        elif self.task == 'LOAD_LAZY':
+            self.load_Lazy()
+            self.quit()
+            self.exit()  # restrict action to one task
+
+        elif self.task == 'WATCH':
+            self.watch()
+            self.quit()
+            self.exit()  # restrict action to one task
+
+        elif self.task == 'BUILD_SAT':
+            self.build_SAT()
+            self.quit()
+            self.exit()  # restrict action to one task
+
         elif self.task == 'OUTPUT_TO_TEXT':
             self.output_to_Text()
             self.quit()
             self.exit()  # restrict action to one task
 
-        # elif self.task == 'COUNT_MINIMA':
-        #     self.count_Minima()
-        #     self.quit()
-        #     self.exit()  # restrict action to one task
+        elif self.task == 'COUNT_MINIMA':
+            self.count_Minima()
+            self.quit()
+            self.exit()  # restrict action to one task
+
+        elif self.task == 'CLUSTER':
+            self.cluster()
+            self.quit()
+            self.exit()  # restrict action to one task
 
         elif self.task == 'SMOOTH':
             self.smooth()
@@ -166,11 +230,7 @@ class WorkerThread(QtCore.QThread):
         # load raw data
         dat_3d = None
         try:
-            dat_3d = LF.process_LEEM_Data(dirname=self.params['path'],
-                                          ht=self.params['imht'],
-                                          wd=self.params['imwd'],
-                                          bits=self.params['bits'],
-                                          byte=self.params['byte'])
+            dat_3d = self.read_Raw()
         except IOError as e:
             print("Error Loading LEED Data:")
             print(e)
@@ -178,12 +238,59 @@ class WorkerThread(QtCore.QThread):
             print("Please re-check the settings in your YAML experiment config file.")
             print("Ensure that the path setting points to the correct directory.")
             return
+
+        except LF.InvalidParameterError as e:
+            print(e.message)
+            return
+
         if dat_3d is None:
             self.quit()
             self.exit()
         else:
+            self.emit_Metadata()
             self.outputSIGNAL.emit(dat_3d)  # type: np.ndarray
 
+    def read_Raw(self):
+        """Read raw binary data for load_LEED() and load_LEEM().
+
+        The files are read by LF.process_LEEM_Data(). If there is no binning or region of interest, equally
+        sized files are instead read through a RawBuffer, emitted as a custom SIGNAL so that the data can be
+        reinterpreted from the same files when the format settings are corrected, without loading the
+        experiment again. The RawBuffer maps the files rather than holding their bytes.
+        :return: 3d numpy array or None
+        :raises IOError: if no .dat files are found
+        :raises LF.InvalidParameterError: if the files do not fit the format settings
+        """
+        formatstring = LF.get_raw_format_string(self.params['bits'], self.params['byte'])
+        if ((self.params.get('binning') or 1) == 1 and
+                (self.params.get('ebin') or 1) == 1 and self.params.get('roi') is None and formatstring is not None):
+            ht, wd = self.params['imht'], self.params['imwd']
+            manifest = get_manifest(self.params['path'], '.dat',
+                                    frame_bytes=np.dtype(formatstring).itemsize * ht * wd,
+                                    dtype=formatstring)
+            if not len(manifest):
+                raise IOError("No .dat files found in {}".format(self.params['path']))
+            try:
+                raw = RawBuffer(LF.select_paths(manifest.paths, self.params.get('select')),
+                                workers=self.params.get('workers'))
+            except ValueError:
+                raw = None  # header lengths differ between files; each file is mapped separately below
+            if raw is not None:
+                data = raw.frames(ht, wd, formatstring)
+                print('Read {0} raw files of {1} bytes each.'.format(len(raw), raw.file_bytes))
+                self.rawSIGNAL.emit(raw)
+                return data
+        return LF.process_LEEM_Data(dirname=self.params['path'],
+                                    ht=self.params['imht'],
+                                    wd=self.params['imwd'],
+                                    bits=self.params['bits'],
+                                    byte=self.params['byte'],
+                                    workers=self.params.get('workers'),
+                                    binning=self.params.get('binning') or 1,
+                                    ebin=self.params.get('ebin') or 1,
+                                    roi=self.params.get('roi'),
+                                    select=self.params.get('select'))
+
     def load_LEED_Images(self):
         """Load LEED data from image files.
 
@@ -209,7 +316,12 @@ class WorkerThread(QtCore.QThread):
         """
         data = None
         try:
-            data = LF.get_img_array(self.params['path'], ext=self.params['ext'], swap=False)
+            data = LF.get_img_array(self.params['path'], ext=self.params['ext'], swap=False,
+                                    workers=self.params.get('workers'),
+                                    binning=self.params.get('binning') or 1,
+                                    ebin=self.params.get('ebin') or 1,
+                                    roi=self.params.get('roi'),
+                                    select=self.params.get('select'))
         except IOError as e:
             print("Error Loading LEED Images:")
             print(e)
@@ -217,6 +329,9 @@ class WorkerThread(QtCore.QThread):
             print("Please re-check the settings in your YAML experiment config file.")
             print("Ensure that the path setting points to the correct directory.")
             return
+        except LF.InvalidParameterError as e:
+            print(e.message)
+            return
         if data is None:
             self.quit()
             self.exit()
@@ -249,11 +364,7 @@ class WorkerThread(QtCore.QThread):
         # load raw data
         dat_3d = None
         try:
-            dat_3d = LF.process_LEEM_Data(dirname=self.params['path'],
-                                          ht=self.params['imht'],
-                                          wd=self.params['imwd'],
-                                          bits=self.params['bits'],
-                                          byte=self.params['byte'])
+            dat_3d = self.read_Raw()
         except IOError as e:
             print("Error Loading LEEM Data:")
             print(e)
@@ -270,6 +381,7 @@ class WorkerThread(QtCore.QThread):
             self.quit()
             self.exit()
         else:
+            self.emit_Metadata()
             self.outputSIGNAL.emit(dat_3d)  # type: np.ndarray
 
     def load_LEEM_Images(self):
@@ -286,7 +398,12 @@ class WorkerThread(QtCore.QThread):
         data = None
         try:
             data = LF.get_img_array(self.params['path'],
-                                    ext=self.params['ext'])
+                                    ext=self.params['ext'],
+                                    workers=self.params.get('workers'),
+                                    binning=self.params.get('binning') or 1,
+                                    ebin=self.params.get('ebin') or 1,
+                                    roi=self.params.get('roi'),
+                                    select=self.params.get('select'))
         except IOError as e:
             print("Error Loading LEEM Experiment:")
             print(e)
@@ -298,6 +415,9 @@ class WorkerThread(QtCore.QThread):
             print(e)
             print('Error occurred while loading LEEM data from images using a QThread')
             return
+        except LF.InvalidParameterError as e:
+            print(e.message)
+            return
 
         if data is None:
             self.quit()
@@ -305,6 +425,226 @@ class WorkerThread(QtCore.QThread):
         else:
             self.outputSIGNAL.emit(data)  # type: np.ndarray
 
+    def load_Stack(self):
+        """Load LEEM or LEED data from a single PLEASE stack file.
+
+        Emit the 3d data array as a custom SIGNAL to be retrieved in please.py
+        """
+        if 'path' not in self.params.keys():
+            print('Terminating - ERROR: incorrect parameters for LOAD task')
+            print('Required Parameters: path')
+            return
+        stack_path = find_stack_file(self.params['path'])
+        if stack_path is None:
+            print("Error: No stack file found at {}".format(self.params['path']))
+            print("Please re-check the settings in your YAML experiment config file.")
+            return
+        print('Loading stack file {} ...'.format(stack_path))
+        try:
+            with StackFile(stack_path) as stack:
+                if self.params.get('mmap') and stack.can_memory_map():
+                    print('Memory mapping stack file; data will be read from disk as needed.')
+                    data = stack.memory_map()
+                else:
+                    if self.params.get('mmap'):
+                        print('Stack file is not stored in uncompressed pixel layout; reading into memory.')
+                    data = stack.read_stack(workers=self.params.get('workers'))
+        except (IOError, ValueError) as e:
+            print("Error Loading Stack File:")
+            print(e)
+            return
+        self.outputSIGNAL.emit(data)  # type: np.ndarray
+
+    def _open_manifest(self):
+        """Scan the data directory for raw data (ext None) or image files.
+
+        Raw data requires params imht and imwd; image data requires param ext.
+        Frames are cropped to the roi param and then spatially binned as they are read if those params are set.
+        :return: tuple (DirectoryManifest, callable reading one frame) or (None, None) on error
+        """
+        if 'path' not in self.params.keys():
+            print('Terminating - ERROR: incorrect parameters for LOAD task')
+            print('Required Parameters: path')
+            return None, None
+        path = self.params['path']
+        ext = self.params.get('ext')
+        if ext is None:
+            if 'imht' not in self.params.keys() or 'imwd' not in self.params.keys():
+                print('Terminating - ERROR: incorrect parameters for LOAD task')
+                print('Required Parameters: path, imht, imwd')
+                return None, None
+            formatstring = LF.get_raw_format_string(self.params.get('bits'), self.params.get('byte', 'L'))
+            if formatstring is None:
+                print("Error: unknown bit size or byte order when loading raw data")
+                return None, None
+            ht, wd = self.params['imht'], self.params['imwd']
+            exts = ('.dat',)
+            frame_bytes = np.dtype(formatstring).itemsize * ht * wd
+        else:
+            # accept either spelling of the TIFF extension as LF.get_img_array() does
+            exts = ('.tif', '.tiff') if ext in ('.tif', '.tiff') else (ext,)
+            formatstring = frame_bytes = None
+
+        try:
+            manifest = get_manifest(path, exts, frame_bytes=frame_bytes, dtype=formatstring)
+        except (IOError, OSError) as e:
+            print("Error Loading Data:")
+            print(e)
+            return None, None
+
+        roi = self.params.get('roi')
+        if ext is None:
+            def read_frame(fpath):
+                return LF.map_raw_frame(fpath, ht, wd, formatstring, hdln=manifest.header_length(fpath), roi=roi)
+        else:
+            read_frame = LF.read_img if roi is None else LF.roi_reader(LF.read_img, roi)
+        if (self.params.get('binning') or 1) > 1:
+            read_frame = LF.binned_reader(read_frame, self.params['binning'])
+        return manifest, read_frame
+
+    def load_Lazy(self):
+        """Open raw data or image files as a LazyStack which reads frames on demand.
+
+        Raw data requires params imht and imwd; image data requires param ext.
+        Only the files chosen by the select param are opened. If the ebin param is set,
+        each image of the LazyStack averages ebin consecutive files.
+        Emit the LazyStack as a custom SIGNAL to be retrieved in please.py
+        """
+        manifest, read_frame = self._open_manifest()
+        if manifest is None:
+            return
+        if not len(manifest):
+            print("Error: no {0} files found in data directory, {1}".format(manifest.exts, manifest.dirname))
+            print("Please re-check the settings in your YAML experiment config file.")
+            return
+
+        print('Opening {} data files for lazy loading ...'.format(len(manifest)))
+        kwargs = {} if self.params.get('cache') is None else {'cache_bytes': self.params['cache']}
+        try:
+            paths = LF.select_paths(manifest.paths, self.params.get('select'))
+            if (self.params.get('ebin') or 1) > 1:
+                read_frame = LF.binned_reader(read_frame)
+                paths = LF.group_paths(paths, self.params['ebin'])
+            data = LazyStack(paths, read_frame, **kwargs)
+        except (IOError, ValueError, LF.InvalidParameterError) as e:
+            print("Error Loading Data:")
+            print(e)
+            return
+        if self.params.get('ext') is None:
+            self.emit_Metadata(manifest)
+        self.outputSIGNAL.emit(data)  # type: LazyStack
+
+    def emit_Metadata(self, manifest=None):
+        """Read the UView headers of the raw files loaded with the current params and emit them.
+
+        Only the header bytes of each file are read. The records follow the select and ebin
+        params so that they line up with the loaded images. Inconsistent frames are reported.
+        Emit the structured array as a custom SIGNAL to be retrieved in please.py
+        :param manifest: DirectoryManifest of the data directory; looked up from the params if None
+        """
+        if manifest is None:
+            formatstring = LF.get_raw_format_string(self.params.get('bits'), self.params.get('byte', 'L'))
+            frame_bytes = np.dtype(formatstring).itemsize * self.params['imht'] * self.params['imwd']
+            manifest = get_manifest(self.params['path'], '.dat', frame_bytes=frame_bytes, dtype=formatstring)
+        try:
+            paths = LF.select_paths(manifest.paths, self.params.get('select'))
+            headers = read_headers(paths, [manifest.header_length(path) for path in paths],
+                                   workers=self.params.get('workers'))
+        except (IOError, OSError, LF.InvalidParameterError) as e:
+            print("Error reading data file headers:")
+            print(e)
+            return
+        if not headers['valid'].any():
+            return  # not UView data
+        for problem in check_headers(headers, self.params.get('imht'), self.params.get('imwd'),
+                                     self.params.get('bits')):
+            print("Warning: {}".format(problem))
+        self.metadataSIGNAL.emit(bin_headers(headers, self.params.get('ebin') or 1))
+
+    def stop(self):
+        """Ask a running WATCH task to finish after its current poll."""
+        self._watching = False
+
+    def poll_New_Frames(self, manifest, read_frame, seen, pending):
+        """Rescan the data directory and decode files which have finished being written.
+
+        A file is considered complete once its size is unchanged between two polls
+        (and, for raw data, is at least one frame in size).
+
+        :argument manifest: DirectoryManifest of the watched directory
+        :argument read_frame: callable reading one frame from a file path
+        :argument seen: set of file names already appended; updated in place
+        :argument pending: dict of file name to size at the previous poll; updated in place
+        :return: 3d numpy array of new frames in file name order, or None
+        """
+        manifest.update()
+        frames = []
+        blocked = False  # frames are appended in name order, so stop at the first incomplete file
+        for entry in manifest:
+            if entry.name in seen:
+                continue
+            stable = pending.get(entry.name) == entry.size
+            pending[entry.name] = entry.size
+            if blocked or not stable or (manifest.frame_bytes is not None and entry.size < manifest.frame_bytes):
+                blocked = True
+                continue
+            try:
+                # copy so memory mapped files are not held open
+                frames.append(np.array(read_frame(os.path.join(manifest.dirname, entry.name))))
+            except (IOError, OSError, ValueError, LF.InvalidParameterError):
+                blocked = True  # retry this file on the next poll
+                continue
+            seen.add(entry.name)
+            pending.pop(entry.name)
+        if not frames:
+            return None
+        return np.dstack(frames)
+
+    def watch(self):
+        """Monitor the data directory and emit newly completed frames as they are written.
+
+        Params are as for LOAD_LAZY with the addition of
+        skip: number of files (in name order) which are already loaded
+        interval: integer polling interval in milliseconds; default 1000
+        Emit each 3d array of new frames as a custom SIGNAL to be retrieved in please.py
+        Runs until stop() is called.
+        """
+        manifest, read_frame = self._open_manifest()
+        if manifest is None:
+            return
+        seen = set(manifest.names[:self.params.get('skip', 0)])
+        pending = {}
+        interval = self.params.get('interval', 1000)
+        print('Watching {} for new data files ...'.format(manifest.dirname))
+        self._watching = True
+        while self._watching:
+            self.msleep(interval)
+            try:
+                frames = self.poll_New_Frames(manifest, read_frame, seen, pending)
+            except (IOError, OSError) as e:
+                print("Error watching data directory:")
+                print(e)
+                return
+            if frames is not None:
+                self.outputSIGNAL.emit(frames)  # type: np.ndarray
+        print('Stopped watching {}.'.format(manifest.dirname))
+
+    def build_SAT(self):
+        """Build the summed-area table of a 3d numpy array.
+
+        Emit the SummedAreaTable as a custom SIGNAL to be retrieved in please.py
+        """
+        if 'data' not in self.params.keys():
+            print('Terminating - ERROR: incorrect parameters for BUILD_SAT task')
+            print('Required Parameters: data - 3d numpy array')
+            return
+        try:
+            table = SummedAreaTable(self.params['data'])
+        except MemoryError:
+            print("Error: Not enough memory for a summed-area table; window I(V) is integrated directly.")
+            return
+        self.outputSIGNAL.emit(table)  # type: SummedAreaTable
+
     def output_to_Text(self):
         """Output LEEM or LEED I(V) data to tab delimited text file.
 
@@ -324,15 +664,69 @@ class WorkerThread(QtCore.QThread):
     def smooth(self):
         """Smooth 3D numpy array along the vertical (energy) axis.
 
-        Note- This is a long running task.
+        Every curve is smoothed at once in tiles of image rows across threads, see smoothing.smooth_stack().
+        Emit the SmoothedStack as a custom SIGNAL to be retrieved in please.py
         """
         if 'data' not in self.params.keys():
             print('Terminating - ERROR: incorrect parameters for smooth task')
             print('Required Parameters: data - 3d numpy array')
             return
-        smth = np.apply_along_axis(LF.smooth, 2, self.params['data'], window_len=10, window_type='flat')
-        # self.emit(QtCore.SIGNAL('output(PyQt_PyObject)'), smth)
-        self.outputSIGNAL.emit(smth)  # type: np.ndarray
+        try:
+            smth = SmoothedStack(self.params['data'],
+                                 window_len=self.params.get('window_len', 10),
+                                 window_type=self.params.get('window_type', 'flat'),
+                                 workers=self.params.get('workers'))
+        except LF.InvalidParameterError as e:
+            print(e)
+            return
+        except MemoryError:
+            print("Error: Not enough memory to smooth all data; curves are smoothed as they are plotted.")
+            return
+        self.outputSIGNAL.emit(smth)  # type: SmoothedStack
+
+    def count_Minima(self):
+        """Count the minima of the I(V) curve of every pixel of a 3D numpy array.
+
+        Curves are smoothed first if window_len is given, see minima.count_minima().
+        Emit the MinimaMap as a custom SIGNAL to be retrieved in please.py
+        """
+        if 'data' not in self.params.keys() or 'elist' not in self.params.keys():
+            print('Terminating - ERROR: incorrect parameters for COUNT_MINIMA task')
+            print('Required Parameters: data - 3d numpy array, elist - list of energies')
+            return
+        try:
+            minima = MinimaMap(self.params['data'], self.params['elist'],
+                               prominence=self.params.get('prominence', 0.0),
+                               emin=self.params.get('emin'),
+                               emax=self.params.get('emax'),
+                               window_len=self.params.get('window_len'),
+                               window_type=self.params.get('window_type', 'flat'),
+                               workers=self.params.get('workers'))
+        except LF.InvalidParameterError as e:
+            print(e)
+            return
+        self.outputSIGNAL.emit(minima)  # type: MinimaMap
+
+    def cluster(self):
+        """Cluster the I(V) curves of every pixel of a 3D numpy array with mini-batch k-means.
+
+        Curves are smoothed first if window_len is given, see clustering.minibatch_kmeans().
+        Emit the ClusterMap as a custom SIGNAL to be retrieved in please.py
+        """
+        if 'data' not in self.params.keys() or 'clusters' not in self.params.keys():
+            print('Terminating - ERROR: incorrect parameters for CLUSTER task')
+            print('Required Parameters: data - 3d numpy array, clusters - number of clusters')
+            return
+        try:
+            clusters = ClusterMap(self.params['data'], self.params['clusters'],
+                                  normalize=self.params.get('normalize', 'none'),
+                                  window_len=self.params.get('window_len'),
+                                  window_type=self.params.get('window_type', 'flat'),
+                                  workers=self.params.get('workers'))
+        except LF.InvalidParameterError as e:
+            print(e)
+            return
+        self.outputSIGNAL.emit(clusters)  # type: ClusterMap
 
     def gen_Dat_Files(self):
         """Generate raw .dat files from LEEM or LEED image files.
@@ -364,15 +758,23 @@ class WorkerThread(QtCore.QThread):
             bytes_per_pixel = 2
         elif bits == 8 or bits == 1:
             bytes_per_pixel = 1
+        else:
+            print("Error: Unsupported bit depth {} in call to gen_Dat_Files() ...".format(bits))
+            return
 
-        for file in files:
-            with open(os.path.join(indir, file), 'rb') as infile:
-                header = len(infile.read()) - bytes_per_pixel * w * h
-                infile.seek(0)
-                fmtstr = byte_order + 'u' + str(bytes_per_pixel)
-                data = np.fromstring(infile.read()[header:], fmtstr).reshape((h, w))
-                with open(os.path.join(outdir, file.split('.')[0]+'.dat'), 'wb') as outfile:
-                    data.tofile(outfile)
+        def emit_progress(name, status, count):
+            self.progressSIGNAL.emit(name, status, count, len(files))
+
+        # image bytes are copied unchanged so the output keeps the input byte order
+        print("Converting {0} files to .dat files with {1} byte order ...".format(len(files), byte_order))
+        converted, skipped, failed = LF.convert_to_dat([os.path.join(indir, fl) for fl in files],
+                                                       outdir,
+                                                       bytes_per_pixel * w * h,
+                                                       workers=self.params.get('workers'),
+                                                       progress=emit_progress)
+        print("Done outputting dat files: {0} converted, {1} already present, {2} failed ...".format(converted,
+                                                                                                    skipped,
+                                                                                                    failed))
         self.done.emit()
 
     def outputConfigInfo(self):
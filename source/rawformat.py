@@ -0,0 +1,178 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Raw data files held as bytes and viewed with any image format.
+
+Raw .dat files carry no reliable description of their image format; the
+height, width, bit depth and byte order come from the experiment settings.
+A RawBuffer describes a set of equally sized raw files without reading them.
+frames() returns the 3D data array for any format, filled from a read-only
+np.memmap of each file: the header length is recomputed from the file size
+and the image bytes are reinterpreted with the requested dtype and shape.
+Only the returned array is held in memory; the file contents stay in the
+page cache, so correcting a wrong format setting neither reloads the
+experiment nor keeps a second copy of the data. The maps are dropped once a
+file is copied, as each open map holds a file descriptor.
+
+probe_formats() looks for the format of a raw file when it is not known.
+Image data always fills the end of a raw file, so for each candidate width,
+bit depth and byte order a band of rows counted back from the end of the file
+is scored by its roughness; the correct format gives smooth rows which line
+up with their neighbours, while a wrong width shears the image and a wrong
+bit depth or byte order scrambles neighbouring pixel values. The height (and
+so the header length) of each width is the number of rows above which the
+data no longer lines up.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from LEEMFUNCTIONS import InvalidParameterError, get_raw_format_string
+
+MAX_HEADER_BYTES = 4096  # largest header length considered when probing
+MAX_ASPECT = 4  # largest ratio of image width to height (or height to width) considered when probing
+PROBE_ROWS = 32  # number of rows scored for each candidate format
+ROW_JUMP = 3.0  # a row differing from its neighbour by this many times the typical difference is not image data
+
+RawFormat = namedtuple('RawFormat', ['score', 'height', 'width', 'bits', 'byte', 'header'])
+
+
+class RawBuffer(object):
+    """Equally sized raw data files, mapped from disk whenever their contents are needed."""
+
+    def __init__(self, paths, workers=None):
+        """Check the sizes of the files; nothing is read until frames() or file() is called.
+
+        :argument paths: list of string paths to raw data files, in stacking order
+        :param workers: integer number of threads used by frames(); None uses the ThreadPoolExecutor default
+        :raises ValueError: if the files are not all the same size
+        """
+        self.paths = list(paths)
+        if not self.paths:
+            raise ValueError("Error: no raw data files to read.")
+        sizes = {os.stat(path).st_size for path in self.paths}
+        if len(sizes) != 1:
+            raise ValueError("Error: raw data files are not all the same size.")
+        self.file_bytes = sizes.pop()
+        self.workers = workers
+
+    def __len__(self):
+        return len(self.paths)
+
+    def file(self, idx):
+        """Return the contents of file idx as a read-only 1d uint8 numpy.memmap."""
+        return np.memmap(self.paths[idx], dtype=np.uint8, mode='r', shape=(self.file_bytes,))
+
+    def frames(self, ht, wd, formatstring, hdln=None):
+        """Return the image data of every file as a 3D array.
+
+        :argument ht: integer pixel height of image
+        :argument wd: integer pixel width of image
+        :argument formatstring: numpy dtype string for the image data, see LF.get_raw_format_string()
+        :param hdln: integer header length in bytes; calculated from the file size if None
+        :return: C ordered 3d numpy array (height, width, image number), so each pixel's I(V) curve is contiguous
+        :raises InvalidParameterError: if the files are too small for the image parameters
+        """
+        dtype = np.dtype(formatstring)
+        frame_bytes = dtype.itemsize * ht * wd
+        if hdln is None:
+            hdln = self.file_bytes - frame_bytes
+        if ht < 1 or wd < 1 or hdln < 0 or hdln + frame_bytes > self.file_bytes:
+            raise InvalidParameterError("Error: raw data files of {0} bytes are too small for the image parameters "
+                                        "height={1}, width={2}, format={3}.".format(self.file_bytes, ht, wd,
+                                                                                   formatstring))
+        stack = np.empty((ht, wd, len(self.paths)), dtype=dtype)
+
+        def fill(idx):
+            # the map (and its file descriptor) is released as soon as the frame is copied
+            stack[:, :, idx] = np.memmap(self.paths[idx], dtype=dtype, mode='r', offset=hdln, shape=(ht, wd))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(fill, range(len(self.paths))))
+        return stack
+
+
+def _row_view(raw, wd, formatstring, rows):
+    """Return the last rows complete rows of raw as a float64 array of width wd."""
+    itemsize = np.dtype(formatstring).itemsize
+    nbytes = rows * wd * itemsize
+    band = np.frombuffer(raw[len(raw) - nbytes:].tobytes(), dtype=formatstring)
+    return band.reshape((rows, wd)).astype(np.float64)
+
+
+def _roughness(band):
+    """Mean absolute difference between neighbouring pixels relative to the spread of the pixel values."""
+    spread = band.std()
+    if not spread:
+        return np.inf  # a featureless band cannot confirm the format
+    return (np.abs(np.diff(band, axis=0)).mean() + np.abs(np.diff(band, axis=1)).mean()) / (2 * spread)
+
+
+def _image_height(raw, wd, formatstring, heights):
+    """Choose the tallest candidate height whose top row lines up with the rows below it.
+
+    :argument raw: 1d uint8 array of file contents
+    :argument wd: integer pixel width of image
+    :argument formatstring: numpy dtype string
+    :argument heights: sorted list of candidate heights
+    :return: integer height
+    """
+    top = heights[-1]
+    extra = top - heights[0]
+    if not extra:
+        return top
+    # row differences over the rows which only some candidate heights include, plus a few image rows for scale
+    band = _row_view(raw, wd, formatstring, min(top, extra + 8))
+    diffs = np.abs(np.diff(band, axis=0)).mean(axis=1)
+    typical = np.median(diffs[extra:]) if diffs[extra:].size else np.median(diffs)
+    jumps = np.flatnonzero(diffs[:extra] > ROW_JUMP * max(typical, 1.0))
+    if not jumps.size:
+        return top
+    # rows above the last jump are header bytes
+    fits = [ht for ht in heights if ht <= top - (jumps[-1] + 1)]
+    return max(fits) if fits else heights[0]
+
+
+def probe_formats(raw, bits=(16, 8), byte_orders=('L', 'B'), max_header=MAX_HEADER_BYTES, max_aspect=MAX_ASPECT,
+                  rows=PROBE_ROWS, count=5):
+    """Rank candidate image formats for a single raw data file.
+
+    :argument raw: 1d uint8 array (or bytes) holding the complete contents of one raw file
+    :param bits: bit depths to consider
+    :param byte_orders: byte orders to consider, 'L' or 'B'
+    :param max_header: largest header length in bytes to consider
+    :param max_aspect: largest ratio of width to height (or height to width) to consider
+    :param rows: number of rows scored for each candidate
+    :param count: number of candidates to return
+    :return: list of RawFormat, best (lowest score) first
+    """
+    raw = np.frombuffer(raw, dtype=np.uint8) if isinstance(raw, (bytes, bytearray)) else raw
+    size = len(raw)
+    results = []
+    for bit in bits:
+        itemsize = bit // 8
+        pixels = size // itemsize
+        min_wd = max(int(np.sqrt(pixels / max_aspect)), 2)
+        max_wd = int(np.sqrt(pixels * max_aspect))
+        for wd in range(min_wd, max_wd + 1):
+            row_bytes = wd * itemsize
+            # heights leaving a header of 0 to max_header bytes
+            heights = [ht for ht in range((size - max_header + row_bytes - 1) // row_bytes, size // row_bytes + 1)
+                       if ht >= rows and ht * max_aspect >= wd and wd * max_aspect >= ht]
+            if not heights:
+                continue
+            # byte order is irrelevant for single byte pixels
+            for byte in (byte_orders[:1] if itemsize == 1 else byte_orders):
+                formatstring = get_raw_format_string(bit, byte)
+                score = _roughness(_row_view(raw, wd, formatstring, rows))
+                results.append(RawFormat(score, heights, wd, bit, byte, None))
+    results.sort(key=lambda fmt: fmt.score)
+    best = []
+    for fmt in results[:count]:
+        formatstring = get_raw_format_string(fmt.bits, fmt.byte)
+        ht = _image_height(raw, fmt.width, formatstring, fmt.height)
+        best.append(fmt._replace(height=ht, header=size - ht * fmt.width * fmt.bits // 8))
+    return best
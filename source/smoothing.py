@@ -0,0 +1,140 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Smoothing of every I(V) curve in a 3D data stack at once.
+
+smooth_stack() gives the same result as applying LF.smooth() to the curve of
+each pixel, but smooths whole blocks of curves at once with
+LF.reflect_smooth() (by direct convolution, or by FFT for long windows)
+instead of one numpy.convolve call per pixel. The stack is split into tiles
+of image rows which are smoothed in parallel threads (numpy releases the GIL
+for the arithmetic), so the temporary memory is bounded by the tile size
+whatever the size of the stack. The result is float32, twice the memory of
+16 bit data.
+
+A SmoothedStack keeps the smoothed copy of a stack with the settings used to
+make it, so smoothed curves can be looked up instead of recomputed.
+
+savgol_stack() Savitzky-Golay filters every curve in the same tiles, giving
+the smoothed stack and its first and second derivatives along the energy
+axis in a single pass.
+"""
+
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from LEEMFUNCTIONS import (InvalidParameterError, SAVGOL_POLYORDER, SAVGOL_TYPE, reflect_smooth, savgol_filter,
+                           savgol_matrices, smoothing_fft_length, smoothing_window)
+
+SMOOTH_BLOCK_BYTES = 32 * 1024**2  # memory ceiling in bytes for the temporary arrays of each tile
+
+
+def _map_tiles(work, ht, rows, workers):
+    """Call work(start, stop) for each tile of rows image rows, in parallel threads."""
+    starts = range(0, ht, rows)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(starts)))) as pool:
+        list(pool.map(lambda start: work(start, min(start + rows, ht)), starts))
+
+
+def smooth_stack(data, window_len=10, window_type='flat', workers=None, block_bytes=SMOOTH_BLOCK_BYTES):
+    """Smooth the I(V) curve of every pixel of a 3D stack along the energy axis.
+
+    :argument data: 3d numpy array (height, width, image number) or array-like LazyStack
+    :param window_len: even integer size of window; odd values use the next highest integer
+    :param window_type: string for type of window function, one of LF.SMOOTHING_TYPES
+    :param workers: integer number of threads; None uses the number of CPUs
+    :param block_bytes: integer memory ceiling in bytes for the temporary arrays of each tile
+    :return: 3d numpy float32 array with the shape of data
+    :raises InvalidParameterError: if the window length or type is invalid, or longer than the energy axis
+    """
+    if window_len % 2 != 0:
+        window_len += 1
+    if window_type == SAVGOL_TYPE:
+        return savgol_stack(data, window_len + 1, derivs=(0,), workers=workers, block_bytes=block_bytes)[0]
+    w = smoothing_window(window_len, window_type)
+    ht, wd, num = data.shape
+    if num < window_len:
+        raise InvalidParameterError("Error: cannot smooth {0} images with a window of length {1}.".format(
+            num, window_len))
+    out = np.empty((ht, wd, num), dtype=np.float32)
+    if not out.size:
+        return out
+    # a tile holds the reflected curves and the temporary arrays of direct or FFT convolution
+    nfft = smoothing_fft_length(num, window_len)
+    temp = 3 * nfft * 8 if nfft else 2 * num * out.itemsize
+    row_bytes = wd * ((num + 2 * window_len) * out.itemsize + temp)
+
+    def work(start, stop):
+        reflect_smooth(data[start:stop], w, out[start:stop])
+
+    _map_tiles(work, ht, max(1, min(ht, block_bytes // row_bytes)), workers)
+    return out
+
+
+def savgol_stack(data, points, polyorder=SAVGOL_POLYORDER, derivs=(0, 1, 2), delta=1.0, workers=None,
+                 block_bytes=SMOOTH_BLOCK_BYTES):
+    """Savitzky-Golay filter the I(V) curve of every pixel, giving the smoothed stack and its derivatives in one pass.
+
+    :argument data: 3d numpy array (height, width, image number) or array-like LazyStack
+    :argument points: odd integer number of points in each window
+    :param polyorder: integer order of the fitted polynomial
+    :param derivs: orders of the derivatives to return, 0 for the smoothed stack
+    :param delta: float energy (or time) step between images, the unit of the derivatives
+    :param workers: integer number of threads; None uses the number of CPUs
+    :param block_bytes: integer memory ceiling in bytes for the temporary arrays of each tile
+    :return: list of 3d numpy float32 arrays with the shape of data, one for each of derivs
+    :raises InvalidParameterError: if the window is invalid or longer than the energy axis
+    """
+    savgol_matrices(points, polyorder)  # validate the window before allocating the output
+    ht, wd, num = data.shape
+    if num < points:
+        raise InvalidParameterError("Error: cannot filter {0} images with a window of {1} points.".format(num, points))
+    outs = [np.empty((ht, wd, num), dtype=np.float32) for _ in derivs]
+    if not outs or not outs[0].size:
+        return outs
+    # a tile holds the curves as float32 and the product of one window point
+    row_bytes = wd * num * 4 * 2
+
+    def work(start, stop):
+        savgol_filter(data[start:stop], points, polyorder=polyorder, derivs=derivs, delta=delta,
+                      outs=[out[start:stop] for out in outs])
+
+    _map_tiles(work, ht, max(1, min(ht, block_bytes // row_bytes)), workers)
+    return outs
+
+
+class SmoothedStack(object):
+    """Smoothed copy of a 3D data stack and the settings used to make it."""
+
+    def __init__(self, data, window_len=10, window_type='flat', workers=None):
+        """Smooth every curve of data, see smooth_stack().
+
+        :argument data: 3d numpy array (height, width, image number)
+        :param window_len: even integer size of window
+        :param window_type: string for type of window function
+        :param workers: integer number of threads; None uses the number of CPUs
+        """
+        self.window_len = window_len
+        self.window_type = window_type
+        self.data = smooth_stack(data, window_len=window_len, window_type=window_type, workers=workers)
+        try:
+            self.source = weakref.ref(data)
+        except TypeError:
+            self.source = None
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def describes(self, data):
+        """Return True if the stack was smoothed from the array data."""
+        return self.source is not None and self.source() is data
+
+    def matches(self, window_len, window_type):
+        """Return True if the stack was smoothed with these settings."""
+        return (self.window_len, self.window_type) == (window_len, window_type)
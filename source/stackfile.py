@@ -0,0 +1,28 @@
+"""PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+PLEASE stack files (.pstk).
+
+The stack file format is implemented once, in the please package (please/io/stackfile.py), which describes the
+file layout. This module gives the GUI the same implementation: please.py shadows the package name when the GUI is
+run from this directory, so the module is loaded from its file rather than imported as please.io.stackfile.
+"""
+
+import importlib.util
+import os
+
+_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'please', 'io', 'stackfile.py')
+_spec = importlib.util.spec_from_file_location('_please_stackfile', _PATH)
+_stackfile = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_stackfile)
+
+COMPRESSION_TYPES = _stackfile.COMPRESSION_TYPES
+DEFAULT_CHUNK_SHAPE = _stackfile.DEFAULT_CHUNK_SHAPE
+DEFAULT_PIXEL_BAND = _stackfile.DEFAULT_PIXEL_BAND
+FRAME_LAYOUT = _stackfile.FRAME_LAYOUT
+LAYOUT_TYPES = _stackfile.LAYOUT_TYPES
+PIXEL_LAYOUT = _stackfile.PIXEL_LAYOUT
+STACK_EXTENSION = _stackfile.STACK_EXTENSION
+StackFile = _stackfile.StackFile
+chunk_grid = _stackfile.chunk_grid
+find_stack_file = _stackfile.find_stack_file
+pack_stack_file = _stackfile.pack_stack_file
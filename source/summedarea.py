@@ -0,0 +1,74 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Summed-area tables (integral images) of 3D data stacks.
+
+For every image of a (height, width, image number) stack, entry (r, c) of the
+summed-area table holds the sum of all pixels above and to the left of pixel
+(r, c). The sum of any rectangle with inclusive bounds (t, l, b, r) over every
+energy is then four table lookups, whatever the size of the rectangle:
+    S[b+1, r+1] - S[t, r+1] - S[b+1, l] + S[t, l]
+
+Tables of unsigned integer data of up to 16 bits are stored as uint32, half
+the size of a float64 table, and rely on wrapping (modular) arithmetic: the
+difference of the corner entries is exact whenever the rectangle's true sum
+fits in 32 bits, which holds for rectangles of up to max_pixels pixels.
+Other data is stored as float64.
+"""
+
+import weakref
+
+import numpy as np
+
+TABLE_BLOCK_BYTES = 64 * 1024**2  # memory ceiling in bytes for the temporary block used while building a table
+
+
+class SummedAreaTable(object):
+    """Per image summed-area table of a 3D data stack."""
+
+    def __init__(self, data, block_bytes=TABLE_BLOCK_BYTES):
+        """Build the table, a block of images at a time.
+
+        :argument data: 3d numpy array (height, width, image number)
+        :param block_bytes: integer memory ceiling in bytes for the temporary block
+        """
+        ht, wd, num = data.shape
+        self.shape = data.shape
+        if data.dtype.kind == 'u' and data.dtype.itemsize <= 2:
+            self.dtype = np.dtype(np.uint32)
+            peak = int(data.max()) if data.size else 0
+            self.max_pixels = (2**32 - 1) // max(peak, 1)
+        else:
+            self.dtype = np.dtype(np.float64)
+            self.max_pixels = ht * wd
+        self.table = np.zeros((ht + 1, wd + 1, num), dtype=self.dtype)
+        step = max(1, block_bytes // max(ht * wd * self.dtype.itemsize, 1))
+        for start in range(0, num, step):
+            block = np.array(data[:, :, start:start + step], dtype=self.dtype)
+            np.cumsum(block, axis=0, out=block)
+            np.cumsum(block, axis=1, out=block)
+            self.table[1:, 1:, start:start + step] = block
+        try:
+            self.source = weakref.ref(data)
+        except TypeError:
+            self.source = None
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def describes(self, data):
+        """Return True if the table was built from the array data."""
+        return self.source is not None and self.source() is data
+
+    def window_sums(self, bounds):
+        """Return the sum of each rectangle for every image.
+
+        :argument bounds: list of tuples (top, left, bottom, right) of inclusive pixel bounds inside the image;
+                          each rectangle must cover no more than max_pixels pixels
+        :return: 2d numpy float64 array (rectangle number, image number)
+        """
+        top, left, bottom, right = np.asarray(bounds, dtype=np.intp).reshape((-1, 4)).T
+        table = self.table
+        sums = table[bottom + 1, right + 1] - table[top, right + 1] - table[bottom + 1, left] + table[top, left]
+        return sums.astype(np.float64)
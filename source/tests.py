@@ -16,9 +16,30 @@ the unit test ecosystem in python.
 """
 import glob
 import os
+import shutil
+import tempfile
+import threading
 import unittest
+from unittest import mock
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 import numpy as np
 import LEEMFUNCTIONS as LF
+from clustering import ClusterMap, minibatch_kmeans, prepare_curves
+from data import CurveCache
+from growstack import GrowableStack
+from lazystack import LazyStack, ReadAhead
+from manifest import get_manifest
+from minima import MinimaMap, count_minima, find_minima
+from process_ascii import convert_directory, parse_ascii
+from qthreads import WorkerThread
+from rawformat import RawBuffer, probe_formats
+from smoothing import SmoothedStack, savgol_stack, smooth_stack
+from stackfile import StackFile, pack_stack_file
+from summedarea import SummedAreaTable
+from uview import HEADER_DTYPE, bin_headers, check_headers, parse_header, read_headers
 
 from PIL import Image
 
@@ -96,7 +117,6 @@ class TestReadImage(unittest.TestCase):
             self.assertTrue(im.dtype == dtype)
 
     @unittest.skipUnless(tests_complete["test_16bitTiff"], "Skipping incomplete test.")
-    @unittest.expectedFailure
     def test_16bitTiff(self):
         """Test LF.read_img() with 16bit TIFF."""
         dtype = self.dtypes[1]
@@ -104,9 +124,37 @@ class TestReadImage(unittest.TestCase):
         files = glob.glob(os.path.join(self.test_data_path, "*.tif"))
         for fl in files:
             im = LF.read_img(os.path.join(self.test_data_path, fl))
-            # NOTE: This should fail since read_img() uses .convert('L') which downscales to 8-bit
             self.assertTrue(im.dtype == dtype)
 
+    def test_16bit_values(self):
+        """Test LF.read_img() preserves 16bit pixel values in TIFF and PNG files."""
+        test_array = np.random.randint(0, 65535, size=(64, 48)).astype(np.uint16)
+        for imtype in ['.tif', '.png']:
+            path = os.path.join(self.test_data_path, "test_img_16bit" + imtype)
+            Image.fromarray(test_array).save(path)
+            im = LF.read_img(path)
+            self.assertEqual(im.dtype, np.uint16)
+            self.assertTrue(np.array_equal(im, test_array))
+
+    def test_32bit_dtype_follows_mode(self):
+        """Test LF.read_img() gives 32bit images the same dtype whatever their pixel values."""
+        paths = []
+        for peak in [200, 300, 70000]:
+            path = os.path.join(self.test_data_path, "test_img_32bit_{}.tif".format(peak))
+            Image.fromarray(np.full((8, 6), peak, dtype=np.int32)).save(path)
+            paths.append(path)
+        self.assertEqual({LF.read_img(path).dtype for path in paths}, {np.dtype(np.int32)})
+        self.assertEqual(list(LF.load_stack(paths, LF.read_img)[0, 0]), [200, 300, 70000])
+
+    def test_colour_image(self):
+        """Test LF.read_img() converts colour images to 8bit greyscale."""
+        test_array = np.random.randint(0, 255, size=(64, 48, 3)).astype(np.uint8)
+        path = os.path.join(self.test_data_path, "test_img_rgb.png")
+        Image.fromarray(test_array).save(path)
+        im = LF.read_img(path)
+        self.assertEqual(im.shape, (64, 48))
+        self.assertEqual(im.dtype, np.uint8)
+
     @unittest.skipUnless(tests_complete["test_read_images"], "Skipping incomplete test.")
     def test_read_images(self):
         """Use LF.read_img to read the images created by createImage()."""
@@ -130,5 +178,871 @@ class TestReadImage(unittest.TestCase):
             self.assertTrue(im.dtype == dtype)
 
 
+class TestProcessLEEMData(unittest.TestCase):
+    """Test loading raw .dat files with LF.process_LEEM_Data()."""
+
+    ht = 600
+    wd = 592
+    hdln = 520
+    nfiles = 3
+
+    def setUp(self):
+        """Copy the sample raw data file into a temporary experiment directory."""
+        self.source_path = os.path.dirname(LF.__file__)
+        self.sample_file = os.path.join(self.source_path, os.pardir, "please", "io",
+                                        "tests", "data", "20141023_01_100.dat")
+        self.test_data_path = tempfile.mkdtemp()
+        for idx in range(self.nfiles):
+            shutil.copy(self.sample_file, os.path.join(self.test_data_path, "frame_{0:03d}.dat".format(idx)))
+        with open(self.sample_file, 'rb') as f:
+            f.seek(self.hdln)
+            self.expected = np.frombuffer(f.read(), '<u2').reshape((self.ht, self.wd))
+
+    def tearDown(self):
+        """Remove the temporary experiment directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def test_header_length(self):
+        """Header length is calculated from the file size."""
+        self.assertEqual(LF.get_header_length(self.sample_file, self.ht, self.wd, 16), self.hdln)
+
+    def test_map_raw_frame(self):
+        """Raw frames are exposed as memory maps past the header."""
+        frame = LF.map_raw_frame(self.sample_file, self.ht, self.wd, '<u2')
+        self.assertIsInstance(frame, np.memmap)
+        self.assertTrue(np.array_equal(frame, self.expected))
+
+    def test_process_LEEM_Data(self):
+        """Stack all raw files in a directory."""
+        data = LF.process_LEEM_Data(self.test_data_path, ht=self.ht, wd=self.wd, bits=16, byte='L')
+        self.assertEqual(data.shape, (self.ht, self.wd, self.nfiles))
+        for idx in range(self.nfiles):
+            self.assertTrue(np.array_equal(data[:, :, idx], self.expected))
+
+    def test_process_LEEM_Data_single_worker(self):
+        """Serial loading fills the same array as threaded loading."""
+        data = LF.process_LEEM_Data(self.test_data_path, ht=self.ht, wd=self.wd, bits=16, byte='L', workers=1)
+        self.assertTrue(np.array_equal(data[:, :, -1], self.expected))
+
+    def test_load_stack_dtype_mismatch(self):
+        """Frames wider than the first frame's dtype are rejected rather than truncated."""
+        frames = {'a': np.zeros((4, 3), np.uint8), 'b': np.full((4, 3), 300, np.uint16)}
+        with self.assertRaises(LF.InvalidParameterError):
+            LF.load_stack(['a', 'b'], frames.get)
+        self.assertEqual(LF.load_stack(['b', 'a'], frames.get).dtype, np.uint16)
+
+    def test_map_raw_frame_roi(self):
+        """Only the rows covering a region of interest are mapped."""
+        frame = LF.map_raw_frame(self.sample_file, self.ht, self.wd, '<u2', roi=[(100, 50), (199, 149)])
+        self.assertEqual(frame.shape, (100, 100))
+        self.assertEqual(frame.base.shape, (100, self.wd))
+        self.assertTrue(np.array_equal(frame, self.expected[100:200, 50:150]))
+        with self.assertRaises(LF.InvalidParameterError):
+            LF.map_raw_frame(self.sample_file, self.ht, self.wd, '<u2', roi=[(500, 0), (600, 10)])
+
+    def test_process_LEEM_Data_roi(self):
+        """A region of interest is cropped before binning."""
+        roi = [(10, 20), (49, 59)]
+        data = LF.process_LEEM_Data(self.test_data_path, ht=self.ht, wd=self.wd, bits=16, byte='L', roi=roi)
+        self.assertEqual(data.shape, (40, 40, self.nfiles))
+        self.assertTrue(np.array_equal(data[:, :, 0], LF.crop_images(self.expected, roi)))
+        binned = LF.process_LEEM_Data(self.test_data_path, ht=self.ht, wd=self.wd, bits=16, byte='L', roi=roi,
+                                      binning=4)
+        self.assertTrue(np.array_equal(binned[:, :, 0], LF.bin_image(data[:, :, 0], 4)))
+
+    def test_get_img_array(self):
+        """Stack image files into a preallocated array."""
+        for idx in range(self.nfiles):
+            Image.fromarray(self.expected.astype(np.uint8)).save(
+                os.path.join(self.test_data_path, "frame_{0:03d}.png".format(idx)))
+        data = LF.get_img_array(self.test_data_path, ext='.png', workers=2)
+        self.assertEqual(data.shape, (self.ht, self.wd, self.nfiles))
+        self.assertTrue(np.array_equal(data[:, :, 1], self.expected.astype(np.uint8)))
+        cropped = LF.get_img_array(self.test_data_path, ext='.png', roi=[(0, 0), (9, 19)])
+        self.assertTrue(np.array_equal(cropped, data[:10, :20]))
+
+
+class TestUViewHeaders(unittest.TestCase):
+    """Test decoding per frame metadata from UView .dat headers."""
+
+    def setUp(self):
+        """Locate the sample UView data file."""
+        self.sample_file = os.path.join(os.path.dirname(LF.__file__), os.pardir, "please", "io",
+                                        "tests", "data", "20141023_01_100.dat")
+
+    def test_parse_header(self):
+        """File, image and LEEM data headers are decoded."""
+        with open(self.sample_file, 'rb') as f:
+            rec = parse_header(f.read(520))
+        self.assertTrue(rec['valid'])
+        self.assertEqual((rec['height'], rec['width'], rec['bits']), (600, 592, 16))
+        # 2014-10-23 17:35:02 UTC
+        self.assertAlmostEqual(float(rec['timestamp']), 1414085702.923, places=2)
+        self.assertAlmostEqual(float(rec['sample_temp']), 77.54, places=2)
+        self.assertTrue(np.isfinite(rec['start_voltage']))
+        self.assertFalse(parse_header(b'\x00' * 520)['valid'])
+
+    def test_read_headers(self):
+        """Headers of many files are read into one structured array and binned like the images."""
+        headers = read_headers([self.sample_file] * 5, [520] * 5, workers=2)
+        self.assertEqual(headers.dtype, HEADER_DTYPE)
+        self.assertEqual(len(headers), 5)
+        self.assertTrue(headers['valid'].all())
+        self.assertEqual(len(bin_headers(headers, 2)), 2)
+        self.assertEqual(check_headers(headers, 600, 592, 16), [])
+        headers['start_voltage'] = [1.0, 2.0, 3.0, 5.0, 6.0]
+        self.assertEqual(len(check_headers(headers, 600, 592, 8)), 2)
+
+
+class TestRawFormat(unittest.TestCase):
+    """Test reinterpreting raw file contents and probing for their image format."""
+
+    def setUp(self):
+        """Write the sample image as big-endian raw files with a 100 byte header."""
+        sample_file = os.path.join(os.path.dirname(LF.__file__), os.pardir, "please", "io",
+                                   "tests", "data", "20141023_01_100.dat")
+        self.image = LF.map_raw_frame(sample_file, 600, 592, '<u2').copy()
+        self.test_data_path = tempfile.mkdtemp()
+        self.paths = []
+        for idx in range(3):
+            path = os.path.join(self.test_data_path, "frame_{0:03d}.dat".format(idx))
+            with open(path, 'wb') as f:
+                f.write(b'\x07' * 100)
+                f.write((self.image + idx).astype('>u2').tobytes())
+            self.paths.append(path)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def test_frames(self):
+        """The same files are read with different formats, each into one C ordered array."""
+        raw = RawBuffer(self.paths, workers=2)
+        self.assertEqual(raw.file_bytes, 100 + 600 * 592 * 2)
+        self.assertIsInstance(raw.file(1), np.memmap)
+        data = raw.frames(600, 592, '>u2')
+        self.assertEqual(data.shape, (600, 592, 3))
+        self.assertTrue(data.flags.c_contiguous)
+        self.assertTrue(np.array_equal(data[:, :, 2], self.image + 2))
+        swapped = raw.frames(600, 592, '<u2')
+        self.assertTrue(np.array_equal(swapped[:, :, 0], self.image.byteswap()))
+        self.assertEqual(raw.frames(300, 1184, '>u2').shape, (300, 1184, 3))
+        with self.assertRaises(LF.InvalidParameterError):
+            raw.frames(601, 592, '>u2')
+
+    def test_probe_formats(self):
+        """The true format of a file is ranked first."""
+        with open(self.paths[0], 'rb') as f:
+            formats = probe_formats(f.read())
+        best = formats[0]
+        self.assertEqual((best.height, best.width, best.bits, best.byte, best.header), (600, 592, 16, 'B', 100))
+
+
+class TestIntegrateWindows(unittest.TestCase):
+    """Test integrating I(V) curves over rectangular windows with LF.integrate_windows()."""
+
+    def setUp(self):
+        """Create a small random data stack."""
+        self.data = np.random.randint(0, 4096, size=(40, 50, 12)).astype(np.uint16)
+
+    def test_mean_per_window(self):
+        """Each window is averaged over the (2r+1)^2 pixels it covers, clipped to the image."""
+        windows = [LF.square_window(10, 20, 3), (0, 0, 0, 0), (5, 7, 9, 30), LF.square_window(48, 1, 4), (60, 0, 70, 5)]
+        curves = LF.integrate_windows(self.data, windows)
+        self.assertEqual(curves.shape, (5, 12))
+        expected = self.data[17:24, 7:14, :].reshape((-1, 12)).mean(axis=0)
+        self.assertTrue(np.allclose(curves[0], expected))
+        self.assertTrue(np.allclose(curves[1], self.data[0, 0, :]))
+        self.assertTrue(np.allclose(curves[2], self.data[5:10, 7:31, :].mean(axis=(0, 1))))
+        self.assertTrue(np.allclose(curves[3], self.data[0:6, 44:50, :].mean(axis=(0, 1))))
+        self.assertTrue(np.isnan(curves[4]).all())
+
+    def test_lazy_stack_blocks(self):
+        """Data read in blocks of images gives the same curves as an array in memory."""
+        test_data_path = tempfile.mkdtemp()
+        try:
+            paths = []
+            for idx in range(self.data.shape[2]):
+                path = os.path.join(test_data_path, "frame_{0:03d}.dat".format(idx))
+                self.data[:, :, idx].tofile(path)
+                paths.append(path)
+            stack = LazyStack(paths, lambda path: LF.map_raw_frame(path, 40, 50, '<u2'))
+            windows = [(2, 3, 8, 9), (30, 40, 39, 49)]
+            self.assertTrue(np.allclose(LF.integrate_windows(stack, windows, block_bytes=1000),
+                                        LF.integrate_windows(self.data, windows)))
+        finally:
+            shutil.rmtree(test_data_path)
+
+
+class TestSummedAreaTable(unittest.TestCase):
+    """Test integrating windows from a summed-area table."""
+
+    def test_window_sums(self):
+        """Sums from the uint32 table are exact even where the table entries wrap around."""
+        data = np.random.randint(60000, 65536, size=(300, 280, 4)).astype(np.uint16)
+        table = SummedAreaTable(data, block_bytes=300 * 280 * 4)
+        self.assertEqual(table.dtype, np.uint32)
+        self.assertTrue(table.describes(data))
+        self.assertGreater(int(data.astype(np.uint64).sum(axis=(0, 1)).max()), 2**32)  # the table wraps
+        bounds = [(0, 0, 299, 0), (10, 20, 60, 90), (250, 200, 299, 279)]
+        expected = [data[t:b + 1, l:r + 1].sum(axis=(0, 1), dtype=np.uint64) for t, l, b, r in bounds]
+        self.assertTrue(np.array_equal(table.window_sums(bounds), np.array(expected, dtype=np.float64)))
+
+    def test_integrate_windows(self):
+        """Windows too large for the table fall back to direct integration."""
+        data = np.random.randint(0, 65536, size=(300, 300, 3)).astype(np.uint16)
+        table = SummedAreaTable(data)
+        windows = [(5, 5, 50, 80), (0, 0, 299, 299), (290, 290, 320, 320)]
+        self.assertLess(table.max_pixels, 300 * 300)
+        self.assertTrue(np.allclose(LF.integrate_windows(data, windows, table=table),
+                                    LF.integrate_windows(data, windows)))
+        floats = SummedAreaTable(data.astype(np.float32))
+        self.assertEqual(floats.dtype, np.float64)
+        self.assertTrue(np.allclose(LF.integrate_windows(data, windows, table=floats),
+                                    LF.integrate_windows(data, windows)))
+
+
+class TestSmooth(unittest.TestCase):
+    """Test smoothing curves with the registered windows."""
+
+    def test_windows(self):
+        """Windows are normalized, cached and read-only; unknown types are rejected."""
+        for window_type in LF.SMOOTHING_WINDOWS:
+            w = LF.smoothing_window(12, window_type)
+            self.assertAlmostEqual(w.sum(), 1.0)
+            self.assertTrue(np.allclose(w, w[::-1]))
+            self.assertFalse(w.flags.writeable)
+            self.assertIs(w, LF.smoothing_window(12, window_type))
+        with self.assertRaises(LF.InvalidParameterError):
+            LF.smoothing_window(12, 'triangle')
+        self.assertIsNone(LF.smooth(np.arange(20.0), window_len=12, window_type='triangle'))
+
+    def test_batched_and_fft(self):
+        """Rows of a 2D array are smoothed as single curves; FFT and direct convolution agree."""
+        curves = np.random.rand(6, 400) * 1000
+        self.assertEqual(LF.smoothing_fft_length(400, 4), 0)
+        self.assertGreater(LF.smoothing_fft_length(400, 100), 0)
+        for window_len in [4, 100]:
+            batched = LF.smooth(curves, window_len=window_len, window_type='gaussian')
+            self.assertEqual(batched.shape, curves.shape)
+            for row, curve in zip(batched, curves):
+                self.assertTrue(np.allclose(row, LF.smooth(curve, window_len=window_len, window_type='gaussian')))
+        w = LF.smoothing_window(100, 'hanning')
+        direct = np.convolve(w, np.r_[curves[0, 99:0:-1], curves[0], curves[0, -1:-100:-1]], mode='valid')[49:-50]
+        self.assertTrue(np.allclose(LF.smooth(curves[0], window_len=100, window_type='hanning'), direct))
+
+
+class TestSavitzkyGolay(unittest.TestCase):
+    """Test Savitzky-Golay smoothing and derivatives of curves and stacks."""
+
+    def test_polynomials(self):
+        """Polynomials up to the filter order, and their derivatives, are reproduced exactly up to the edges."""
+        energy = np.arange(30) * 0.5
+        curves = np.array([2 + 3 * energy - 0.2 * energy**2 + 0.01 * energy**3, 5 - energy])
+        smoothed, first, second = LF.savgol_filter(curves, 9, derivs=(0, 1, 2), delta=0.5)
+        self.assertTrue(np.allclose(smoothed, curves))
+        self.assertTrue(np.allclose(first[0], 3 - 0.4 * energy + 0.03 * energy**2))
+        self.assertTrue(np.allclose(second[0], -0.4 + 0.06 * energy))
+        self.assertTrue(np.allclose(first[1], -1))
+        self.assertTrue(np.allclose(LF.smooth(curves, window_len=8, window_type=LF.SAVGOL_TYPE), curves))
+        with self.assertRaises(LF.InvalidParameterError):
+            LF.savgol_filter(curves, 8)
+
+    def test_stack(self):
+        """The smoothed and derivative stacks match filtering the curve of each pixel."""
+        data = np.random.randint(0, 4096, size=(21, 13, 40)).astype(np.uint16)
+        outs = savgol_stack(data, 7, delta=0.2, workers=3, block_bytes=13 * 40 * 8 * 4)
+        self.assertEqual(len(outs), 3)
+        curves = data.reshape((-1, 40))
+        for out, expected in zip(outs, LF.savgol_filter(curves, 7, derivs=(0, 1, 2), delta=0.2)):
+            self.assertEqual(out.dtype, np.float32)
+            self.assertTrue(np.allclose(out.reshape((-1, 40)), expected, rtol=1e-4, atol=1e-2))
+        self.assertTrue(np.array_equal(smooth_stack(data, window_len=6, window_type=LF.SAVGOL_TYPE), outs[0]))
+
+
+class TestSmoothStack(unittest.TestCase):
+    """Test smoothing every curve of a 3D stack at once."""
+
+    def test_matches_smooth(self):
+        """Each smoothed curve matches LF.smooth() of that pixel, across tiles and window types."""
+        data = np.random.randint(0, 4096, size=(23, 17, 40)).astype(np.uint16)
+        for window_type in ['flat', 'hanning', 'blackman']:
+            for window_len in [4, 10]:
+                expected = np.apply_along_axis(LF.smooth, 2, data, window_len=window_len, window_type=window_type)
+                smth = smooth_stack(data, window_len=window_len, window_type=window_type, workers=3,
+                                    block_bytes=17 * 200 * 4 * 4)
+                self.assertEqual(smth.dtype, np.float32)
+                self.assertTrue(np.allclose(smth, expected, rtol=1e-5, atol=1e-2))
+
+    def test_smoothed_stack(self):
+        """A SmoothedStack records its source and settings; invalid settings raise an error."""
+        data = np.random.randint(0, 4096, size=(8, 9, 20)).astype(np.uint16)
+        smoothed = SmoothedStack(data, window_len=6, window_type='hamming')
+        self.assertTrue(smoothed.describes(data))
+        self.assertFalse(smoothed.describes(data.copy()))
+        self.assertTrue(smoothed.matches(6, 'hamming'))
+        self.assertFalse(smoothed.matches(6, 'flat'))
+        with self.assertRaises(LF.InvalidParameterError):
+            smooth_stack(data, window_len=2)
+        with self.assertRaises(LF.InvalidParameterError):
+            smooth_stack(data, window_len=4, window_type='triangle')
+        with self.assertRaises(LF.InvalidParameterError):
+            smooth_stack(data, window_len=30)
+
+
+class TestMinima(unittest.TestCase):
+    """Test counting the minima of I(V) curves."""
+
+    def test_find_minima(self):
+        """Shallow minima, minima outside the energy window and the curve ends are not counted."""
+        energies = np.arange(9) * 1.0
+        curves = np.array([[5, 1, 5, 4.5, 5, 2, 2, 6, 0],
+                           [0, 1, 2, 3, 4, 5, 6, 7, 8]])
+        self.assertEqual(np.flatnonzero(find_minima(curves, energies)[0]).tolist(), [1, 3, 5])
+        self.assertEqual(np.flatnonzero(find_minima(curves, energies, prominence=1)[0]).tolist(), [1, 5])
+        self.assertEqual(np.flatnonzero(find_minima(curves, energies, prominence=1, emin=2)[0]).tolist(), [5])
+        self.assertEqual(np.flatnonzero(find_minima(curves, energies, emax=4)[0]).tolist(), [1, 3])
+        self.assertFalse(find_minima(curves, energies)[1].any())
+
+    def test_count_minima(self):
+        """Counts and energies of each pixel match finding the minima of its curve, across tiles."""
+        energies = np.arange(60) * 0.5
+        data = (1000 + 300 * np.cos(energies) + np.random.randint(0, 40, size=(17, 11, 60))).astype(np.uint16)
+        counts, positions = count_minima(data, energies, prominence=100, emin=2, workers=3,
+                                         block_bytes=11 * 60 * 32 * 3)
+        found = find_minima(data, energies, prominence=100, emin=2)
+        self.assertTrue(np.array_equal(counts, found.sum(axis=-1)))
+        self.assertEqual(positions.shape, (17, 11, counts.max()))
+        self.assertTrue(np.allclose(np.sort(positions[4, 7][:counts[4, 7]]), energies[found[4, 7]]))
+        self.assertTrue(np.isnan(positions[counts < counts.max()][:, -1]).all())
+        minima = MinimaMap(data, energies, prominence=100, emin=2, window_len=4)
+        self.assertTrue(minima.describes(data))
+        self.assertTrue((minima.counts == 4).all())  # minima at 3, 5, 7 and 9 pi
+        with self.assertRaises(LF.InvalidParameterError):
+            count_minima(data, energies[1:])
+
+
+class TestClustering(unittest.TestCase):
+    """Test mini-batch k-means clustering of pixel I(V) curves."""
+
+    def setUp(self):
+        """Build a stack of three regions with different curve shapes and brightness."""
+        rng = np.random.RandomState(0)
+        energies = np.linspace(0, 20, 80)
+        self.shapes = np.array([1000 + 300 * np.cos(energies), 800 + 200 * np.sin(1.5 * energies),
+                                1200 - 30 * energies])
+        self.truth = np.zeros((60, 50), dtype=int)
+        self.truth[:, 25:] = 1
+        self.truth[40:, 35:] = 2
+        self.data = (self.shapes[self.truth] + rng.normal(0, 30, size=(60, 50, 80))).clip(0).astype(np.uint16)
+
+    def test_minibatch_kmeans(self):
+        """Regions are recovered in small tiles; clusters are numbered by size with their mean curves."""
+        labels, centroids, curves = minibatch_kmeans(self.data, 3, batch_size=100, seed=2, workers=3,
+                                                     block_bytes=50 * 80 * 14 * 3 * 5)
+        self.assertEqual(labels.shape, (60, 50))
+        self.assertEqual(centroids.shape, (3, 80))
+        self.assertTrue(np.array_equal(labels, self.truth))
+        self.assertTrue(np.allclose(curves, self.shapes, atol=10))
+
+    def test_normalized(self):
+        """Normalized curves cluster by shape whatever their brightness."""
+        data = self.data.astype(np.float32)
+        data[:30] *= 3
+        clusters = ClusterMap(data, 3, normalize='standard', window_len=4, seed=1)
+        self.assertTrue(clusters.describes(data))
+        self.assertTrue(np.array_equal(clusters.labels, self.truth))
+        self.assertEqual(clusters.sizes().tolist(), [1500, 1200, 300])
+        curves = prepare_curves(data[:2, :2], normalize='max')
+        self.assertTrue(np.allclose(curves.max(axis=1), 1))
+        with self.assertRaises(LF.InvalidParameterError):
+            prepare_curves(data[:2, :2], normalize='median')
+        with self.assertRaises(LF.InvalidParameterError):
+            minibatch_kmeans(data[:2, :2], 5)
+
+
+class TestConvertToDat(unittest.TestCase):
+    """Test stripping headers from data files with LF.convert_to_dat()."""
+
+    def setUp(self):
+        """Write files with headers of varying length to a temporary directory."""
+        self.test_data_path = tempfile.mkdtemp()
+        self.outdir = os.path.join(self.test_data_path, "out")
+        os.mkdir(self.outdir)
+        self.data = np.random.randint(0, 65535, size=(6, 5, 4)).astype('>u2')
+        self.paths = []
+        for idx in range(self.data.shape[2]):
+            path = os.path.join(self.test_data_path, "frame_{0:03d}.tif".format(idx))
+            with open(path, 'wb') as f:
+                f.write(b'\x01' * (8 + idx))
+                f.write(self.data[:, :, idx].tobytes())
+            self.paths.append(path)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def test_convert(self):
+        """Image bytes are copied unchanged and progress is reported per file."""
+        events = []
+        result = LF.convert_to_dat(self.paths, self.outdir, 60, workers=3,
+                                   progress=lambda *args: events.append(args))
+        self.assertEqual(result, (4, 0, 0))
+        self.assertEqual(sorted(count for _, _, count in events), [1, 2, 3, 4])
+        for idx in range(self.data.shape[2]):
+            data = np.fromfile(os.path.join(self.outdir, "frame_{0:03d}.dat".format(idx)), dtype='>u2')
+            self.assertTrue(np.array_equal(data.reshape((6, 5)), self.data[:, :, idx]))
+
+    def test_resume(self):
+        """Complete output files are skipped; partial ones are converted again."""
+        LF.convert_to_dat(self.paths[:2], self.outdir, 60)
+        with open(os.path.join(self.outdir, "frame_001.dat"), 'wb') as f:
+            f.write(b'\x00' * 10)  # interrupted output
+        events = []
+        result = LF.convert_to_dat(self.paths, self.outdir, 60, max_memory=60,
+                                   progress=lambda *args: events.append(args))
+        self.assertEqual(result, (3, 1, 0))
+        self.assertIn(("frame_000.dat", 'skipped', 1), events)
+        data = np.fromfile(os.path.join(self.outdir, "frame_001.dat"), dtype='>u2')
+        self.assertTrue(np.array_equal(data.reshape((6, 5)), self.data[:, :, 1]))
+
+
+class TestBinning(unittest.TestCase):
+    """Test spatial and energy binning applied while loading."""
+
+    def setUp(self):
+        """Write a small stack of raw files to a temporary directory."""
+        self.test_data_path = tempfile.mkdtemp()
+        self.data = np.random.randint(0, 4096, size=(8, 6, 5)).astype('<u2')
+        for idx in range(self.data.shape[2]):
+            with open(os.path.join(self.test_data_path, "frame_{0:03d}.dat".format(idx)), 'wb') as f:
+                f.write(b'\x00' * 16)
+                f.write(self.data[:, :, idx].tobytes())
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def test_bin_image(self):
+        """Blocks of pixels are averaged and incomplete blocks discarded."""
+        frame = np.arange(35, dtype=np.uint16).reshape((5, 7))
+        binned = LF.bin_image(frame, 2)
+        self.assertEqual(binned.shape, (2, 3))
+        self.assertEqual(binned.dtype, np.uint16)
+        self.assertEqual(binned[1, 2], np.rint(frame[2:4, 4:6].mean()))
+        self.assertIs(LF.bin_image(frame, 1), frame)
+        with self.assertRaises(LF.InvalidParameterError):
+            LF.bin_image(frame, 8)
+
+    def test_process_LEEM_Data_binned(self):
+        """Loading with binning matches binning the full resolution stack."""
+        data = LF.process_LEEM_Data(self.test_data_path, ht=8, wd=6, bits=16, byte='L', binning=2, ebin=2)
+        # the fifth file does not fill a group of two and is discarded
+        self.assertEqual(data.shape, (4, 3, 2))
+        expected = self.data[:, :, :4].astype(float).reshape((4, 2, 3, 2, 2, 2)).mean(axis=(1, 3, 5))
+        self.assertTrue(np.array_equal(data, np.rint(expected).astype(np.uint16)))
+
+    def test_energy_selection(self):
+        """Energy windows map to file indices through the energy list."""
+        select = LF.energy_selection(10.0, 0.5, emin=10.5, emax=11.5, stride=2)
+        self.assertEqual(select, slice(1, 4, 2))
+        self.assertEqual(LF.energy_selection(10.0, 0.5, emin=10.4), slice(1, None, 1))
+        data = LF.process_LEEM_Data(self.test_data_path, ht=8, wd=6, bits=16, byte='L', select=select)
+        self.assertTrue(np.array_equal(data, self.data[:, :, 1:4:2]))
+        data = LF.process_LEEM_Data(self.test_data_path, ht=8, wd=6, bits=16, byte='L', select=[0, 4, 7])
+        self.assertTrue(np.array_equal(data, self.data[:, :, [0, 4]]))
+        with self.assertRaises(LF.InvalidParameterError):
+            LF.select_paths(['a', 'b'], slice(5, None, 1))
+
+    def test_binned_axis(self):
+        """Binned images are placed at the mean energy of their files."""
+        self.assertEqual(LF.binned_axis(10.0, 0.5, 3), [10.0, 10.5, 11.0])
+        self.assertEqual(LF.binned_axis(10.0, 0.5, 2, ebin=2), [10.25, 11.25])
+        with self.assertRaises(LF.InvalidParameterError):
+            LF.group_paths(['a', 'b'], ebin=3)
+
+
+class TestStackFile(unittest.TestCase):
+    """Test packing data files into a stack file and reading them back."""
+
+    def setUp(self):
+        """Write a small set of raw frames to a temporary directory."""
+        self.test_data_path = tempfile.mkdtemp()
+        self.data = np.random.randint(0, 4096, size=(37, 29, 11)).astype('<u2')
+        self.paths = []
+        for idx in range(self.data.shape[2]):
+            path = os.path.join(self.test_data_path, "frame_{0:03d}.dat".format(idx))
+            self.data[:, :, idx].tofile(path)
+            self.paths.append(path)
+        self.stack_path = os.path.join(self.test_data_path, "stack.pstk")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def test_pack_and_read(self):
+        """Stack files return the packed data for whole stacks, frames and pixels."""
+        for compression in ['none', 'zlib', 'lzma']:
+            pack_stack_file(self.stack_path, self.paths,
+                            lambda path: LF.map_raw_frame(path, 37, 29, '<u2'),
+                            energies=list(range(11)), metadata={'Type': 'LEEM'},
+                            chunk_shape=(16, 8, 4), compression=compression)
+            with StackFile(self.stack_path) as stack:
+                self.assertEqual(stack.energies, list(range(11)))
+                self.assertEqual(stack.metadata, {'Type': 'LEEM'})
+                self.assertTrue(np.array_equal(stack.read_stack(workers=2), self.data))
+                self.assertTrue(np.array_equal(stack.read_frame(5), self.data[:, :, 5]))
+                self.assertTrue(np.array_equal(stack.read_pixel(36, 28), self.data[36, 28, :]))
+
+    def test_pixel_layout(self):
+        """Uncompressed pixel layout stacks memory map as one (h, w, n) array."""
+        pack_stack_file(self.stack_path, self.paths,
+                        lambda path: LF.map_raw_frame(path, 37, 29, '<u2'),
+                        compression='none', layout='pixel')
+        with StackFile(self.stack_path) as stack:
+            self.assertEqual(stack.layout, 'pixel')
+            self.assertEqual(stack.chunk_shape, (16, 29, 11))
+            self.assertTrue(stack.can_memory_map())
+            mapped = stack.memory_map()
+            self.assertIsInstance(mapped, np.memmap)
+            self.assertTrue(np.array_equal(mapped, self.data))
+            self.assertTrue(np.array_equal(stack.read_window(slice(3, 20), slice(5, 9)), self.data[3:20, 5:9, :]))
+
+    def test_each_frame_read_once(self):
+        """Packing reads every data file once, whatever the layout and number of row bands."""
+        reads = []
+
+        def read_frame(path):
+            reads.append(path)
+            return LF.map_raw_frame(path, 37, 29, '<u2')
+
+        for layout, chunk_shape in [('pixel', (4, 29, 11)), ('pixel', (8, 8, 1)), ('frame', (16, 8, 4))]:
+            del reads[:]
+            pack_stack_file(self.stack_path, self.paths, read_frame, chunk_shape=chunk_shape, layout=layout)
+            self.assertEqual(reads, self.paths)
+            with StackFile(self.stack_path) as stack:
+                self.assertTrue(np.array_equal(stack.read_stack(), self.data))
+
+    def test_frame_layout_is_not_memory_mapped(self):
+        """Frame layout stacks fall back to reading chunks."""
+        pack_stack_file(self.stack_path, self.paths,
+                        lambda path: LF.map_raw_frame(path, 37, 29, '<u2'),
+                        chunk_shape=(16, 8, 4), compression='none')
+        with StackFile(self.stack_path) as stack:
+            self.assertFalse(stack.can_memory_map())
+            self.assertTrue(np.array_equal(stack.read_window(slice(3, 20), slice(5, 9)), self.data[3:20, 5:9, :]))
+
+
+class TestLazyStack(unittest.TestCase):
+    """Test reading frames on demand through LazyStack."""
+
+    def setUp(self):
+        """Write a small set of raw frames to a temporary directory."""
+        self.test_data_path = tempfile.mkdtemp()
+        self.data = np.random.randint(0, 4096, size=(37, 29, 11)).astype('<u2')
+        self.paths = []
+        for idx in range(self.data.shape[2]):
+            path = os.path.join(self.test_data_path, "frame_{0:03d}.dat".format(idx))
+            self.data[:, :, idx].tofile(path)
+            self.paths.append(path)
+        self.reads = []
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def read_frame(self, path):
+        """Read a raw frame and record which file was read."""
+        self.reads.append(path)
+        return LF.map_raw_frame(path, 37, 29, '<u2')
+
+    def test_indexing(self):
+        """LazyStack indexing matches the equivalent numpy array."""
+        stack = LazyStack(self.paths, self.read_frame)
+        self.assertEqual(stack.shape, self.data.shape)
+        self.assertEqual(stack.dtype, self.data.dtype)
+        self.assertTrue(np.array_equal(stack[::-1, :, 4].T, self.data[::-1, :, 4].T))
+        self.assertTrue(np.array_equal(stack[10, 3, :], self.data[10, 3, :]))
+        self.assertTrue(np.array_equal(stack[2:9, 5:20, :], self.data[2:9, 5:20, :]))
+        self.assertTrue(np.array_equal(stack[..., 1:8:2], self.data[..., 1:8:2]))
+        self.assertEqual(stack[6, 7, -1], self.data[6, 7, -1])
+        self.assertTrue(np.array_equal(np.asarray(stack), self.data))
+
+    def test_cache_budget(self):
+        """Only the most recently viewed frames within the byte budget are kept."""
+        frame_bytes = self.data[:, :, 0].nbytes
+        stack = LazyStack(self.paths, self.read_frame, cache_bytes=2 * frame_bytes)
+        stack.get_frame(1)
+        stack.get_frame(2)
+        self.reads = []
+        stack.get_frame(2)
+        stack.get_frame(1)
+        self.assertEqual(self.reads, [])
+        stack.get_frame(3)  # evicts frame 2, the least recently used
+        stack.get_frame(1)
+        stack.get_frame(2)
+        self.assertEqual(self.reads, [self.paths[3], self.paths[2]])
+
+    def test_curves_do_not_evict_frames(self):
+        """Reading an I(V) curve does not replace the cached images."""
+        stack = LazyStack(self.paths, self.read_frame, cache_bytes=self.data[:, :, 0].nbytes)
+        stack.get_frame(5)
+        stack[0, 0, :]
+        self.reads = []
+        stack.get_frame(5)
+        self.assertEqual(self.reads, [])
+
+    def test_curves_cache_decoded_frames(self):
+        """Decoded images read for an I(V) curve fill the cache without evicting the viewed image."""
+        def decode_frame(path):
+            self.reads.append(path)
+            return np.array(LF.map_raw_frame(path, 37, 29, '<u2'))
+
+        frame_bytes = self.data[:, :, 0].nbytes
+        stack = LazyStack(self.paths, decode_frame, cache_bytes=4 * frame_bytes)
+        stack.get_frame(5)
+        self.reads = []
+        self.assertTrue(np.array_equal(stack[3, 4, :], self.data[3, 4, :]))
+        self.assertEqual(len(self.reads), 9)  # frames 0 and 5 were cached
+        self.reads = []
+        self.assertTrue(np.array_equal(stack[6, 2, :], self.data[6, 2, :]))
+        self.assertEqual(self.reads, [self.paths[idx] for idx in range(11) if idx not in (0, 1, 2, 5)])
+        stack.get_frame(5)
+        self.assertEqual(len(self.reads), 7)
+
+    @unittest.skipIf(resource is None or not os.path.isdir('/dev/fd'), "needs resource limits and /dev/fd")
+    def test_cache_holds_no_open_files(self):
+        """Caching more raw frames than the open file limit allows does not run out of files."""
+        paths = self.paths * 20
+        open_files = len(os.listdir('/dev/fd'))
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (open_files + 32, hard))
+        try:
+            stack = LazyStack(paths, self.read_frame)
+            for idx in range(len(paths)):
+                self.assertTrue(np.array_equal(stack.get_frame(idx), self.data[:, :, idx % self.data.shape[2]]))
+            self.assertEqual(len(stack._cache), len(paths))
+            self.assertFalse(any(isinstance(frame, np.memmap) for frame in stack._cache.values()))
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    def test_read_ahead(self):
+        """Frames on either side of the viewed image are read in the background, ahead first."""
+        stack = LazyStack(self.paths, self.read_frame)
+        readahead = ReadAhead(stack, depth=2, workers=1)
+        stack.get_frame(5)
+        self.reads = []
+        readahead.update(5)
+        readahead.update(4)  # moving backwards
+        self.assertEqual(readahead.direction, -1)
+        readahead._pool.shutdown(wait=True)
+        self.assertEqual(self.reads[:2], [self.paths[6], self.paths[7]])
+        self.assertEqual(set(self.reads[2:]), {self.paths[4], self.paths[3], self.paths[2]})
+        self.reads = []
+        for idx in range(2, 8):
+            self.assertTrue(np.array_equal(stack.get_frame(idx), self.data[:, :, idx]))
+        self.assertEqual(self.reads, [])
+        self.assertFalse(any(isinstance(stack._cached(idx), np.memmap) for idx in range(2, 8)))
+        readahead.close()
+        self.assertIsNone(stack.readahead)
+
+    def test_read_ahead_jump(self):
+        """Jumping to a distant image drops the queued reads."""
+        stack = LazyStack(self.paths, self.read_frame)
+        readahead = ReadAhead(stack, depth=3, workers=1)
+        readahead.update(1)
+        readahead.update(9)
+        generation = readahead._generation
+        readahead._pool.shutdown(wait=True)
+        self.assertEqual(generation, 1)
+        self.assertIn(self.paths[10], self.reads)
+        self.assertTrue(np.array_equal(stack[..., 9], self.data[..., 9]))
+        readahead.close()
+
+
+class TestDirectoryManifest(unittest.TestCase):
+    """Test scanning data directories into cached manifests."""
+
+    def setUp(self):
+        """Write raw frames with a 10 byte header to a temporary directory."""
+        self.test_data_path = tempfile.mkdtemp()
+        for idx in [2, 0, 1]:
+            self.write_frame("frame_{0:03d}.dat".format(idx))
+        self.write_frame(".hidden.dat")
+        self.write_frame("notes.txt")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def write_frame(self, name, header=10):
+        """Write a 4x3 16 bit frame preceded by a header."""
+        with open(os.path.join(self.test_data_path, name), 'wb') as f:
+            f.write(b'\x00' * header)
+            f.write(np.zeros((4, 3), dtype='<u2').tobytes())
+
+    def test_scan(self):
+        """Manifests list sorted, visible data files with their header lengths."""
+        manifest = get_manifest(self.test_data_path, '.dat', frame_bytes=24, dtype='<u2')
+        self.assertEqual(manifest.names, ['frame_000.dat', 'frame_001.dat', 'frame_002.dat'])
+        self.assertEqual([entry.index for entry in manifest], [0, 1, 2])
+        self.assertEqual([entry.header for entry in manifest], [10, 10, 10])
+        self.assertEqual(manifest.header_length(manifest.paths[1]), 10)
+
+    def test_rescan(self):
+        """A later scan reuses the cached manifest and only inspects new or changed files."""
+        manifest = get_manifest(self.test_data_path, '.dat', frame_bytes=24, dtype='<u2')
+        self.assertEqual(manifest.update(), 0)
+        self.write_frame("frame_003.dat", header=20)
+        self.write_frame("frame_000.dat", header=30)
+        self.assertIs(get_manifest(self.test_data_path, '.dat', frame_bytes=24, dtype='<u2'), manifest)
+        self.write_frame("frame_004.dat")
+        self.assertEqual(manifest.update(), 1)
+        self.assertEqual(len(manifest), 5)
+        self.assertEqual(manifest.header_length("frame_000.dat"), 30)
+        self.assertEqual(manifest.header_length("frame_003.dat"), 20)
+
+    def test_rescan_on_directory_change(self):
+        """get_manifest() only rescans when the directory has changed, unless asked to."""
+        manifest = get_manifest(self.test_data_path, '.dat', frame_bytes=24, dtype='<u2')
+        with mock.patch.object(manifest, 'update', wraps=manifest.update) as update:
+            get_manifest(self.test_data_path, '.dat', frame_bytes=24, dtype='<u2')
+            self.assertEqual(update.call_count, 0)
+            self.write_frame("frame_003.dat")
+            os.utime(self.test_data_path, ns=(0, 0))  # a distinct mtime on coarse clocks
+            get_manifest(self.test_data_path, '.dat', frame_bytes=24, dtype='<u2')
+            self.assertEqual(update.call_count, 1)
+            self.assertEqual(len(manifest), 4)
+            get_manifest(self.test_data_path, '.dat', frame_bytes=24, dtype='<u2', rescan=True)
+            self.assertEqual(update.call_count, 2)
+
+    def test_rescans_are_serialized(self):
+        """A rescan waits for one in progress and readers never see a partial listing."""
+        manifest = get_manifest(self.test_data_path, '.dat', frame_bytes=24, dtype='<u2')
+        self.write_frame("frame_003.dat", header=20)
+        rescan = threading.Thread(target=manifest.update)
+        with manifest._lock:
+            rescan.start()
+            rescan.join(0.2)
+            self.assertTrue(rescan.is_alive())
+            self.assertEqual(len(manifest), 3)
+        rescan.join()
+        self.assertEqual(len(manifest), 4)
+        self.assertEqual([manifest.header_length(path) for path in manifest.paths], [10, 10, 10, 20])
+
+class TestCurveCache(unittest.TestCase):
+    """Test the LRU cache of smoothed I(V) curves."""
+
+    def test_budget(self):
+        """Least recently used curves are evicted to stay within the byte budget."""
+        cache = CurveCache(max_bytes=3 * 80)
+        for x in range(3):
+            cache.put((0, x, 'flat', 4, False), np.full(10, x, dtype=np.float64))
+        self.assertEqual(cache.get((0, 0, 'flat', 4, False))[0], 0)
+        cache.put((0, 3, 'flat', 4, False), np.zeros(10))
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.nbytes, 240)
+        self.assertIsNone(cache.get((0, 1, 'flat', 4, False)))
+        self.assertIsNotNone(cache.get((0, 0, 'flat', 4, False)))
+
+    def test_settings_in_key(self):
+        """Curves smoothed with different settings are cached separately."""
+        cache = CurveCache()
+        cache.put((5, 6, 'flat', 4, False), np.zeros(10))
+        self.assertIsNone(cache.get((5, 6, 'hanning', 4, False)))
+        self.assertIsNone(cache.get((5, 6, 'flat', 6, False)))
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+
+class TestGrowableStack(unittest.TestCase):
+    """Test appending frames to a GrowableStack."""
+
+    def test_append(self):
+        """Appended frames extend the data view and grow the capacity geometrically."""
+        data = np.random.randint(0, 4096, size=(5, 4, 3)).astype('<u2')
+        stack = GrowableStack(data, capacity=4)
+        self.assertEqual(stack.capacity, 16)
+        capacities = set()
+        for idx in range(40):
+            frame = np.full((5, 4), idx, dtype='<u2')
+            data = np.dstack([data, frame])
+            stack.append(frame)
+            capacities.add(stack.capacity)
+        stack.append(np.zeros((5, 4, 2), dtype='<u2'))
+        data = np.dstack([data, np.zeros((5, 4, 2), dtype='<u2')])
+        self.assertEqual(sorted(capacities), [16, 32, 64])
+        self.assertEqual(len(stack), 45)
+        self.assertTrue(np.array_equal(stack.data, data))
+        with self.assertRaises(ValueError):
+            stack.append(np.zeros((4, 5)))
+
+
+class TestWatchDirectory(unittest.TestCase):
+    """Test detecting newly completed files while watching a data directory."""
+
+    def setUp(self):
+        """Create an empty temporary data directory."""
+        self.test_data_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def write_frame(self, name, value, rows=4):
+        """Write (possibly incomplete) 4x3 16 bit frame data to a file."""
+        with open(os.path.join(self.test_data_path, name), 'wb') as f:
+            f.write(np.full((rows, 3), value, dtype='<u2').tobytes())
+
+    def test_poll_new_frames(self):
+        """Only files whose size is stable between polls are decoded, in name order."""
+        self.write_frame("frame_000.dat", 0)
+        thread = WorkerThread(task='WATCH', path=self.test_data_path, imht=4, imwd=3, skip=1)
+        manifest, read_frame = thread._open_manifest()
+        seen = set(manifest.names[:1])
+        pending = {}
+        self.write_frame("frame_001.dat", 1)
+        self.write_frame("frame_002.dat", 2, rows=2)  # still being written
+        self.assertIsNone(thread.poll_New_Frames(manifest, read_frame, seen, pending))
+        frames = thread.poll_New_Frames(manifest, read_frame, seen, pending)
+        self.assertEqual(frames.shape, (4, 3, 1))
+        self.assertTrue(np.all(frames == 1))
+        self.write_frame("frame_002.dat", 2)
+        self.write_frame("frame_003.dat", 3)
+        self.assertIsNone(thread.poll_New_Frames(manifest, read_frame, seen, pending))
+        frames = thread.poll_New_Frames(manifest, read_frame, seen, pending)
+        self.assertEqual([frames[0, 0, k] for k in range(frames.shape[2])], [2, 3])
+
+
+class TestProcessAscii(unittest.TestCase):
+    """Test converting .asc files to raw .dat files."""
+
+    def setUp(self):
+        """Write a small .asc file to a temporary directory."""
+        self.test_data_path = tempfile.mkdtemp()
+        self.data = np.random.randint(0, 65535, size=(12, 7)).astype(np.uint16)
+        lines = [b'Header', b'Exposure=1.0', b'Datasection']
+        lines += [b' '.join(str(v).encode() for v in row) + b' ' for row in self.data]
+        with open(os.path.join(self.test_data_path, "frame_000.asc"), 'wb') as f:
+            f.write(b'\r\n'.join(lines) + b'\r\n')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_data_path)
+
+    def test_parse_ascii(self):
+        """The data block following the Datasection marker is decoded in one pass."""
+        data = parse_ascii(os.path.join(self.test_data_path, "frame_000.asc"))
+        self.assertTrue(np.array_equal(data, self.data))
+
+    def test_convert_directory(self):
+        """Converted .dat files hold the raw image data."""
+        outdir = os.path.join(self.test_data_path, "out")
+        os.mkdir(outdir)
+        self.assertEqual(convert_directory(self.test_data_path, outdir, workers=1), 1)
+        data = np.fromfile(os.path.join(outdir, "frame_000.dat"), dtype=np.uint16)
+        self.assertTrue(np.array_equal(data.reshape(self.data.shape), self.data))
+
+
 if __name__ == '__main__':
     unittest.main()
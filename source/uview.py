@@ -0,0 +1,221 @@
+"""
+PLEASE - The Python Low-energy Electron Analysis SuitE.
+
+Per-frame metadata from the headers of UView (Elmitec) raw .dat files.
+
+A UView file begins with a 104 byte file header (identified by the string
+"UKSOFT2001") followed by an optional 128 byte recipe, an image header
+containing the acquisition time, and a block of tagged LEEM data holding the
+microscope settings at the time the image was recorded. The image data
+follows the headers.
+
+read_headers() reads only the header bytes of each file, in parallel, and
+decodes them into a numpy structured array with one record per file:
+    valid          True if the file has a UView header
+    width, height  image dimensions in pixels
+    bits           bits per pixel
+    timestamp      acquisition time in seconds since the Unix epoch
+    start_voltage  electron start voltage in V
+    exposure       camera exposure in ms
+    averaging      number of averaged images (0 = off)
+    sample_temp    sample temperature
+    pressure       reading of the first pressure gauge
+Values which are not present in a header are NaN (or 0 for integers).
+"""
+
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+UVIEW_MAGIC = b'UKSOFT2001'
+FILE_HEADER_LENGTH = 104
+RECIPE_LENGTH = 128
+IMAGE_HEADER_LEEM_OFFSET = 28  # offset of the tagged LEEM data within the image header
+FILETIME_TO_UNIX = 11644473600  # seconds between 1601-01-01 (Windows FILETIME epoch) and 1970-01-01
+
+# LEEM data tags; tags below 100 are named module values
+START_VOLTAGE_TAG = 38
+SAMPLE_TEMP_TAG = 39
+END_TAG = 0xFF
+
+HEADER_DTYPE = np.dtype([('valid', np.bool_),
+                         ('width', np.int32),
+                         ('height', np.int32),
+                         ('bits', np.int32),
+                         ('timestamp', np.float64),
+                         ('start_voltage', np.float64),
+                         ('exposure', np.float64),
+                         ('averaging', np.int32),
+                         ('sample_temp', np.float64),
+                         ('pressure', np.float64)])
+
+
+def _empty_record():
+    """Return a header record with every measured value missing."""
+    rec = np.zeros((), dtype=HEADER_DTYPE)
+    for name in ('timestamp', 'start_voltage', 'exposure', 'sample_temp', 'pressure'):
+        rec[name] = np.nan
+    return rec
+
+
+def _cstring(buf, pos):
+    """Return the null terminated string at pos and the position after the terminator."""
+    end = buf.index(b'\x00', pos)
+    return buf[pos:end], end + 1
+
+
+def _parse_leem_data(buf, pos, rec):
+    """Decode tagged LEEM data starting at pos into rec, stopping at the end tag or an unknown tag."""
+    float_at = struct.Struct('<f').unpack_from
+    while pos < len(buf):
+        tag = buf[pos]
+        pos += 1
+        if tag == END_TAG:
+            return
+        if tag < 100:
+            # module value: name with a trailing unit code, then a float
+            _, pos = _cstring(buf, pos)
+            value = float_at(buf, pos)[0]
+            pos += 4
+            if tag == START_VOLTAGE_TAG:
+                rec['start_voltage'] = value
+            elif tag == SAMPLE_TEMP_TAG:
+                rec['sample_temp'] = value
+        elif tag in (100, 111):
+            pos += 8  # Mitutoyo X and Y / phi and theta
+        elif tag in (101, 102, 103, 112, 113, 114, 115, 116):
+            pos += 4
+        elif tag == 104:
+            rec['exposure'] = float_at(buf, pos)[0]
+            rec['averaging'] = buf[pos + 4]
+            pos += 5
+        elif tag == 105:
+            _, pos = _cstring(buf, pos)  # image title
+        elif 106 <= tag <= 109 or 117 <= tag <= 120:
+            # pressure gauge: name, unit, then a float
+            _, pos = _cstring(buf, pos)
+            _, pos = _cstring(buf, pos)
+            if np.isnan(rec['pressure']):
+                rec['pressure'] = float_at(buf, pos)[0]
+            pos += 4
+        elif tag == 110:
+            _, pos = _cstring(buf, pos)  # field of view
+            pos += 4
+        else:
+            return  # unknown tag; the length of its data is not known
+
+
+def parse_header(buf):
+    """Decode the header bytes of a UView .dat file.
+
+    :argument buf: bytes from the start of the file, up to the start of the image data
+    :return: numpy structured scalar of HEADER_DTYPE; valid is False if buf is not a UView header
+    """
+    rec = _empty_record()
+    if len(buf) < FILE_HEADER_LENGTH or not buf.startswith(UVIEW_MAGIC):
+        return rec
+    bits, = struct.unpack_from('<h', buf, 24)
+    width, height, _, recipe_size = struct.unpack_from('<hhhh', buf, 40)
+    rec['width'], rec['height'], rec['bits'] = width, height, bits
+    rec['valid'] = True
+
+    image_header = FILE_HEADER_LENGTH + (RECIPE_LENGTH if recipe_size else 0)
+    if len(buf) < image_header + IMAGE_HEADER_LEEM_OFFSET:
+        return rec
+    filetime, = struct.unpack_from('<q', buf, image_header + 8)
+    if filetime > 0:
+        # FILETIME counts 100 ns intervals
+        rec['timestamp'] = filetime / 1e7 - FILETIME_TO_UNIX
+    try:
+        _parse_leem_data(buf, image_header + IMAGE_HEADER_LEEM_OFFSET, rec)
+    except (ValueError, IndexError, struct.error):
+        pass  # truncated LEEM data; keep the values decoded so far
+    return rec
+
+
+def read_header(path, length):
+    """Read and decode the header of a single UView .dat file.
+
+    :argument path: string path to raw data file
+    :argument length: integer number of header bytes preceding the image data
+    :return: numpy structured scalar of HEADER_DTYPE
+    """
+    if not length or length < 0:
+        return _empty_record()
+    with open(path, 'rb') as f:
+        return parse_header(f.read(length))
+
+
+def read_headers(paths, lengths, workers=None):
+    """Read the headers of many UView .dat files in parallel; image data is never read.
+
+    :argument paths: list of string paths to raw data files
+    :argument lengths: list of integer header lengths, e.g. from a DirectoryManifest
+    :param workers: integer number of threads; None uses the ThreadPoolExecutor default
+    :return: 1d numpy structured array of HEADER_DTYPE with one record per file
+    """
+    out = np.empty(len(paths), dtype=HEADER_DTYPE)
+
+    def fill(idx):
+        out[idx] = read_header(paths[idx], lengths[idx])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fill, range(len(paths))))
+    return out
+
+
+def bin_headers(headers, ebin=1):
+    """Combine the headers of groups of ebin consecutive files, as LF.group_paths() groups files.
+
+    Measured values are averaged; trailing files which do not fill a group are discarded.
+
+    :argument headers: 1d numpy structured array of HEADER_DTYPE
+    :param ebin: integer number of files in each group
+    :return: 1d numpy structured array of HEADER_DTYPE with one record per group
+    """
+    if ebin <= 1:
+        return headers
+    groups = headers[:len(headers) // ebin * ebin].reshape((-1, ebin))
+    out = groups[:, 0].copy()
+    out['valid'] = groups['valid'].all(axis=1)
+    for name in ('timestamp', 'start_voltage', 'exposure', 'sample_temp', 'pressure'):
+        out[name] = groups[name].mean(axis=1)
+    return out
+
+
+def check_headers(headers, ht=None, wd=None, bits=None):
+    """Look for frames whose headers are inconsistent with the rest of the data set.
+
+    :argument headers: 1d numpy structured array of HEADER_DTYPE
+    :param ht: integer image height from the experiment settings
+    :param wd: integer image width from the experiment settings
+    :param bits: integer bit depth from the experiment settings
+    :return: list of strings describing each problem found
+    """
+    problems = []
+    valid = headers['valid']
+    if not valid.all():
+        problems.append("{} files have no UView header.".format(int((~valid).sum())))
+    headers = headers[valid]
+    if not len(headers):
+        return problems
+    for name, expected in (('height', ht), ('width', wd), ('bits', bits)):
+        if expected is not None:
+            bad = np.flatnonzero(headers[name] != expected)
+            if bad.size:
+                problems.append("{0} files have a header {1} different from the setting {2}; first at "
+                                "index {3}.".format(bad.size, name, expected, bad[0]))
+    exposure = headers['exposure'][np.isfinite(headers['exposure'])]
+    if exposure.size and not np.allclose(exposure, np.median(exposure)):
+        problems.append("Camera exposure varies from {0} to {1} ms.".format(exposure.min(), exposure.max()))
+    times = headers['timestamp']
+    if np.isfinite(times).all() and (np.diff(times) < 0).any():
+        problems.append("Acquisition times are not in file name order.")
+    voltages = headers['start_voltage']
+    if np.isfinite(voltages).all() and len(voltages) > 2:
+        steps = np.diff(voltages)
+        if not np.allclose(steps, np.median(steps), atol=5e-3):
+            problems.append("Start voltage steps are not uniform ({0:.3f} to {1:.3f} V); using the start "
+                            "voltage of each file for the energy axis.".format(steps.min(), steps.max()))
+    return problems